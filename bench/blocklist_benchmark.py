@@ -0,0 +1,87 @@
+"""
+Blocklist matching cost against a synthetic corpus.
+
+Generates blocked words and domains plus chat messages, a small share of which contain blocked entries, then
+compares the trie shaped Blocklist regex with a flat alternation of the same entries and with a substring check
+per entry. The slow variants only scan the first --baseline-messages messages.
+
+usage: python bench/blocklist_benchmark.py [--patterns N] [--messages N] [--baseline-messages N]
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import string
+import sys
+import time
+from typing import Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from blocklist import Blocklist
+
+VOCABULARY = (
+    'build', 'test', 'flaky', 'release', 'review', 'merge', 'ticket', 'sprint', 'deploy', 'rollback', 'bug',
+    'привет', 'тест', 'сборка', 'релиз', 'баг', 'ревью', 'задача', 'упал', 'опять', 'почему',
+)
+
+
+def random_word(length: int) -> str:
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def corpus(patterns: int, messages: int):
+    words = {random_word(random.randint(5, 12)) for _ in range(patterns // 2)}
+    domains = {f'{random_word(random.randint(4, 10))}.{random.choice(("com", "io", "ru", "xyz"))}'
+               for _ in range(patterns - len(words))}
+    blocked = list(words) + list(domains)
+
+    texts = list()
+    for _ in range(messages):
+        text = [random.choice(VOCABULARY) for _ in range(random.randint(3, 25))]
+        if random.random() < 0.02:
+            text.insert(random.randrange(len(text)), random.choice(blocked))
+        texts.append(' '.join(text))
+
+    return words, domains, texts
+
+
+def measure(match, texts: list) -> Tuple[float, int]:
+    started = time.perf_counter()
+    found = sum(1 for text in texts if match(text))
+
+    return (time.perf_counter() - started) / len(texts), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Blocklist matching cost against a synthetic corpus.')
+    parser.add_argument('--patterns', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--baseline-messages', type=int, default=1000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    words, domains, texts = corpus(args.patterns, args.messages)
+    lines = [f'word {word}' for word in words] + [f'domain {domain}' for domain in domains]
+
+    started = time.perf_counter()
+    blocklist = Blocklist.parse(lines, logging.getLogger())
+    compiled = time.perf_counter() - started
+
+    flat = re.compile(r'(?<![\w.-])(?:' + '|'.join(re.escape(entry) for entry in words | domains) + r')(?![\w-])')
+    entries = list(words | domains)
+    baseline = texts[:args.baseline_messages]
+
+    print(f'{len(blocklist)} patterns, trie regex compiled in {compiled:.2f}s')
+    for name, match, sample in (
+            ('substring per entry', lambda text: any(entry in text for entry in entries), baseline),
+            ('flat alternation', flat.search, baseline),
+            ('trie regex', blocklist.match, texts),
+    ):
+        seconds, found = measure(match, sample)
+        print(f'{name:<20} {seconds * 10 ** 6:9.1f} us/message, {found}/{len(sample)} messages matched')
+
+
+if __name__ == '__main__':
+    main()
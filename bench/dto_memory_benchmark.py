@@ -0,0 +1,165 @@
+"""
+Memory retained by newbie and restriction storages.
+
+Compares the former DTOs (plain classes holding full telebot User and Message objects) with the slotted DTOs
+holding UserDto and MessageRefDto, measured by tracemalloc over N synthetic entries.
+
+usage: python bench/dto_memory_benchmark.py [--entries N]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from telebot.types import User, Message
+
+from dto import NewbieDto, RestrictedUserDto, RestrictionDto, UserDto, MessageRefDto
+from const import QuestionSettings
+from greeting import QuestionProvider
+
+CHAT_ID = -1001424452281
+GREETING = '[Иван](tg://user?id={user_id}), прочитал(а) правила чата?'
+
+
+class LegacyNewbieDto:
+    def __init__(self, user, timeout, question, greeting=None, timer=None):
+        self._user = user
+        self._timeout = timeout
+        self._question = question
+        self._greeting = greeting
+        self._timer = timer
+
+
+class LegacyRestrictionDto:
+    def __init__(self, messages, media, other, web_preview):
+        self._messages = messages
+        self._media = media
+        self._other = other
+        self._web_preview = web_preview
+
+
+class LegacyRestrictedUserDto:
+    def __init__(self, user, chat_id, until_date, restriction, restore_at):
+        self._user = user
+        self._chat_id = chat_id
+        self._until_date = until_date
+        self._restriction = restriction
+        self._restore_at = restore_at
+
+
+def user_json(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Иван', 'username': f'user{user_id}', 'language_code': 'ru'}
+
+
+def greeting_json(user_id: int, now: int) -> dict:
+    text = GREETING.format(user_id=user_id)
+    return {
+        'message_id': user_id,
+        'date': now,
+        'chat': {'id': CHAT_ID, 'type': 'supergroup', 'title': 'Rude QA', 'username': 'rudeqa'},
+        'from': {'id': 1, 'is_bot': True, 'first_name': 'RudeBoy', 'username': 'rudeboy_bot'},
+        'reply_to_message': {
+            'message_id': user_id - 1,
+            'date': now,
+            'chat': {'id': CHAT_ID, 'type': 'supergroup', 'title': 'Rude QA', 'username': 'rudeqa'},
+            'from': user_json(user_id),
+            'new_chat_members': [user_json(user_id)],
+        },
+        'text': text,
+        'reply_markup': {'inline_keyboard': [[
+            {'text': 'Да', 'callback_data': 'да'},
+            {'text': 'Нет', 'callback_data': 'нет'},
+        ]]},
+    }
+
+
+def legacy_newbies(entries: int, now: int) -> list:
+    question = QuestionProvider.parse(QuestionSettings.DEFAULT_QUESTIONS, logging.getLogger()).get_question()
+    return [
+        LegacyNewbieDto(
+            user=User.de_json(user_json(user_id)),
+            timeout=now + question.timeout,
+            question=question,
+            greeting=Message.de_json(greeting_json(user_id, now)),
+        )
+        for user_id in range(1, entries + 1)
+    ]
+
+
+def compact_newbies(entries: int, now: int) -> list:
+    question = QuestionProvider.parse(QuestionSettings.DEFAULT_QUESTIONS, logging.getLogger()).get_question()
+    return [
+        NewbieDto(
+            user=UserDto.from_user(User.de_json(user_json(user_id))),
+            timeout=now + question.timeout,
+            question=question,
+            greeting=MessageRefDto.from_message(Message.de_json(greeting_json(user_id, now))),
+        )
+        for user_id in range(1, entries + 1)
+    ]
+
+
+def legacy_restrictions(entries: int, now: int) -> list:
+    return [
+        LegacyRestrictedUserDto(
+            user=User.de_json(user_json(user_id)),
+            chat_id=CHAT_ID,
+            until_date=0,
+            restriction=LegacyRestrictionDto(True, True, True, True),
+            restore_at=now + 60,
+        )
+        for user_id in range(1, entries + 1)
+    ]
+
+
+def compact_restrictions(entries: int, now: int) -> list:
+    return [
+        RestrictedUserDto(
+            user=UserDto.from_user(User.de_json(user_json(user_id))),
+            chat_id=CHAT_ID,
+            until_date=0,
+            restriction=RestrictionDto(True, True, True, True),
+            restore_at=now + 60,
+        )
+        for user_id in range(1, entries + 1)
+    ]
+
+
+def retained(factory, entries: int) -> int:
+    now = int(time.time())
+    gc.collect()
+    tracemalloc.start()
+    storage = {dto._user.id: dto for dto in factory(entries, now)}
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del storage
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    entries = parser.parse_args().entries
+
+    for name, legacy, compact in (
+            ('newbies', legacy_newbies, compact_newbies),
+            ('restrictions', legacy_restrictions, compact_restrictions),
+    ):
+        legacy_size = retained(legacy, entries)
+        compact_size = retained(compact, entries)
+        print(
+            f'{name:<12} {entries} entries: '
+            f'legacy {legacy_size / 2 ** 20:7.1f} MiB ({legacy_size // entries} B/entry), '
+            f'compact {compact_size / 2 ** 20:7.1f} MiB ({compact_size // entries} B/entry), '
+            f'{legacy_size / compact_size:.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
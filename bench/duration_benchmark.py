@@ -0,0 +1,82 @@
+"""
+Cost of parsing command durations.
+
+Parses durations typed by admins (`10m`, `1h30m`, `2d 12h`, bare numbers, empty text) with the single token parser
+the bot used before compound durations, with the compound tokenizer and with the tokenizer behind its cache.
+The old parser rejects compound durations, so it only gets the single token inputs.
+
+usage: python bench/duration_benchmark.py [--calls N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from const import RestrictDuration, BanDuration, BaseDuration
+from dto import DurationDto
+from duration import parse_duration, get_plural
+from error import ParseBanDurationError
+
+SINGLE = ('', '5', '10m', '30m', '1h', '2h', '12h', '1d', '3d', '7d', '1y', '45s')
+COMPOUND = ('1h30m', '2d12h', '1d 6h', '3h15m', '1h30m15s', '2 h 30 m')
+
+
+def single_token_duration(text: str, duration_class: BaseDuration) -> DurationDto:
+    if text == '':
+        return single_token_duration(f'{duration_class.DEFAULT_DURATION}{duration_class.DEFAULT_UNIT}', duration_class)
+
+    try:
+        amount = int(text)
+        return single_token_duration(f'{amount}{duration_class.DEFAULT_UNIT}', duration_class)
+    except ValueError:
+        pass
+
+    try:
+        amount = int(text[:-1])
+        unit = duration_class.UNITS[text[-1]]
+        duration_seconds = int(amount * unit['rate'])
+        if duration_seconds < duration_class.MIN_DURATION.seconds:
+            return duration_class.MIN_DURATION
+        if duration_seconds > duration_class.MAX_DURATION.seconds:
+            return duration_class.MAX_DURATION
+
+        return DurationDto(seconds=duration_seconds, text=f'{amount} {get_plural(amount, unit["plural_forms"])}')
+    except (ValueError, KeyError, IndexError):
+        raise ParseBanDurationError
+
+
+def measure(parse, calls: list) -> float:
+    started = time.perf_counter()
+    for text, duration_class in calls:
+        parse(text, duration_class)
+
+    return (time.perf_counter() - started) / len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost of parsing command durations.')
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    classes = (RestrictDuration, BanDuration)
+    single = [(random.choice(SINGLE), random.choice(classes)) for _ in range(args.calls)]
+    mixed = [(random.choice(SINGLE + COMPOUND), random.choice(classes)) for _ in range(args.calls)]
+    uncached = parse_duration.__wrapped__
+
+    for name, parse, calls in (
+            ('single token parser', lambda text, duration_class: single_token_duration(text, duration_class()),
+             single),
+            ('tokenizer, single', uncached, single),
+            ('tokenizer, mixed', uncached, mixed),
+            ('cached, mixed', parse_duration, mixed),
+    ):
+        print(f'{name:<20} {measure(parse, calls) * 10 ** 9:7.0f} ns/call')
+    print(parse_duration.cache_info())
+
+
+if __name__ == '__main__':
+    main()
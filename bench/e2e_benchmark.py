@@ -0,0 +1,282 @@
+"""
+End-to-end throughput of the bot against the local mock Bot API.
+
+The real bot app is built with its Bot API requests pointed at bench/mock_bot_api.py and is driven by long
+polling. Synthetic traffic is pushed into the mock getUpdates queue scenario by scenario:
+
+    chatter   plain text messages from regular members
+    commands  storm of moderation commands from admins and members, replies to members' messages
+    raid      join messages with one to three newbies each
+
+For every scenario the handling latency of an update (pushed into getUpdates -> its handler returned), throughput
+and the number of outbound Bot API calls per update are reported. Per-chat and global rate limits are lifted
+unless --rate-limits is given, so the numbers show the cost of the bot itself. --chats spreads the traffic over
+several served chats, each handled by its own lane.
+
+usage: python bench/e2e_benchmark.py [--updates N] [--latency SECONDS] [--chats N] [--scenario NAME ...]
+                                     [--rate-limits]
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from telebot import apihelper
+
+from app import create_app
+from const import OutboundSettings, RaidSettings, ChatCommand
+from dto import AppConfigDto
+from mock_bot_api import MockBotApi
+
+CHAT_ID = -1001424452281
+ADMIN_ID = 1
+SCENARIOS = ('chatter', 'commands', 'raid')
+HANDLER_TIMEOUT_SECONDS = 120
+
+message_ids = itertools.count(1)
+user_ids = itertools.count(1000)
+chat_ids = [CHAT_ID]
+
+
+def user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+
+
+def message(from_id: int, **fields) -> dict:
+    return dict({
+        'message_id': next(message_ids),
+        'date': int(time.time()),
+        'chat': {'id': random.choice(chat_ids), 'type': 'supergroup', 'title': 'Rude QA'},
+        'from': user(from_id),
+    }, **fields)
+
+
+def chatter(count: int) -> list:
+    members = [next(user_ids) for _ in range(50)]
+    return [
+        {'message': message(random.choice(members), text=f'message number {number} about testing')}
+        for number in range(count)
+    ]
+
+
+def commands(count: int) -> list:
+    members = [next(user_ids) for _ in range(50)]
+    texts = (f'{ChatCommand.RO} 10m', f'{ChatCommand.TO} 1h', ChatCommand.RW, f'{ChatCommand.BAN} 1d', '/ping')
+    updates = list()
+    for number in range(count):
+        target = message(random.choice(members), text='hello')
+        sender = ADMIN_ID if number % 4 else random.choice(members)
+        command = message(sender, text=texts[number % len(texts)], reply_to_message=target)
+        command['chat'] = target['chat']
+        updates.append({'message': command})
+
+    return updates
+
+
+def raid(count: int) -> list:
+    updates = list()
+    for _ in range(count):
+        newbies = [user(next(user_ids)) for _ in range(random.randint(1, 3))]
+        updates.append({'message': message(newbies[0]['id'], new_chat_members=newbies)})
+
+    return updates
+
+
+class HandlerProbe:
+    """
+    Wraps TeleBot task execution and chat lanes to time every handler from the moment its update was pushed
+
+    An update handed off to a chat lane is timed when the lane has run its handler, other updates are timed when
+    the TeleBot task returns.
+    """
+
+    def __init__(self, bot, partitions):
+        self._pushed_at = dict()
+        self._handed_off = set()
+        self._latencies = list()
+        self._condition = threading.Condition()
+        self._exec_task = bot._exec_task
+        bot._exec_task = self._timed_exec_task
+        for partition in partitions:
+            partition.submit = self._tracked_submit(partition.submit)
+            partition._run = self._timed_run(partition._run)
+
+    def push(self, api: MockBotApi, updates: list):
+        now = time.perf_counter()
+        with self._condition:
+            self._latencies = list()
+            for update in updates:
+                self._pushed_at[update['message']['message_id']] = now
+        api.push_updates(updates)
+
+    def wait(self, count: int) -> list:
+        deadline = time.monotonic() + HANDLER_TIMEOUT_SECONDS
+        with self._condition:
+            while len(self._latencies) < count and time.monotonic() < deadline:
+                self._condition.wait(1)
+
+            return list(self._latencies)
+
+    def _record(self, message_id, finished_at: float):
+        with self._condition:
+            pushed_at = self._pushed_at.pop(message_id, None)
+            if pushed_at is not None:
+                self._latencies.append(finished_at - pushed_at)
+                self._condition.notify_all()
+
+    def _timed_exec_task(self, task, *args, **kwargs):
+        def timed_task(*task_args, **task_kwargs):
+            try:
+                task(*task_args, **task_kwargs)
+            finally:
+                finished_at = time.perf_counter()
+                message_id = getattr(task_args[0], 'message_id', None)
+                with self._condition:
+                    handed_off = message_id in self._handed_off
+                if not handed_off:
+                    self._record(message_id, finished_at)
+
+        self._exec_task(timed_task, *args, **kwargs)
+
+    def _tracked_submit(self, submit):
+        def tracked_submit(handler, update):
+            with self._condition:
+                self._handed_off.add(getattr(update, 'message_id', None))
+            submit(handler, update)
+
+        return tracked_submit
+
+    def _timed_run(self, run):
+        def timed_run(handler, update):
+            try:
+                run(handler, update)
+            finally:
+                message_id = getattr(update, 'message_id', None)
+                with self._condition:
+                    self._handed_off.discard(message_id)
+                self._record(message_id, time.perf_counter())
+
+        return timed_run
+
+
+def outbound_calls(api: MockBotApi) -> dict:
+    calls = api.calls()
+    calls.pop('getUpdates', None)
+    return calls
+
+
+def settle(api: MockBotApi, quiet: float) -> dict:
+    """
+    Wait until outbound calls stop for `quiet` seconds
+    """
+    calls = outbound_calls(api)
+    changed_at = time.monotonic()
+    while time.monotonic() - changed_at < quiet:
+        time.sleep(0.1)
+        current = outbound_calls(api)
+        if current != calls:
+            calls = current
+            changed_at = time.monotonic()
+
+    return calls
+
+
+def percentile(values: list, rate: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * rate))]
+
+
+def run_scenario(name: str, updates: list, api: MockBotApi, probe: HandlerProbe):
+    calls_before = settle(api, 0.5)
+    started = time.perf_counter()
+    probe.push(api, updates)
+    latencies = sorted(probe.wait(len(updates)))
+    elapsed = time.perf_counter() - started
+    calls_after = settle(api, RaidSettings.BATCH_WINDOW_SECONDS + 1 if name == 'raid' else 1)
+
+    calls = {
+        method_name: count - calls_before.get(method_name, 0)
+        for method_name, count in calls_after.items()
+        if count != calls_before.get(method_name, 0)
+    }
+    if not latencies:
+        print(f'{name:<9} no update was handled')
+        return
+
+    print(
+        f'{name:<9} {len(latencies)}/{len(updates)} updates in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), '
+        f'p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, '
+        f'max {latencies[-1] * 1000:.1f} ms, {sum(calls.values()) / len(updates):.2f} API calls/update'
+    )
+    if calls:
+        print(f'{"":<9} {", ".join(f"{method_name}={count}" for method_name, count in sorted(calls.items()))}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end throughput of the bot against the mock Bot API.')
+    parser.add_argument('--updates', type=int, default=1000, help='updates per scenario')
+    parser.add_argument('--latency', type=float, default=0.02, help='mock Bot API latency, seconds')
+    parser.add_argument('--chats', type=int, default=1, help='number of served chats')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS)
+    parser.add_argument('--rate-limits', action='store_true', help='keep production outbound rate limits')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    chat_ids[:] = [CHAT_ID - number for number in range(args.chats)]
+
+    api = MockBotApi(port=0, latency=args.latency, admins=(ADMIN_ID,))
+    api.start()
+
+    make_request = apihelper._make_request
+
+    def mock_make_request(token, method_name, method='get', params=None, files=None, base_url=None):
+        return make_request(token, method_name, method, params, files, base_url=api.api_url)
+
+    apihelper._make_request = mock_make_request
+
+    if not args.rate_limits:
+        OutboundSettings.GLOBAL_RATE = OutboundSettings.GLOBAL_BURST = 10 ** 6
+        OutboundSettings.CHAT_RATE = OutboundSettings.CHAT_BURST = 10 ** 6
+
+    data_dir = tempfile.mkdtemp(prefix='rudeboy-bench-')
+    logging.basicConfig(level=os.environ.get('LOGGING_LEVEL', 'ERROR'))
+    app = create_app(
+        AppConfigDto(
+            token='123456:benchmark',
+            chat_ids=chat_ids,
+            database_path=os.path.join(data_dir, 'bench.sqlite3'),
+            audit_log_dir=os.path.join(data_dir, 'audit'),
+        ),
+        logging.getLogger(),
+    )
+    app.start()
+    probe = HandlerProbe(app.bot, app.partitions)
+    threading.Thread(
+        target=app.bot.polling,
+        kwargs=dict(none_stop=True, timeout=1),
+        name='bench-polling',
+        daemon=True,
+    ).start()
+    while not api.calls().get('getUpdates'):
+        time.sleep(0.05)
+
+    print(f'mock latency {args.latency * 1000:.0f} ms, {args.updates} updates per scenario, {args.chats} chats, '
+          f'rate limits {"on" if args.rate_limits else "off"}')
+    for name in args.scenario or SCENARIOS:
+        run_scenario(name, globals()[name](args.updates), api, probe)
+
+    app.bot.stop_polling()
+    app.close()
+    api.shutdown()
+
+
+if __name__ == '__main__':
+    main()
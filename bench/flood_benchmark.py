@@ -0,0 +1,57 @@
+"""
+Per-message cost of the flood detector.
+
+Feeds chat-like traffic (many members, few messages each, some repeated texts) into FloodDetector and reports
+the time of one register_message call, both while the tracked users fit into MAX_TRACKED_USERS and while
+members are evicted on every message.
+
+usage: python bench/flood_benchmark.py [--messages N] [--members N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from const import FloodSettings
+from flood import FloodDetector
+
+TEXTS = ('hi', 'any ideas why the build is red?', '+1', 'thanks', 'ok', 'flaky again')
+
+
+def traffic(messages: int, members: int) -> list:
+    random.seed(1)
+    now = time.monotonic()
+    return [
+        (random.randrange(members), random.choice(TEXTS) + str(random.randrange(50)), now + number * 0.01)
+        for number in range(messages)
+    ]
+
+
+def measure(messages: list) -> Tuple[float, int]:
+    detector = FloodDetector()
+    floods = 0
+    started = time.perf_counter()
+    for user_id, text, now in messages:
+        if detector.register_message(user_id, text, now):
+            floods += 1
+
+    return (time.perf_counter() - started) / len(messages), floods
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-message cost of the flood detector.')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--members', type=int, default=500)
+    args = parser.parse_args()
+
+    for members in args.members, FloodSettings.MAX_TRACKED_USERS * 10:
+        seconds, floods = measure(traffic(args.messages, members))
+        print(f'{members:>6} members: {seconds * 10 ** 9:6.0f} ns/message, {floods} floods detected')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Per-message cost of logging on the update handler thread.
+
+Compares the former style (f-strings with full telebot objects, records written synchronously by a StreamHandler)
+with lazy %-style records holding only ids, written by a QueueListener thread. Every simulated message makes
+the same log calls as a join in greeting_handler: two debug records filtered out by level and two info records.
+--sink-latency adds a delay to every write to emulate a slow disk or a blocked stderr pipe.
+
+usage: python bench/logging_benchmark.py [--messages N] [--sink-latency SECONDS]
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from telebot.types import Message
+
+from const import LoggingSettings
+
+CHAT_ID = -1001424452281
+
+
+class SlowStream:
+    def __init__(self, latency: float):
+        self._latency = latency
+        self._stream = open(os.devnull, 'w')
+
+    def write(self, text: str):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def join_message(number: int) -> Message:
+    user = {'id': 1000 + number, 'is_bot': False, 'first_name': 'Иван', 'username': f'user{number}'}
+    return Message.de_json({
+        'message_id': number,
+        'date': int(time.time()),
+        'chat': {'id': CHAT_ID, 'type': 'supergroup', 'title': 'Rude QA'},
+        'from': user,
+        'new_chat_members': [user],
+    })
+
+
+def eager(logger: logging.Logger, message: Message):
+    new_user = message.new_chat_members[0]
+    logger.info(f'New member joined the group: {new_user}')
+    logger.debug(f'Trying to add user @{new_user.username} into newbie list')
+    logger.info(f'Trying to temporary restrict all users content for @{new_user.username}')
+    logger.debug(f'Trying to update greeting {message} for newbie @{new_user.username}')
+
+
+def lazy(logger: logging.Logger, message: Message):
+    new_user = message.new_chat_members[0]
+    logger.info('New member joined the group: %s (@%s)', new_user.id, new_user.username)
+    logger.debug('Trying to add user @%s into newbie list', new_user.username)
+    logger.info('Trying to temporary restrict all users content for @%s', new_user.username)
+    logger.debug('Trying to update greeting %s for newbie @%s', message.message_id, new_user.username)
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+def measure(log_calls, logger: logging.Logger, messages: list) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        log_calls(logger, message)
+    return (time.perf_counter() - started) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--sink-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    messages = [join_message(number) for number in range(args.messages)]
+    formatter = logging.Formatter(LoggingSettings.RECORD_FORMAT, LoggingSettings.DATE_FORMAT)
+
+    stream_handler = logging.StreamHandler(SlowStream(args.sink_latency))
+    stream_handler.setFormatter(formatter)
+    before = measure(eager, make_logger('before', stream_handler), messages)
+
+    log_queue = queue.SimpleQueue()
+    listener_handler = logging.StreamHandler(SlowStream(args.sink_latency))
+    listener_handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, listener_handler)
+    listener.start()
+    after = measure(lazy, make_logger('after', QueueHandler(log_queue)), messages)
+    drain_started = time.perf_counter()
+    listener.stop()
+    drained = time.perf_counter() - drain_started
+
+    print(f'{args.messages} messages, sink latency {args.sink_latency * 1000:.2f} ms per record')
+    print(f'eager f-strings, synchronous handler: {before * 10 ** 6:8.1f} us/message')
+    print(f'lazy ids, queue handler:              {after * 10 ** 6:8.1f} us/message '
+          f'(listener drained the rest in {drained:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Implements the methods used by the bot: getUpdates, sendMessage, editMessageText, deleteMessage, restrictChatMember,
+kickChatMember, unbanChatMember, approveChatJoinRequest, declineChatJoinRequest, answerCallbackQuery, getChatMember,
+getChatAdministrators, setWebhook and deleteWebhook. Every call is delayed by the configured latency and counted by
+method. Updates pushed with `push_updates` are served by getUpdates with long polling.
+
+usage: python bench/mock_bot_api.py [--port PORT] [--latency SECONDS] [--admin USER_ID ...]
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_PORT = 8081
+BOT_ID = 100500
+BOT_USERNAME = 'rude_bot'
+MAX_LONG_POLLING_SECONDS = 1
+
+
+class MockBotApi:
+    def __init__(self, listen: str = '127.0.0.1', port: int = DEFAULT_PORT, latency: float = 0.0, admins=()):
+        self._latency = latency
+        self._admins = set(admins)
+        self._updates = list()
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(10 ** 6)
+        self._condition = threading.Condition()
+        self._calls = dict()
+        self._calls_lock = threading.Lock()
+        self._handlers = {
+            'getUpdates': self._get_updates,
+            'getMe': self._get_me,
+            'sendMessage': self._send_message,
+            'editMessageText': self._edit_message_text,
+            'deleteMessage': self._ok,
+            'restrictChatMember': self._ok,
+            'kickChatMember': self._ok,
+            'unbanChatMember': self._ok,
+            'approveChatJoinRequest': self._ok,
+            'declineChatJoinRequest': self._ok,
+            'answerCallbackQuery': self._ok,
+            'getChatMember': self._get_chat_member,
+            'getChatAdministrators': self._get_chat_administrators,
+            'setWebhook': self._ok,
+            'deleteWebhook': self._ok,
+        }
+        self._server = ThreadingHTTPServer((listen, port), self._create_request_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/bot{{0}}/{{1}}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='mock-bot-api', daemon=True).start()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_updates(self, updates: list):
+        with self._condition:
+            for update in updates:
+                update['update_id'] = next(self._update_id)
+                self._updates.append(update)
+            self._condition.notify_all()
+
+    def calls(self) -> dict:
+        with self._calls_lock:
+            return dict(self._calls)
+
+    def call(self, method_name: str, params: dict):
+        with self._calls_lock:
+            self._calls[method_name] = self._calls.get(method_name, 0) + 1
+
+        handler = self._handlers.get(method_name)
+        if handler is None:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+
+        if self._latency and method_name != 'getUpdates':
+            time.sleep(self._latency)
+
+        return 200, {'ok': True, 'result': handler(params)}
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), MAX_LONG_POLLING_SECONDS)
+        with self._condition:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            return self._updates[:limit]
+
+    @staticmethod
+    def _get_me(params: dict) -> dict:
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'RudeBoy', 'username': BOT_USERNAME}
+
+    def _send_message(self, params: dict) -> dict:
+        return self._message(params, int(time.time()))
+
+    def _edit_message_text(self, params: dict) -> dict:
+        return dict(self._message(params, int(time.time())), edit_date=int(time.time()))
+
+    def _message(self, params: dict, date: int) -> dict:
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_id)),
+            'date': date,
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'supergroup'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'RudeBoy'},
+            'text': params.get('text', ''),
+        }
+
+    def _get_chat_member(self, params: dict) -> dict:
+        user_id = int(params['user_id'])
+        return {
+            'user': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'status': 'administrator' if user_id in self._admins else 'member',
+        }
+
+    def _get_chat_administrators(self, params: dict) -> list:
+        return [
+            {'user': {'id': user_id, 'is_bot': False, 'first_name': f'admin{user_id}'}, 'status': 'administrator'}
+            for user_id in sorted(self._admins)
+        ]
+
+    @staticmethod
+    def _ok(params: dict) -> bool:
+        return True
+
+    def _create_request_handler(self):
+        api = self
+
+        class MockRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._handle(b'')
+
+            def do_POST(self):
+                self._handle(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+            def _handle(self, body: bytes):
+                url = urllib.parse.urlsplit(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if body:
+                    params.update(urllib.parse.parse_qsl(body.decode('utf-8')))
+
+                status, response = api.call(url.path.rsplit('/', 1)[-1], params)
+                payload = json.dumps(response).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the bot went away during a long poll
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return MockRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Telegram Bot API.')
+    parser.add_argument('--listen', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every API call, seconds')
+    parser.add_argument('--admin', type=int, action='append', default=[], help='chat administrator user id')
+    args = parser.parse_args()
+
+    api = MockBotApi(args.listen, args.port, args.latency, args.admin)
+    print(f'Mock Bot API is listening on {api.api_url}')
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Cost of preparing a captcha question for a newbie.
+
+Compares the former QuestionProvider, which built a new question with its InlineKeyboardMarkup on every join and had
+it serialized by telebot when the greeting was sent, with the question bank loaded from questions.dist.json, whose
+keyboards are serialized once per answer order and only get the user id joined in.
+
+usage: python bench/question_benchmark.py [--joins N]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from telebot import apihelper
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from greeting import QuestionProvider
+
+QUESTIONS_PATH = os.path.join(BENCH_DIR, '..', 'questions.dist.json')
+
+
+def legacy_question(user_id: int) -> str:
+    question = dict(
+        text='{mention}, прочитал(а) правила чата?',
+        keyboard=InlineKeyboardMarkup().row(
+            InlineKeyboardButton(text='Да, принял(а) к сведению.', callback_data='да'),
+            InlineKeyboardButton(text='Нет, но сейчас прочитаю.', callback_data='нет'),
+        ),
+        timeout=120,
+        reply={
+            'да': '*{first_name} считает, что да.*',
+            'нет': '*{first_name} считает, что нет. ¯\\_(ツ)_/¯*',
+        },
+    )
+
+    return apihelper._convert_markup(question['keyboard'])
+
+
+def bank_question(questions: QuestionProvider):
+    def prepare(user_id: int) -> str:
+        return questions.get_question().keyboard(user_id)
+
+    return prepare
+
+
+def measure(prepare, user_ids: list) -> float:
+    started = time.perf_counter()
+    for user_id in user_ids:
+        prepare(user_id)
+
+    return (time.perf_counter() - started) / len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost of preparing a captcha question for a newbie.')
+    parser.add_argument('--joins', type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    started = time.perf_counter()
+    questions = QuestionProvider.load(QUESTIONS_PATH, logging.getLogger())
+    loaded = time.perf_counter() - started
+    user_ids = [random.randint(10 ** 8, 10 ** 10) for _ in range(args.joins)]
+
+    print(f'question bank of {len(questions)} questions loaded in {loaded * 1000:.1f} ms')
+    for name, prepare in (
+            ('per join keyboard', legacy_question),
+            ('question bank', bank_question(questions)),
+    ):
+        print(f'{name:<18} {measure(prepare, user_ids) * 10 ** 6:6.2f} µs/join')
+
+
+if __name__ == '__main__':
+    main()
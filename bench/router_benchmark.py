@@ -0,0 +1,108 @@
+"""
+Cost of dispatching a plain (non-command) chat message.
+
+Compares the former chain of per-handler lambda filters wrapped by rude_qa_only/supergroup_only with
+CommandRouter, both driven through TeleBot handler matching.
+
+usage: python bench/router_benchmark.py [--messages N]
+"""
+import argparse
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from telebot import TeleBot
+from telebot.types import Message
+
+from const import ChatCommand, TelegramChatType
+from router import CommandRouter
+
+CHAT_ID = -1001424452281
+
+
+def noop(message: Message):
+    pass
+
+
+def rude_qa_only(handler):
+    def wrapper(message: Message):
+        if message.chat.id == CHAT_ID:
+            return handler(message)
+
+    return wrapper
+
+
+def supergroup_only(handler):
+    def wrapper(message: Message):
+        try:
+            if message.chat.type == TelegramChatType.SUPER_GROUP:
+                return handler(message)
+        except TypeError:
+            pass
+
+    return wrapper
+
+
+def lambda_filter_bot() -> TeleBot:
+    bot = TeleBot('', threaded=False)
+    handler = rude_qa_only(supergroup_only(noop))
+    bot.message_handler(commands=['ping', 'id', 'ver'])(handler)
+    bot.message_handler(commands=['me'])(handler)
+    bot.message_handler(func=lambda m: m.text and m.text[:4].rstrip() in [ChatCommand.RO, ChatCommand.TO])(handler)
+    bot.message_handler(func=lambda m: m.text and m.text.strip() == ChatCommand.RW)(handler)
+    bot.message_handler(func=lambda m: m.text and m.text[:5].rstrip() == ChatCommand.BAN)(handler)
+    bot.message_handler(content_types=['new_chat_members'])(rude_qa_only(noop))
+    bot.message_handler(func=lambda m: m.text and m.text == ChatCommand.PASS)(handler)
+
+    return bot
+
+
+def router_bot() -> TeleBot:
+    bot = TeleBot('', threaded=False)
+    router = CommandRouter({CHAT_ID}, bot, logging.getLogger())
+    router.command('/ping', '/id', '/ver')(noop)
+    router.command('/me')(noop)
+    router.command(ChatCommand.RO, ChatCommand.TO)(noop)
+    router.command(ChatCommand.RW, exact=True)(noop)
+    router.command(ChatCommand.BAN)(noop)
+    router.command(ChatCommand.PASS, exact=True)(noop)
+    bot.message_handler(content_types=['text'])(router.route)
+    bot.message_handler(content_types=['new_chat_members'])(rude_qa_only(noop))
+
+    return bot
+
+
+def plain_message() -> Message:
+    return Message.de_json({
+        'message_id': 1,
+        'date': 1600000000,
+        'chat': {'id': CHAT_ID, 'type': TelegramChatType.SUPER_GROUP},
+        'from': {'id': 2001, 'is_bot': False, 'first_name': 'Member'},
+        'text': 'a perfectly ordinary message about flaky tests',
+    })
+
+
+def measure(bot: TeleBot, messages: int) -> float:
+    batch = [plain_message()]
+    handlers = bot.message_handlers
+    seconds = min(timeit.repeat(lambda: bot._notify_command_handlers(handlers, batch), number=messages, repeat=5))
+
+    return seconds / messages * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-message dispatch cost for plain chat messages.')
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+
+    before = measure(lambda_filter_bot(), args.messages)
+    after = measure(router_bot(), args.messages)
+    print(f'lambda filters: {before:8.0f} ns/message')
+    print(f'command router: {after:8.0f} ns/message ({before / after:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
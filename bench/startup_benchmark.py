@@ -0,0 +1,173 @@
+"""
+Cold start time of the bot process against the local mock Bot API.
+
+Every run starts `src/rudeboy_bot.py` in a fresh interpreter with its Bot API requests pointed at
+bench/mock_bot_api.py and a data directory holding an audit log of --audit-entries entries and a blocklist of
+--blocklist-patterns words. An admin sends /ping as soon as the bot asks for updates, the run ends with the first
+reply. Reported per run, from the moment the process is spawned:
+
+    ready         the first getUpdates request reaches the mock
+    first reply   the /ping reply reaches the mock
+
+plus the ready and first_update stages the bot logs itself, which are timed from the start of its main().
+
+usage: python bench/startup_benchmark.py [--runs N] [--latency SECONDS] [--audit-entries N]
+                                         [--blocklist-patterns N]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import runpy
+import signal
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from mock_bot_api import MockBotApi
+
+CHAT_ID = -1001424452281
+ADMIN_ID = 1
+RUN_TIMEOUT_SECONDS = 60
+REPEAT_PING_SECONDS = 0.5
+SHUTDOWN_GRACE_SECONDS = 0.2
+STARTUP_RECORD = re.compile(r'Startup: (\w+) in ([\d.]+)s')
+
+
+def child(api_url: str):
+    """
+    Bot process side: patch the Bot API url, then run the real entry point
+    """
+    from telebot import apihelper
+
+    make_request = apihelper._make_request
+
+    def mock_make_request(token, method_name, method='get', params=None, files=None, base_url=None):
+        return make_request(token, method_name, method, params, files, base_url=api_url)
+
+    apihelper._make_request = mock_make_request
+
+    runpy.run_path(os.path.join(SRC_DIR, 'rudeboy_bot.py'), run_name='__main__')
+
+
+def prepare_data(data_dir: str, audit_entries: int, blocklist_patterns: int):
+    os.makedirs(os.path.join(data_dir, 'audit'))
+    with open(os.path.join(data_dir, 'audit', 'audit.000001.jsonl'), 'w', encoding='utf-8') as file:
+        for number in range(audit_entries):
+            file.write(json.dumps(dict(
+                timestamp=int(time.time()),
+                chat_id=CHAT_ID,
+                command='!ro',
+                target_id=1000 + number % 5000,
+                target_first_name='user',
+                target_username='user',
+                actor_id=ADMIN_ID,
+                actor_first_name='admin',
+                actor_username='admin',
+                duration_seconds=600,
+                duration_text='10 минут',
+            )) + '\n')
+
+    with open(os.path.join(data_dir, 'blocklist.txt'), 'w', encoding='utf-8') as file:
+        for _ in range(blocklist_patterns):
+            file.write('word ' + ''.join(random.choice(string.ascii_lowercase) for _ in range(10)) + '\n')
+
+
+def ping() -> dict:
+    return {'message': {
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': CHAT_ID, 'type': 'supergroup', 'title': 'Rude QA'},
+        'from': {'id': ADMIN_ID, 'is_bot': False, 'first_name': 'admin', 'username': 'admin'},
+        'text': '/ping',
+    }}
+
+
+def run(data_dir: str, latency: float) -> dict:
+    api = MockBotApi(port=0, latency=latency, admins=(ADMIN_ID,))
+    api.start()
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN='123456:benchmark',
+        TELEGRAM_CHAT_ID=str(CHAT_ID),
+        DATABASE_PATH=os.path.join(data_dir, 'state.sqlite3'),
+        AUDIT_LOG_DIR=os.path.join(data_dir, 'audit'),
+        BLOCKLIST_PATH=os.path.join(data_dir, 'blocklist.txt'),
+        LOGGING_LEVEL='INFO',
+    )
+    deadline = time.monotonic() + RUN_TIMEOUT_SECONDS
+    result = dict()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', api.api_url],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    try:
+        polls = 0
+        pushed_at = 0.0
+        while not api.calls().get('sendMessage'):
+            if process.poll() is not None or time.monotonic() > deadline:
+                break
+            # a ping taken while the bot drops pending updates is lost, so another one follows a later poll
+            if api.calls().get('getUpdates', 0) > polls:
+                if not polls:
+                    result['ready'] = time.perf_counter() - started
+                polls = api.calls()['getUpdates']
+                if time.monotonic() - pushed_at > REPEAT_PING_SECONDS:
+                    api.push_updates([ping()])
+                    pushed_at = time.monotonic()
+            time.sleep(0.002)
+        else:
+            result['first reply'] = time.perf_counter() - started
+            # let the handler return and log its stage
+            time.sleep(SHUTDOWN_GRACE_SECONDS)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        _, log = process.communicate(timeout=RUN_TIMEOUT_SECONDS)
+        api.shutdown()
+
+    for stage, seconds in STARTUP_RECORD.findall(log):
+        result[f'bot {stage}'] = float(seconds)
+
+    return result
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        return child(sys.argv[2])
+
+    parser = argparse.ArgumentParser(description='Cold start time of the bot process against the mock Bot API.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='mock Bot API latency, seconds')
+    parser.add_argument('--audit-entries', type=int, default=200000)
+    parser.add_argument('--blocklist-patterns', type=int, default=10000)
+    args = parser.parse_args()
+    random.seed(1)
+
+    data_dir = tempfile.mkdtemp(prefix='rudeboy-startup-')
+    prepare_data(data_dir, args.audit_entries, args.blocklist_patterns)
+
+    results = [run(data_dir, args.latency) for _ in range(args.runs)]
+    print(f'mock latency {args.latency * 1000:.0f} ms, {args.audit_entries} audit entries, '
+          f'{args.blocklist_patterns} blocklist patterns, {args.runs} runs')
+    for stage in 'ready', 'first reply', 'bot ready', 'bot first_update':
+        values = [result[stage] for result in results if stage in result]
+        if not values:
+            print(f'{stage:<17} not reached')
+            continue
+        print(f'{stage:<17} median {statistics.median(values) * 1000:7.0f} ms, '
+              f'max {max(values) * 1000:7.0f} ms, {len(values)}/{len(results)} runs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Replay recorded updates against the webhook server.
+
+usage: python bench/webhook_replay.py UPDATES_FILE [--url URL] [--secret-token TOKEN] [--repeat N]
+
+UPDATES_FILE contains one Telegram Update JSON per line, see bench/updates.sample.jsonl.
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_URL = 'http://127.0.0.1:8443/telegram'
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding='utf-8') as updates_file:
+        return [json.loads(line) for line in updates_file if line.strip()]
+
+
+def post_update(url: str, secret_token: str, update: dict) -> int:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json', SECRET_TOKEN_HEADER: secret_token},
+        method='POST',
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded updates against the webhook server.')
+    parser.add_argument('updates_file')
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--secret-token', default='')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates_file)
+    update_id = 0
+    timings = list()
+    statuses = dict()
+    for _ in range(args.repeat):
+        for update in updates:
+            update_id += 1
+            update['update_id'] = update_id
+            started = time.perf_counter()
+            status = post_update(args.url, args.secret_token, update)
+            timings.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    timings.sort()
+    print(f'requests: {len(timings)}, statuses: {statuses}')
+    print(f'p50: {statistics.median(timings) * 1000:.2f} ms, '
+          f'p99: {timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000:.2f} ms, '
+          f'max: {timings[-1] * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+#!/bin/sh
+set -e
+
+if [ -e bench/e2e_benchmark.py ]; then
+    echo "Starting benchmarks..."
+else
+    echo "Benchmarks not found, skipping."
+    exit 0
+fi
+
+python bench/e2e_benchmark.py --updates "${BENCHMARK_UPDATES:-200}" --latency "${BENCHMARK_LATENCY:-0.01}"
+python bench/startup_benchmark.py --runs 3 --latency "${BENCHMARK_LATENCY:-0.01}"
+
+echo "Done."
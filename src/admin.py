@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from typing import Dict, FrozenSet, Set
+
+from telebot import TeleBot
+from telebot.apihelper import ApiException
+
+from const import AdminCacheSettings
+from scheduler import TaskScheduler, ScheduledTask
+
+
+class AdminCache:
+    """
+    Chat administrators cache.
+
+    An admin set is fetched synchronously on the first check only, afterwards it is refreshed in the background
+    every TTL seconds, so admin checks are plain set lookups. Handler filters run on the receiving thread shared by
+    all chats, they peek() instead and never wait for the Bot API.
+    """
+    _admins: Dict[int, FrozenSet[int]]
+    _fetched_at: Dict[int, float]
+    _timers: Dict[int, ScheduledTask]
+    _refreshing: Set[int]
+    _logger: logging.Logger
+
+    def __init__(self, bot: TeleBot, scheduler: TaskScheduler, logger: logging.Logger):
+        self._bot = bot
+        self._scheduler = scheduler
+        self._admins = dict()
+        self._fetched_at = dict()
+        self._timers = dict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._logger = logger
+
+    def is_admin(self, chat_id: int, user_id: int, confirm_negative: bool = False) -> bool:
+        """
+        Check admin rights using cached admin set
+
+        confirm_negative: re-fetch the admin set before answering "no", unless it was fetched just now.
+        Use it when a negative answer leads to a punishment, so a freshly promoted admin is not punished.
+        """
+        admins = self._admins.get(chat_id)
+        if admins is None:
+            return user_id in self._fetch(chat_id)
+
+        age = time.time() - self._fetched_at[chat_id]
+        if user_id not in admins and confirm_negative and age > AdminCacheSettings.CONFIRM_INTERVAL_SECONDS:
+            return user_id in self._fetch(chat_id)
+
+        if age > AdminCacheSettings.TTL_SECONDS:
+            self._refresh_async(chat_id)
+
+        return user_id in admins
+
+    def peek(self, chat_id: int, user_id: int) -> bool:
+        """
+        Check admin rights without calling the Bot API
+
+        An admin set which is not fetched yet is fetched in the background and nobody is an admin until then, so
+        a negative answer must be confirmed with is_admin() in the chat lane before anyone is punished.
+        """
+        admins = self._admins.get(chat_id)
+        if admins is None:
+            self._refresh_async(chat_id)
+            return False
+
+        if time.time() - self._fetched_at[chat_id] > AdminCacheSettings.TTL_SECONDS:
+            self._refresh_async(chat_id)
+
+        return user_id in admins
+
+    def prefetch(self, chat_id: int):
+        """
+        Fetch the admin set in the background, so the first checks find it cached
+        """
+        self._refresh_async(chat_id)
+
+    def invalidate(self, chat_id: int):
+        self._logger.info('Admin list for chat %s invalidated', chat_id)
+        with self._lock:
+            if chat_id in self._fetched_at:
+                self._fetched_at[chat_id] = 0
+        self._refresh_async(chat_id)
+
+    def _refresh_async(self, chat_id: int):
+        with self._lock:
+            if chat_id in self._refreshing:
+                return
+            self._refreshing.add(chat_id)
+
+        self._scheduler.schedule(0, self._refresh, (chat_id,))
+
+    def _refresh(self, chat_id: int):
+        try:
+            self._fetch(chat_id)
+        except ApiException:
+            self._logger.error('Can not refresh admin list for chat %s', chat_id)
+        finally:
+            with self._lock:
+                self._refreshing.discard(chat_id)
+
+    def _fetch(self, chat_id: int) -> FrozenSet[int]:
+        admins = frozenset(member.user.id for member in self._bot.get_chat_administrators(chat_id))
+        with self._lock:
+            self._admins[chat_id] = admins
+            self._fetched_at[chat_id] = time.time()
+
+            timer = self._timers.get(chat_id)
+            if timer is not None:
+                timer.cancel()
+            self._timers[chat_id] = self._scheduler.schedule(
+                AdminCacheSettings.TTL_SECONDS,
+                self._refresh_async,
+                (chat_id,)
+            )
+        self._logger.debug('Admin list for chat %s fetched: %s admins', chat_id, len(admins))
+
+        return admins
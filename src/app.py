@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from audit import AuditLog
+from blocklist import BlocklistWatcher
+from const import MetricName, HandlerSettings, OutboundSettings, UpdateMode, StartupStage
+from database import StateDatabase
+from dto import AppConfigDto
+from executor import KeyedExecutor
+from greeting import QuestionProvider
+from handlers import register_handlers
+from metrics import Metrics, MetricsServer
+from outbound import ThrottledTeleBot, OutboundDispatcher
+from partition import ChatPartition, ChatPartitionMap
+from router import CommandRouter, CallbackRouter
+from scheduler import TaskScheduler
+
+
+class App:
+    """
+    The bot with its storages, chat partitions and handlers, built by create_app.
+
+    Building an app neither calls the Bot API nor starts serving, so the handlers can be driven through a fake bot.
+    start() restores timers and starts background work, run() receives updates until interrupted and close() flushes
+    the storages. Startup is timed from `started_at` until updates are received (ready) and until the first update
+    is handled, both are logged and exported as STARTUP_SECONDS.
+    """
+    _config: AppConfigDto
+    _bot: ThrottledTeleBot
+    _database: Optional[StateDatabase]
+    _audit_log: Optional[AuditLog]
+    _scheduler: TaskScheduler
+    _metrics: Metrics
+    _executor: KeyedExecutor
+    _partitions: ChatPartitionMap
+    _router: CommandRouter
+    _callback_router: CallbackRouter
+    _blocklist_watcher: Optional[BlocklistWatcher]
+    _questions: QuestionProvider
+    _startup: Dict[str, float]
+    _logger: logging.Logger
+
+    def __init__(self, config: AppConfigDto, bot: ThrottledTeleBot, started_at: float, logger: logging.Logger):
+        self._config = config
+        self._bot = bot
+        self._started_at = started_at
+        self._ready = threading.Event()
+        self._startup = dict()
+        self._logger = logger
+
+        self._database = StateDatabase(
+            config.database_path,
+            config.chat_ids[0] if len(config.chat_ids) == 1 else None,
+            logger,
+        ) if config.database_path else None
+        self._audit_log = AuditLog(config.audit_log_dir, logger) if config.audit_log_dir else None
+        self._scheduler = TaskScheduler(logger)
+        self._metrics = Metrics()
+        self._executor = KeyedExecutor(HandlerSettings.WORKER_THREADS, logger)
+        self._partitions = ChatPartitionMap()
+        for chat_id in config.chat_ids:
+            self._partitions.add(ChatPartition(
+                chat_id,
+                bot,
+                self._scheduler,
+                self._executor,
+                self._database,
+                self._audit_log,
+                config.chat_settings.get(chat_id),
+                logger,
+            ))
+        self._partitions.set_handled_listener(self._first_update_handled)
+        self._router = CommandRouter(self._partitions, bot, logger)
+        self._callback_router = CallbackRouter(bot, logger)
+        self._blocklist_watcher = None
+        if config.blocklist_path:
+            self._blocklist_watcher = BlocklistWatcher(config.blocklist_path, self._scheduler, logger)
+        self._questions = QuestionProvider.load(config.questions_path, logger)
+
+        self._register_gauges()
+        register_handlers(
+            bot,
+            self._router,
+            self._callback_router,
+            self._partitions,
+            self._metrics,
+            self._audit_log,
+            self._blocklist_watcher,
+            self._questions,
+            config.admission_mode,
+            logger,
+        )
+
+    @property
+    def bot(self) -> ThrottledTeleBot:
+        return self._bot
+
+    @property
+    def database(self) -> Optional[StateDatabase]:
+        return self._database
+
+    @property
+    def audit_log(self) -> Optional[AuditLog]:
+        return self._audit_log
+
+    @property
+    def scheduler(self) -> TaskScheduler:
+        return self._scheduler
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._metrics
+
+    @property
+    def partitions(self) -> ChatPartitionMap:
+        return self._partitions
+
+    @property
+    def blocklist_watcher(self) -> Optional[BlocklistWatcher]:
+        return self._blocklist_watcher
+
+    @property
+    def questions(self) -> QuestionProvider:
+        return self._questions
+
+    @property
+    def ready(self) -> threading.Event:
+        """
+        Set once updates are being received
+        """
+        return self._ready
+
+    @property
+    def startup(self) -> Dict[str, float]:
+        """
+        Seconds from start to every passed StartupStage
+        """
+        return dict(self._startup)
+
+    def start(self):
+        for partition in self._partitions:
+            partition.admin_cache.prefetch(partition.chat_id)
+            partition.methods.restore_scheduled_tasks()
+        if self._blocklist_watcher is not None:
+            self._blocklist_watcher.start()
+        if self._config.metrics_port is not None:
+            MetricsServer(
+                metrics=self._metrics,
+                listen=self._config.metrics_listen,
+                port=self._config.metrics_port,
+                ready=self._ready,
+                logger=self._logger,
+            ).start()
+
+    def run(self):
+        if self._config.update_mode == UpdateMode.WEBHOOK:
+            self._run_webhook()
+        else:
+            self._run_polling()
+
+    def close(self):
+        if self._audit_log is not None:
+            self._audit_log.close()
+        if self._database is not None:
+            self._database.close()
+
+    def _run_webhook(self):
+        # the HTTP server stack is only needed in webhook mode
+        from webhook import WebhookServer
+
+        server = WebhookServer(
+            bot=self._bot,
+            listen=self._config.webhook_listen,
+            port=self._config.webhook_port,
+            secret_token=self._config.webhook_secret_token,
+            logger=self._logger,
+        )
+        server.register(self._config.webhook_url)
+        self._set_ready()
+        server.serve_forever()
+
+    def _run_polling(self):
+        # one request instead of remove_webhook and skip_pending, the latter long polls for a second on every start
+        self._bot.delete_webhook(drop_pending_updates=True)
+        self._set_ready()
+        self._bot.polling()
+
+    def _set_ready(self):
+        self._mark_startup(StartupStage.READY)
+        self._ready.set()
+
+    def _first_update_handled(self):
+        self._partitions.set_handled_listener(None)
+        if StartupStage.FIRST_UPDATE not in self._startup:
+            self._mark_startup(StartupStage.FIRST_UPDATE)
+
+    def _mark_startup(self, stage: str):
+        seconds = time.perf_counter() - self._started_at
+        self._startup[stage] = seconds
+        self._logger.info('Startup: %s in %.3fs', stage, seconds)
+
+    def _register_gauges(self):
+        self._metrics.gauge(
+            MetricName.PENDING_TIMERS,
+            'Scheduled tasks waiting',
+            lambda: self._scheduler.stats().queue_depth,
+        )
+        self._metrics.gauge(
+            MetricName.NEWBIE_STORAGE_SIZE,
+            'Newbies waiting for answer',
+            lambda: sum(len(chat.newbie_storage) for chat in self._partitions),
+        )
+        self._metrics.gauge(
+            MetricName.NEWBIE_STORAGE_EVICTED,
+            'Newbies evicted from full storage without kick since start',
+            lambda: sum(chat.newbie_storage.evicted for chat in self._partitions),
+        )
+        self._metrics.gauge(
+            MetricName.RESTRICTION_STORAGE_SIZE,
+            'Restrictions waiting for restore',
+            lambda: sum(len(chat.restriction_storage) for chat in self._partitions),
+        )
+        self._metrics.gauge(
+            MetricName.RESTRICTION_STORAGE_EVICTED,
+            'Expired restrictions evicted since start',
+            lambda: sum(chat.restriction_storage.evicted for chat in self._partitions),
+        )
+        self._metrics.gauge(
+            MetricName.MEMBER_MIRROR_SIZE,
+            'Chat members mirrored from chat_member updates',
+            lambda: sum(len(chat.member_mirror) for chat in self._partitions),
+        )
+        self._metrics.labeled_gauge(
+            MetricName.HANDLER_QUEUE_DEPTH,
+            'Updates waiting for handler or being handled',
+            'chat',
+            lambda: {chat.chat_id: chat.queue_depth for chat in self._partitions},
+        )
+        self._metrics.labeled_gauge(
+            MetricName.STARTUP_SECONDS,
+            'Seconds from start to a startup stage',
+            'stage',
+            lambda: dict(self._startup),
+        )
+
+
+def create_app(
+        config: AppConfigDto,
+        logger: logging.Logger,
+        bot: Optional[ThrottledTeleBot] = None,
+        started_at: Optional[float] = None,
+) -> App:
+    """
+    Build the app, a bot talking to the Bot API is created unless another bot is given
+
+    A fake bot overrides ThrottledTeleBot.submit() to answer API calls itself. started_at is the time.perf_counter()
+    value startup is timed from, now by default.
+    """
+    if started_at is None:
+        started_at = time.perf_counter()
+
+    if bot is not None:
+        return App(config, bot, started_at, logger)
+
+    bot = ThrottledTeleBot(
+        token=config.token,
+        # updates are only routed on the receiving thread, handlers run in the keyed executor in update order
+        threaded=False,
+    )
+    bot.share_http_session(OutboundSettings.HTTP_POOL_SIZE)
+    app = App(config, bot, started_at, logger)
+    bot.set_dispatcher(OutboundDispatcher(app.scheduler, app.metrics, logger))
+
+    return app
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, List, Tuple, Optional
+
+from const import AuditSettings
+from dto import AuditEntryDto
+from error import AuditLogUnavailableError
+
+_SEGMENT_NAME = re.compile(r'^audit\.(\d+)\.jsonl$')
+
+# segment number, byte offset of the entry line
+EntryLocation = Tuple[int, int]
+
+
+class AuditLog:
+    """
+    Append-only log of moderation actions, one JSON line per action.
+
+    Entries are queued and written in batches by a single writer thread, every batch is fsynced once. The log is
+    split into numbered segments of up to MAX_SEGMENT_BYTES, only the last MAX_SEGMENTS are kept. An in-memory
+    index keeps byte offsets of entries by chat and target user, so a history lookup reads only the lines it
+    returns. The index is rebuilt from the segments by the writer thread before its first batch, so opening the log
+    does not hold up startup; history lookups wait for it up to HISTORY_WAIT_SECONDS.
+
+    A batch that fails to be written may leave a part of it at the end of the segment, the next batch is written to a
+    fresh segment, so offsets of later entries stay right.
+    """
+    _queue: queue.Queue
+    _index: Dict[Tuple[int, int], List[EntryLocation]]
+    _segments: List[int]
+    _logger: logging.Logger
+
+    def __init__(self, directory: str, logger: logging.Logger):
+        self._directory = directory
+        self._logger = logger
+        self._queue = queue.Queue()
+        self._index = dict()
+        self._lock = threading.Lock()
+        self._indexed = False
+        self._indexed_condition = threading.Condition(self._lock)
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(found.group(1)) for found in map(_SEGMENT_NAME.match, os.listdir(directory)) if found
+        )
+        if not self._segments:
+            self._segments.append(1)
+
+        self._file = open(self._segment_path(self._segments[-1]), 'ab')
+        self._size = self._file.tell()
+        self._logger.info('Audit log opened: %s, %s segments', directory, len(self._segments))
+
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, entry: AuditEntryDto):
+        self._queue.put(entry)
+
+    def history(self, chat_id: int, user_id: int, limit: int = AuditSettings.HISTORY_LIMIT) -> List[AuditEntryDto]:
+        """
+        Get the latest written entries about a target user, the newest first
+
+        Raises AuditLogUnavailableError while the index is still being built
+        """
+        with self._lock:
+            if not self._indexed_condition.wait_for(lambda: self._indexed, AuditSettings.HISTORY_WAIT_SECONDS):
+                raise AuditLogUnavailableError()
+            locations = self._index.get((chat_id, user_id), [])[-limit:]
+
+        entries = list()
+        files = dict()
+        try:
+            for segment, offset in reversed(locations):
+                file = files.get(segment)
+                if file is None:
+                    file = open(self._segment_path(segment), 'rb')
+                    files[segment] = file
+                file.seek(offset)
+                entries.append(AuditEntryDto.from_dict(json.loads(file.readline())))
+        except (OSError, ValueError):
+            self._logger.exception('Audit log: can not read history of %s in chat %s', user_id, chat_id)
+        finally:
+            for file in files.values():
+                file.close()
+
+        return entries
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._logger.info('Audit log closed')
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f'audit.{segment:06d}.jsonl')
+
+    def _build_index(self):
+        started = time.perf_counter()
+        index = dict()
+        try:
+            for segment in self._segments:
+                self._index_segment(segment, index)
+        except OSError:
+            self._logger.exception('Audit log: can not index %s', self._directory)
+        finally:
+            with self._lock:
+                self._index = index
+                self._indexed = True
+                self._indexed_condition.notify_all()
+        self._logger.info('Audit log indexed in %.2fs', time.perf_counter() - started)
+
+    def _index_segment(self, segment: int, index: Dict[Tuple[int, int], List[EntryLocation]]):
+        offset = 0
+        with open(self._segment_path(segment), 'rb') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    index.setdefault((entry['chat_id'], entry['target_id']), []).append((segment, offset))
+                except (ValueError, KeyError):
+                    self._logger.warning('Audit log: broken entry at %s:%s skipped', segment, offset)
+                offset += len(line)
+
+    def _run(self):
+        self._build_index()
+        running = True
+        while running:
+            entry = self._queue.get()
+            if entry is None:
+                break
+
+            batch = [entry]
+            deadline = time.time() + AuditSettings.FLUSH_INTERVAL_SECONDS
+            while len(batch) < AuditSettings.FLUSH_BATCH_SIZE:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+
+            self._write(batch)
+
+    def _write(self, batch: List[AuditEntryDto]):
+        if self._size >= AuditSettings.MAX_SEGMENT_BYTES:
+            try:
+                self._rotate()
+            except OSError:
+                self._logger.exception('Audit log: can not open a new segment, %s entries dropped', len(batch))
+                return
+
+        segment = self._segments[-1]
+        locations = list()
+        lines = list()
+        offset = self._size
+        for entry in batch:
+            line = json.dumps(entry.to_dict(), ensure_ascii=False).encode('utf-8') + b'\n'
+            locations.append(((entry.chat_id, entry.target_id), (segment, offset)))
+            lines.append(line)
+            offset += len(line)
+
+        try:
+            self._file.write(b''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            self._logger.exception('Audit log: can not write %s entries', len(batch))
+            # the segment may end with a part of the batch, the next batch starts a fresh one
+            self._size = AuditSettings.MAX_SEGMENT_BYTES
+            return
+
+        self._size = offset
+        with self._lock:
+            for key, location in locations:
+                self._index.setdefault(key, []).append(location)
+        self._logger.debug('Audit log: %s entries written', len(batch))
+
+    def _rotate(self):
+        try:
+            self._file.close()
+        except OSError:
+            self._logger.exception('Audit log: can not close segment %s', self._segments[-1])
+        segment = self._segments[-1] + 1
+        self._file = open(self._segment_path(segment), 'ab')
+        self._segments.append(segment)
+        self._size = 0
+
+        while len(self._segments) > AuditSettings.MAX_SEGMENTS:
+            expired = self._segments.pop(0)
+            with self._lock:
+                for key in list(self._index):
+                    locations = [location for location in self._index[key] if location[0] != expired]
+                    if locations:
+                        self._index[key] = locations
+                    else:
+                        del self._index[key]
+            try:
+                os.remove(self._segment_path(expired))
+            except OSError:
+                self._logger.exception('Audit log: can not remove segment %s', expired)
+        self._logger.info('Audit log rotated to segment %s', self._segments[-1])
@@ -0,0 +1,201 @@
+import logging
+import os
+import re
+from typing import Dict, Optional, Iterable, Pattern
+
+from telebot.types import Message
+
+from const import BlocklistSettings, BlocklistAction
+from scheduler import TaskScheduler
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex alternation of words, factored by common prefixes
+
+    re tries alternatives of a flat alternation one by one at every position, a trie shaped pattern rejects
+    a position after looking at a few characters whatever the number of words.
+    """
+    trie = dict()
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, dict())
+        node[''] = None
+
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    branches = [re.escape(char) + _node_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        return ('(?:' + pattern + ')' if len(branches) == 1 else pattern) + '?'
+
+    return pattern
+
+
+class Blocklist:
+    """
+    Blocked words, domains and regular expressions compiled into one regex.
+
+    Words and domains are factored into tries and looked up with the matched text, every regular expression gets
+    its own named group. Message text, caption and hidden urls of text links are scanned in a single pass,
+    the most severe action of all matches wins.
+    """
+    _pattern: Optional[Pattern]
+    _words: Dict[str, str]
+    _domains: Dict[str, str]
+    _regex_actions: Dict[str, str]
+
+    def __init__(self, words: Dict[str, str], domains: Dict[str, str], regexes: Dict[str, str]):
+        self._words = words
+        self._domains = domains
+        self._regex_actions = dict()
+
+        alternatives = list()
+        if words:
+            alternatives.append(r'(?<!\w)(?P<word>' + trie_pattern(words) + r')(?!\w)')
+        if domains:
+            alternatives.append(r'(?<![\w-])(?P<domain>' + trie_pattern(domains) + r')(?![\w-]|\.[\w-])')
+        for number, (regex, action) in enumerate(regexes.items()):
+            group = f'regex{number}'
+            alternatives.append(f'(?P<{group}>{regex})')
+            self._regex_actions[group] = action
+
+        self._pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def __len__(self) -> int:
+        return len(self._words) + len(self._domains) + len(self._regex_actions)
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Get the most severe action for blocked entries found in text, None if nothing is found
+        """
+        if self._pattern is None:
+            return None
+
+        result = None
+        for found in self._pattern.finditer(text.lower()):
+            group = found.lastgroup
+            if group == 'word':
+                action = self._words[found.group(group)]
+            elif group == 'domain':
+                action = self._domains[found.group(group)]
+            else:
+                action = self._regex_actions[group]
+
+            if result is None or BlocklistAction.SEVERITY.index(action) > BlocklistAction.SEVERITY.index(result):
+                result = action
+                if action == BlocklistAction.SEVERITY[-1]:
+                    break
+
+        return result
+
+    def match_message(self, message: Message) -> Optional[str]:
+        text = message.text or message.caption
+        entities = message.entities or message.caption_entities
+        if entities:
+            urls = [entity.url for entity in entities if entity.url]
+            if urls:
+                text = '\n'.join([text or ''] + urls)
+
+        return self.match(text) if text else None
+
+    @classmethod
+    def parse(cls, lines: Iterable[str], logger: logging.Logger) -> 'Blocklist':
+        """
+        Build blocklist from lines of `<kind>[:<action>] <pattern>`
+
+        kind: word (a word or a phrase), domain or regex; action: delete (default), ro or ban. The pattern takes
+        the rest of the line, regexes are matched against lowercased text. Empty lines and lines starting with #
+        are skipped, invalid lines are logged and skipped.
+        """
+        entries = dict(word=dict(), domain=dict(), regex=dict())
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            head, _, pattern = line.partition(' ')
+            kind, _, action = head.partition(':')
+            action = action or BlocklistAction.DELETE
+            pattern = pattern.strip()
+            if not pattern or kind not in entries or action not in BlocklistAction.SEVERITY:
+                logger.warning('Invalid blocklist line %s skipped: %s', number, line)
+                continue
+
+            if kind != 'regex':
+                pattern = pattern.lower()
+            else:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    logger.warning('Invalid blocklist regex on line %s skipped: %s', number, e)
+                    continue
+
+            entries[kind][pattern] = action
+
+        return cls(entries['word'], entries['domain'], entries['regex'])
+
+
+class BlocklistWatcher:
+    """
+    Keeps the blocklist file compiled, the file is checked for changes every RELOAD_INTERVAL_SECONDS
+
+    A new blocklist is compiled aside and swapped in with one assignment, so messages are never checked against
+    a half built one. A missing file means an empty blocklist. The first load runs on the scheduler as well, a big
+    list is compiled while the bot already receives updates.
+    """
+    _blocklist: Blocklist
+    _mtime: Optional[float]
+    _logger: logging.Logger
+
+    def __init__(self, path: str, scheduler: TaskScheduler, logger: logging.Logger):
+        self._path = path
+        self._scheduler = scheduler
+        self._blocklist = Blocklist(dict(), dict(), dict())
+        self._mtime = None
+        self._logger = logger
+
+    @property
+    def blocklist(self) -> Blocklist:
+        return self._blocklist
+
+    def start(self):
+        self._scheduler.schedule(0, self._load)
+
+    def _load(self):
+        try:
+            self._reload_if_changed()
+            if self._mtime is None:
+                self._logger.info('Blocklist %s not found, blocklist is empty', self._path)
+        finally:
+            self._scheduler.schedule(BlocklistSettings.RELOAD_INTERVAL_SECONDS, self._poll)
+
+    def _poll(self):
+        try:
+            self._reload_if_changed()
+        finally:
+            self._scheduler.schedule(BlocklistSettings.RELOAD_INTERVAL_SECONDS, self._poll)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError:
+            if self._mtime is not None:
+                self._logger.info('Blocklist %s removed, blocklist is empty', self._path)
+                self._mtime = None
+                self._blocklist = Blocklist(dict(), dict(), dict())
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with open(self._path, encoding='utf-8') as file:
+            self._blocklist = Blocklist.parse(file, self._logger)
+        self._mtime = mtime
+        self._logger.info('Blocklist %s loaded: %s entries', self._path, len(self._blocklist))
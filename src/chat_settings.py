@@ -0,0 +1,123 @@
+import json
+import logging
+from typing import Dict, Optional, List, Type
+
+from const import ChatSettings, NotificationTemplateList, BaseDuration, RestrictDuration, BanDuration
+from dto import ChatSettingsDto
+from duration import parse_duration
+from error import ParseBanDurationError
+
+
+class ChatSettingsLoader:
+    """
+    Per-chat notification templates and duration limits, loaded once at startup.
+
+    The file maps chat ids to `{"templates": {"read_only": [...], ...}, "restrict_duration": {"default", "min",
+    "max"}, "ban_duration": {...}}`, every section and key is optional. Overrides are subclasses of the const classes,
+    so a chat keeps the defaults it does not override and duration parsing stays cached per chat.
+    """
+
+    @classmethod
+    def default(cls) -> ChatSettingsDto:
+        return ChatSettingsDto(
+            templates=NotificationTemplateList,
+            restrict_duration=RestrictDuration,
+            ban_duration=BanDuration,
+        )
+
+    @classmethod
+    def load(cls, path: Optional[str], chat_ids: List[int], logger: logging.Logger) -> Dict[int, ChatSettingsDto]:
+        """
+        Load settings of served chats from a JSON file, a chat without valid settings keeps the defaults
+        """
+        settings = dict()
+        if path is not None:
+            try:
+                with open(path, encoding='utf-8') as file:
+                    settings = json.load(file)
+            except FileNotFoundError:
+                logger.info('Chat settings file %s not found, default settings are used', path)
+            except (OSError, ValueError) as e:
+                logger.error('Can not load chat settings file %s, default settings are used: %s', path, e)
+        if not isinstance(settings, dict):
+            logger.error('Chat settings file %s must map chat ids to settings, default settings are used', path)
+            settings = dict()
+
+        result = dict()
+        for key, chat_settings in settings.items():
+            try:
+                chat_id = int(key)
+            except ValueError:
+                logger.warning('Settings of invalid chat id %s skipped', key)
+                continue
+            if chat_id not in chat_ids:
+                logger.warning('Settings of chat %s skipped, the chat is not served', chat_id)
+                continue
+
+            try:
+                result[chat_id] = cls.parse(chat_settings)
+            except (KeyError, TypeError, ValueError, AttributeError, ParseBanDurationError) as e:
+                logger.error('Invalid settings of chat %s, default settings are used: %r', chat_id, e)
+                continue
+            logger.info('Settings of chat %s loaded', chat_id)
+
+        return result
+
+    @classmethod
+    def parse(cls, settings: dict) -> ChatSettingsDto:
+        unknown = set(settings) - {ChatSettings.TEMPLATES, ChatSettings.RESTRICT_DURATION, ChatSettings.BAN_DURATION}
+        if unknown:
+            raise ValueError(f'unknown sections {", ".join(sorted(unknown))}')
+
+        return ChatSettingsDto(
+            templates=cls._templates(settings.get(ChatSettings.TEMPLATES, {})),
+            restrict_duration=cls._duration_class(RestrictDuration, settings.get(ChatSettings.RESTRICT_DURATION, {})),
+            ban_duration=cls._duration_class(BanDuration, settings.get(ChatSettings.BAN_DURATION, {})),
+        )
+
+    @staticmethod
+    def _templates(templates: dict) -> type:
+        overrides = dict()
+        for name, texts in templates.items():
+            attribute = name.upper()
+            if not isinstance(getattr(NotificationTemplateList, attribute, None), list):
+                raise ValueError(f'unknown template list {name}')
+            if not isinstance(texts, list) or not texts:
+                raise ValueError(f'template list {name} must be a non-empty list')
+
+            # every placeholder a template may use, a missing or unknown one fails here instead of in a handler
+            for text in texts:
+                str(text).format(first_name='', duration_text='', names='')
+            overrides[attribute] = [str(text) for text in texts]
+
+        if not overrides:
+            return NotificationTemplateList
+
+        return type(NotificationTemplateList.__name__, (NotificationTemplateList,), overrides)
+
+    @staticmethod
+    def _duration_class(base: Type[BaseDuration], limits: dict) -> Type[BaseDuration]:
+        unknown = set(limits) - {ChatSettings.DURATION_DEFAULT, ChatSettings.DURATION_MIN, ChatSettings.DURATION_MAX}
+        if unknown:
+            raise ValueError(f'unknown duration limits {", ".join(sorted(unknown))}')
+
+        overrides = dict()
+        if ChatSettings.DURATION_MIN in limits:
+            overrides['MIN_DURATION'] = parse_duration(str(limits[ChatSettings.DURATION_MIN]), base)
+        if ChatSettings.DURATION_MAX in limits:
+            overrides['MAX_DURATION'] = parse_duration(str(limits[ChatSettings.DURATION_MAX]), base)
+        if ChatSettings.DURATION_DEFAULT in limits:
+            # a default is a single `<amount><unit>` token, it is expanded by parse_duration like typed text
+            default = str(limits[ChatSettings.DURATION_DEFAULT])
+            if default[-1:] not in base.UNITS:
+                raise ValueError(f'default duration {default} must be an amount with a unit')
+            overrides['DEFAULT_DURATION'] = int(default[:-1])
+            overrides['DEFAULT_UNIT'] = default[-1]
+        if not overrides:
+            return base
+
+        duration_class = type(base.__name__, (base,), overrides)
+        if duration_class.MIN_DURATION.seconds > duration_class.MAX_DURATION.seconds:
+            raise ValueError(f'{base.__name__} minimum is longer than maximum')
+
+        return duration_class
@@ -3,6 +3,7 @@ from dto import PluralFormsDto, DurationDto
 
 class TelegramChatType:
     SUPER_GROUP = 'supergroup'
+    PRIVATE = 'private'
 
 
 class TelegramParseMode:
@@ -19,6 +20,22 @@ class TelegramMemberStatus:
     KICKED = 'kicked'
 
 
+class TelegramUpdateType:
+    MESSAGE = 'message'
+    CALLBACK_QUERY = 'callback_query'
+    CHAT_MEMBER = 'chat_member'
+    MY_CHAT_MEMBER = 'my_chat_member'
+    CHAT_JOIN_REQUEST = 'chat_join_request'
+
+    # chat member updates are only sent when asked for explicitly
+    ALLOWED = (MESSAGE, CALLBACK_QUERY, CHAT_MEMBER, MY_CHAT_MEMBER, CHAT_JOIN_REQUEST)
+
+
+class TelegramApiError:
+    USER_IS_ADMINISTRATOR = 'user is an administrator of the chat'
+    CHAT_OWNER = 'chat owner'
+
+
 class LoggingSettings:
     RECORD_FORMAT = '%(asctime)s %(levelname)s %(message)s'
     DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -29,6 +46,68 @@ class EnvVar:
     TELEGRAM_TOKEN = 'TELEGRAM_TOKEN'
     TELEGRAM_CHAT_ID = 'TELEGRAM_CHAT_ID'
     LOGGING_LEVEL = 'LOGGING_LEVEL'
+    DATABASE_PATH = 'DATABASE_PATH'
+    UPDATE_MODE = 'UPDATE_MODE'
+    WEBHOOK_URL = 'WEBHOOK_URL'
+    WEBHOOK_LISTEN = 'WEBHOOK_LISTEN'
+    WEBHOOK_PORT = 'WEBHOOK_PORT'
+    WEBHOOK_SECRET_TOKEN = 'WEBHOOK_SECRET_TOKEN'
+    METRICS_LISTEN = 'METRICS_LISTEN'
+    METRICS_PORT = 'METRICS_PORT'
+    BLOCKLIST_PATH = 'BLOCKLIST_PATH'
+    AUDIT_LOG_DIR = 'AUDIT_LOG_DIR'
+    ADMISSION_MODE = 'ADMISSION_MODE'
+    QUESTIONS_PATH = 'QUESTIONS_PATH'
+    CHAT_SETTINGS_PATH = 'CHAT_SETTINGS_PATH'
+
+
+class UpdateMode:
+    POLLING = 'polling'
+    WEBHOOK = 'webhook'
+
+
+class AdmissionMode:
+    # newbies join and answer the captcha in the chat while restricted
+    GREETING = 'greeting'
+    # newbies answer the captcha in private chat before their join request is approved
+    JOIN_REQUEST = 'join_request'
+
+
+class WebhookSettings:
+    DEFAULT_LISTEN = '0.0.0.0'
+    DEFAULT_PORT = '8443'
+    PATH = '/telegram'
+    SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+    MAX_BODY_SIZE = 1048576
+    # Telegram posts the next update only after the previous one is answered, so updates arrive in update_id order
+    MAX_CONNECTIONS = 1
+
+
+class MetricsSettings:
+    DEFAULT_LISTEN = '0.0.0.0'
+    PATH = '/metrics'
+    READY_PATH = '/ready'
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricName:
+    HANDLER_DURATION = 'rudeboy_handler_duration_seconds'
+    API_CALL_DURATION = 'rudeboy_api_call_duration_seconds'
+    API_ERRORS = 'rudeboy_api_errors_total'
+    PENDING_TIMERS = 'rudeboy_pending_timers'
+    NEWBIE_STORAGE_SIZE = 'rudeboy_newbie_storage_size'
+    NEWBIE_STORAGE_EVICTED = 'rudeboy_newbie_storage_evicted'
+    RESTRICTION_STORAGE_SIZE = 'rudeboy_restriction_storage_size'
+    RESTRICTION_STORAGE_EVICTED = 'rudeboy_restriction_storage_evicted'
+    MEMBER_MIRROR_SIZE = 'rudeboy_member_mirror_size'
+    HANDLER_QUEUE_DEPTH = 'rudeboy_handler_queue_depth'
+    STARTUP_SECONDS = 'rudeboy_startup_seconds'
+
+
+class StartupStage:
+    READY = 'ready'
+    FIRST_UPDATE = 'first_update'
 
 
 class ChatCommand:
@@ -37,6 +116,33 @@ class ChatCommand:
     RW = '!rw'
     BAN = '!ban'
     PASS = '!pass'
+    HISTORY = '!history'
+
+
+class CallbackNamespace:
+    GREETING = 'g'
+
+
+class CallbackSettings:
+    # callback_data is <namespace>:<user_id>:<payload>, at most 64 bytes
+    SEPARATOR = ':'
+    # user id of keyboards anyone may click, like a batch greeting of several newbies
+    ANY_USER = 0
+    # callback_data without namespace comes from keyboards sent before namespaces
+    DEFAULT_NAMESPACE = CallbackNamespace.GREETING
+    FOREIGN_CLICK_TEXT = 'Эта кнопка не для тебя.'
+
+
+class AuditCommand:
+    """
+    Audit log commands of actions taken by the bot itself, admin actions are logged with their chat command
+    """
+    CAPTCHA_TIMEOUT = 'captcha_timeout'
+    CAPTCHA_FAILED = 'captcha_failed'
+    UNAUTHORIZED_COMMAND = 'unauthorized_command'
+    FLOOD = 'flood'
+    BLOCKLIST = 'blocklist'
+    SPAM_WAVE = 'spam_wave'
 
 
 class BaseDuration:
@@ -84,10 +190,171 @@ class BanDuration(BaseDuration):
     MAX_DURATION = DurationDto(315360000, '10 лет')
 
 
+class DurationSettings:
+    CACHE_SIZE = 1024
+
+
 class MessageSettings:
     SELF_DESTRUCT_TIMEOUT = 5
 
 
+class AdminCacheSettings:
+    TTL_SECONDS = 300
+    CONFIRM_INTERVAL_SECONDS = 10
+
+
+class MemberMirrorSettings:
+    TTL_SECONDS = 3600
+    MAX_SIZE = 10000
+
+
+class DatabaseSettings:
+    DEFAULT_PATH = 'data/rudeboy.sqlite3'
+    SCHEMA_VERSION = 2
+    COMMIT_BATCH_SIZE = 100
+    COMMIT_INTERVAL_SECONDS = 0.5
+
+
+class AuditSettings:
+    DEFAULT_DIR = 'data/audit'
+    FLUSH_BATCH_SIZE = 100
+    FLUSH_INTERVAL_SECONDS = 1
+    MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+    MAX_SEGMENTS = 10
+    HISTORY_LIMIT = 10
+    # a history lookup runs in the chat lane, it does not wait for the index longer than that
+    HISTORY_WAIT_SECONDS = 2
+
+
+class QuestionSettings:
+    DEFAULT_PATH = 'data/questions.json'
+    DEFAULT_TIMEOUT = 120
+    # answer orders prepared per question, the keyboard of every order is serialized once
+    MAX_VARIANTS = 6
+    # stands for the user id in serialized keyboards
+    USER_ID_PLACEHOLDER = '{user_id}'
+    CORRECT_REPLY = '*{first_name} отвечает верно.*'
+    WRONG_REPLY = '*{first_name} отвечает неверно и покидает чат.*'
+    # payloads of greeting keyboards sent before the question bank, newbies restored with them may still click;
+    # every answer of the rules question passed
+    LEGACY_REPLIES = {
+        'да': '*{first_name} считает, что да.*',
+        'нет': '*{first_name} считает, что нет. ¯\\_(ツ)_/¯*',
+    }
+    # asked when no question file is found, every answer is correct
+    DEFAULT_QUESTIONS = [
+        {
+            'text': '{mention}, прочитал(а) правила чата?',
+            'shuffle': False,
+            'answers': [
+                {'text': 'Да, принял(а) к сведению.', 'reply': '*{first_name} считает, что да.*'},
+                {'text': 'Нет, но сейчас прочитаю.', 'reply': '*{first_name} считает, что нет. ¯\\_(ツ)_/¯*'},
+            ],
+        },
+    ]
+
+
+class NewbieSettings:
+    MAX_SIZE = 10000
+    PASSED_MAX_SIZE = 10000
+    PASSED_TTL_SECONDS = 86400
+
+
+class RestrictionSettings:
+    EXPIRY_GRACE_SECONDS = 3600
+
+
+class RaidSettings:
+    WINDOW_SECONDS = 10
+    ENTER_THRESHOLD = 10
+    EXIT_THRESHOLD = 3
+    BATCH_WINDOW_SECONDS = 5
+    MAX_BATCH_SIZE = 30
+
+
+class FloodSettings:
+    WINDOW_SECONDS = 10
+    MAX_MESSAGES = 7
+    MAX_DUPLICATES = 3
+    MAX_TRACKED_USERS = 2000
+    READ_ONLY_DURATION = '10m'
+    CONTENT_TYPES = ['text', 'sticker', 'photo', 'video', 'animation', 'audio', 'voice', 'video_note', 'document']
+
+
+class DuplicateSettings:
+    WINDOW_SECONDS = 60
+    MIN_USERS = 5
+    # letters and digits of a content with a link or media; plain text needs more, newcomers often post the same
+    # short greeting like "Всем привет!" at once
+    MIN_LENGTH = 10
+    PLAIN_TEXT_MIN_LENGTH = 60
+    LINK_ENTITY_TYPES = ('url', 'text_link')
+    MAX_FINGERPRINTS = 5000
+    MAX_SENDERS = 50
+    # senders of a wave are put into read-only, a sender caught again while remembered is banned
+    READ_ONLY_DURATION = '1h'
+    OFFENDER_TTL_SECONDS = 86400
+    MAX_OFFENDERS = 5000
+    CONTENT_TYPES = ['text', 'photo', 'video', 'animation', 'document']
+
+
+class BlocklistAction:
+    DELETE = 'delete'
+    READ_ONLY = 'ro'
+    BAN = 'ban'
+    # from the mildest to the most severe
+    SEVERITY = (DELETE, READ_ONLY, BAN)
+
+
+class ChatSettings:
+    DEFAULT_PATH = 'data/chats.json'
+    # sections of a chat entry, template lists are named like NotificationTemplateList attributes in lower case
+    TEMPLATES = 'templates'
+    RESTRICT_DURATION = 'restrict_duration'
+    BAN_DURATION = 'ban_duration'
+    # keys of a duration section, every one is a duration like `30m` or `1h30m`
+    DURATION_DEFAULT = 'default'
+    DURATION_MIN = 'min'
+    DURATION_MAX = 'max'
+
+
+class BlocklistSettings:
+    DEFAULT_PATH = 'data/blocklist.txt'
+    RELOAD_INTERVAL_SECONDS = 30
+    READ_ONLY_DURATION = '1d'
+    CONTENT_TYPES = ['text', 'photo', 'video', 'animation', 'audio', 'voice', 'document']
+
+
+class ApiCallPriority:
+    # clients show a spinner and retry until a callback query is answered
+    ACKNOWLEDGE = 0
+    MODERATION = 1
+    QUERY = 2
+    COSMETIC = 3
+
+
+class OutboundSettings:
+    WORKER_THREADS = 4
+    # outbound workers and the polling thread
+    HTTP_POOL_SIZE = WORKER_THREADS + 1
+    GLOBAL_RATE = 30
+    GLOBAL_BURST = 30
+    CHAT_RATE = 20 / 60
+    CHAT_BURST = 20
+    MAX_RETRIES = 3
+    BACKOFF_SECONDS = 1
+    SWEEP_INTERVAL_SECONDS = 60
+
+
+class HandlerSettings:
+    WORKER_THREADS = 4
+
+
+class SchedulerSettings:
+    WORKER_THREADS = 4
+    COMPACT_RATIO = 0.5
+
+
 class NotificationTemplateList:
     READ_ONLY = [
         '{first_name} помещен в read-only на {duration_text}.',
@@ -119,6 +386,22 @@ class NotificationTemplateList:
         '{first_name} удаляется из чата {duration_text}.',
     ]
 
+    FLOOD = [
+        '{first_name} слишком много болтает и помещен в read-only на {duration_text}.',
+        '{first_name} устроил флуд и отдохнет от чата {duration_text}.',
+        'У {first_name} заело клавиатуру, починка займет {duration_text}.',
+    ]
+
+    SPAM_WAVE = [
+        '{names} рассылают одинаковый спам и удаляются из чата навсегда.',
+        'Спам-рассылка остановлена, {names} удаляются из чата навсегда.',
+    ]
+
+    SPAM_WAVE_READ_ONLY = [
+        '{names} рассылают одинаковый спам и помещены в read-only на {duration_text}.',
+        'Спам-рассылка остановлена, {names} помолчат {duration_text}.',
+    ]
+
     UNAUTHORIZED_PUNISHMENT = [
         '{first_name} думал, что ему все можно и получил read-only.',
         '{first_name}, команды администраторов - не для простых смертных.',
@@ -0,0 +1,255 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Tuple, Optional
+
+from const import DatabaseSettings
+from dto import NewbieDto, RestrictedUserDto, RestrictionDto, UserDto, MessageRefDto
+
+
+class StateDatabase:
+    """
+    Write-through SQLite backend for newbie and restriction storages.
+
+    Only the fields needed to restore pending timers are stored. Writes are queued and committed in batches by
+    a single writer thread, so handlers never wait for the disk.
+    """
+    _SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS newbie (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            first_name TEXT NOT NULL,
+            username TEXT,
+            timeout INTEGER NOT NULL,
+            greeting_message_id INTEGER,
+            greeting_date INTEGER,
+            greeting_html TEXT,
+            greeting_chat_id INTEGER,
+            PRIMARY KEY (chat_id, user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS restriction (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            first_name TEXT NOT NULL,
+            username TEXT,
+            until_date INTEGER NOT NULL,
+            restore_at INTEGER NOT NULL,
+            can_send_messages INTEGER NOT NULL,
+            can_send_media INTEGER NOT NULL,
+            can_send_other INTEGER NOT NULL,
+            can_add_web_preview INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, user_id)
+        )
+        ''',
+    )
+
+    # statements upgrading the schema from the previous version, keyed by the target version
+    _MIGRATIONS = {
+        # schema 0 served one chat, newbies not greeted yet belong to it when it is the only configured chat
+        1: (
+            'ALTER TABLE newbie RENAME TO newbie_v0',
+            'ALTER TABLE restriction RENAME TO restriction_v0',
+        ) + _SCHEMA + (
+            '''
+            INSERT INTO newbie (chat_id, user_id, first_name, username, timeout, greeting_message_id, greeting_date,
+                greeting_html)
+            SELECT COALESCE(greeting_chat_id, :legacy_chat_id), user_id, first_name, username, timeout,
+                greeting_message_id, greeting_date, greeting_html
+            FROM newbie_v0 WHERE COALESCE(greeting_chat_id, :legacy_chat_id) IS NOT NULL
+            ''',
+            '''
+            INSERT INTO restriction
+            SELECT chat_id, user_id, first_name, username, until_date, restore_at, can_send_messages, can_send_media,
+                can_send_other, can_add_web_preview
+            FROM restriction_v0
+            ''',
+            'DROP TABLE newbie_v0',
+            'DROP TABLE restriction_v0',
+        ),
+        # greetings of join requests are sent to private chat
+        2: (
+            'ALTER TABLE newbie RENAME TO newbie_v1',
+            _SCHEMA[0],
+            '''
+            INSERT INTO newbie (chat_id, user_id, first_name, username, timeout, greeting_message_id, greeting_date,
+                greeting_html)
+            SELECT chat_id, user_id, first_name, username, timeout, greeting_message_id, greeting_date, greeting_html
+            FROM newbie_v1
+            ''',
+            'DROP TABLE newbie_v1',
+        ),
+    }
+
+    _queue: queue.Queue
+    _logger: logging.Logger
+
+    def __init__(self, path: str, legacy_chat_id: Optional[int], logger: logging.Logger):
+        self._legacy_chat_id = legacy_chat_id
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+        self._logger.info('State database opened: %s', path)
+
+        self._thread = threading.Thread(target=self._run, name='database-writer', daemon=True)
+        self._thread.start()
+
+    def save_newbie(self, chat_id: int, newbie: NewbieDto):
+        greeting = newbie.greeting
+        self._queue.put((
+            'INSERT OR REPLACE INTO newbie VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                chat_id,
+                newbie.user.id,
+                newbie.user.first_name,
+                newbie.user.username,
+                newbie.timeout,
+                None if greeting is None else greeting.message_id,
+                None if greeting is None else greeting.date,
+                None if greeting is None else greeting.html_text,
+                None if greeting is None else greeting.chat_id,
+            ),
+        ))
+
+    def delete_newbie(self, chat_id: int, user_id: int):
+        self._queue.put(('DELETE FROM newbie WHERE chat_id = ? AND user_id = ?', (chat_id, user_id)))
+
+    def save_restriction(self, restricted: RestrictedUserDto):
+        self._queue.put((
+            'INSERT OR REPLACE INTO restriction VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                restricted.chat_id,
+                restricted.user.id,
+                restricted.user.first_name,
+                restricted.user.username,
+                restricted.until_date,
+                restricted.restore_at,
+                restricted.restriction.messages,
+                restricted.restriction.media,
+                restricted.restriction.other,
+                restricted.restriction.web_preview,
+            ),
+        ))
+
+    def delete_restriction(self, chat_id: int, user_id: int):
+        self._queue.put(('DELETE FROM restriction WHERE chat_id = ? AND user_id = ?', (chat_id, user_id)))
+
+    def load_newbies(self, chat_id: int) -> List[Tuple[UserDto, int, Optional[MessageRefDto]]]:
+        with self._lock:
+            rows = self._connection.execute('SELECT * FROM newbie WHERE chat_id = ?', (chat_id,)).fetchall()
+
+        result = list()
+        for chat_id, user_id, first_name, username, timeout, message_id, date, html, greeting_chat_id in rows:
+            greeting = None
+            if message_id is not None:
+                greeting = MessageRefDto(
+                    chat_id=chat_id if greeting_chat_id is None else greeting_chat_id,
+                    message_id=message_id,
+                    date=date,
+                    html_text=html,
+                )
+            result.append((UserDto(id=user_id, first_name=first_name, username=username), timeout, greeting))
+
+        return result
+
+    def load_restrictions(self, chat_id: int) -> List[RestrictedUserDto]:
+        with self._lock:
+            rows = self._connection.execute('SELECT * FROM restriction WHERE chat_id = ?', (chat_id,)).fetchall()
+
+        return [
+            RestrictedUserDto(
+                user=UserDto(id=user_id, first_name=first_name, username=username),
+                chat_id=chat_id,
+                until_date=until_date,
+                restriction=RestrictionDto(bool(messages), bool(media), bool(other), bool(web_preview)),
+                restore_at=restore_at,
+            )
+            for chat_id, user_id, first_name, username, until_date, restore_at, messages, media, other, web_preview
+            in rows
+        ]
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        with self._lock:
+            self._connection.close()
+        self._logger.info('State database closed')
+
+    def _migrate(self):
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version == DatabaseSettings.SCHEMA_VERSION:
+            return
+
+        created = self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'newbie'"
+        ).fetchone() is not None
+
+        self._connection.execute('BEGIN')
+        if created:
+            if version == 0 and self._legacy_chat_id is None:
+                dropped = self._connection.execute(
+                    'SELECT COUNT(*) FROM newbie WHERE greeting_chat_id IS NULL'
+                ).fetchone()[0]
+                if dropped:
+                    self._logger.warning(
+                        'State database: %s newbies without greeting dropped, their chat is unknown with several '
+                        'chats configured', dropped,
+                    )
+            for target_version in range(version + 1, DatabaseSettings.SCHEMA_VERSION + 1):
+                for statement in self._MIGRATIONS[target_version]:
+                    self._connection.execute(statement, {'legacy_chat_id': self._legacy_chat_id})
+            self._logger.info('State database migrated from schema version %s', version)
+        else:
+            for statement in self._SCHEMA:
+                self._connection.execute(statement)
+        self._connection.execute(f'PRAGMA user_version = {DatabaseSettings.SCHEMA_VERSION}')
+        self._connection.execute('COMMIT')
+
+    def _run(self):
+        running = True
+        while running:
+            operation = self._queue.get()
+            if operation is None:
+                break
+
+            batch = [operation]
+            deadline = time.time() + DatabaseSettings.COMMIT_INTERVAL_SECONDS
+            while len(batch) < DatabaseSettings.COMMIT_BATCH_SIZE:
+                try:
+                    operation = self._queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if operation is None:
+                    running = False
+                    break
+                batch.append(operation)
+
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[str, tuple]]):
+        try:
+            with self._lock:
+                self._connection.execute('BEGIN')
+                for statement, params in batch:
+                    self._connection.execute(statement, params)
+                self._connection.execute('COMMIT')
+            self._logger.debug('State database: %s changes committed', len(batch))
+        except sqlite3.Error:
+            self._logger.exception('State database: can not commit %s changes', len(batch))
+            with self._lock:
+                if self._connection.in_transaction:
+                    self._connection.execute('ROLLBACK')
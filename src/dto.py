@@ -1,9 +1,11 @@
-from typing import Dict
+from typing import Any, Optional, List, Tuple, Dict
 
-from telebot.types import ReplyKeyboardMarkup, User, Message
+from telebot.types import User, Message, ChatMember
 
 
 class DurationDto:
+    __slots__ = ('_seconds', '_text')
+
     _seconds: int
     _text: str
 
@@ -21,6 +23,8 @@ class DurationDto:
 
 
 class PluralFormsDto:
+    __slots__ = ('_form_1', '_form_2', '_form_3')
+
     _form_1: str
     _form_2: str
     _form_3: str
@@ -44,48 +48,148 @@ class PluralFormsDto:
 
 
 class GreetingQuestionDto:
+    """
+    A bank question in one answer order, its keyboard is serialized once with a user id placeholder
+    """
+    __slots__ = ('_text', '_keyboard_parts', '_timeout')
+
     _text: str
-    _keyboard: ReplyKeyboardMarkup
+    _keyboard_parts: Tuple[str, ...]
     _timeout: int
-    _reply: Dict[str, str]
 
-    def __init__(self, text: str, keyboard: ReplyKeyboardMarkup, timeout: int, reply: Dict[str, str]):
+    def __init__(self, text: str, keyboard_parts: Tuple[str, ...], timeout: int):
         self._text = text
-        self._keyboard = keyboard
+        self._keyboard_parts = keyboard_parts
         self._timeout = timeout
-        self._reply = reply
 
     @property
     def text(self) -> str:
         return self._text
 
-    @property
-    def keyboard(self) -> ReplyKeyboardMarkup:
-        return self._keyboard
-
     @property
     def timeout(self) -> int:
         return self._timeout
 
+    def keyboard(self, user_id: int) -> str:
+        """
+        Serialized inline keyboard, its buttons may only be clicked by the given user
+        """
+        return str(user_id).join(self._keyboard_parts)
+
+
+class GreetingAnswerDto:
+    __slots__ = ('_text', '_correct', '_reply')
+
+    _text: str
+    _correct: bool
+    _reply: str
+
+    def __init__(self, text: str, correct: bool, reply: str):
+        self._text = text
+        self._correct = correct
+        self._reply = reply
+
     @property
-    def reply(self) -> Dict[str, str]:
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def correct(self) -> bool:
+        return self._correct
+
+    @property
+    def reply(self) -> str:
         return self._reply
 
 
+class UserDto:
+    __slots__ = ('_id', '_first_name', '_username')
+
+    _id: int
+    _first_name: str
+    _username: Optional[str]
+
+    def __init__(self, id: int, first_name: str, username: Optional[str] = None):
+        self._id = id
+        self._first_name = first_name
+        self._username = username
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserDto':
+        return cls(id=user.id, first_name=user.first_name, username=user.username)
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+
+    @property
+    def username(self) -> Optional[str]:
+        return self._username
+
+
+class MessageRefDto:
+    __slots__ = ('_chat_id', '_message_id', '_date', '_html_text')
+
+    _chat_id: int
+    _message_id: int
+    _date: int
+    _html_text: str
+
+    def __init__(self, chat_id: int, message_id: int, date: int, html_text: str):
+        self._chat_id = chat_id
+        self._message_id = message_id
+        self._date = date
+        self._html_text = html_text
+
+    @classmethod
+    def from_message(cls, message: Message) -> 'MessageRefDto':
+        return cls(
+            chat_id=message.chat.id,
+            message_id=message.message_id,
+            date=message.date,
+            html_text=message.html_text,
+        )
+
+    @property
+    def chat_id(self) -> int:
+        return self._chat_id
+
+    @property
+    def message_id(self) -> int:
+        return self._message_id
+
+    @property
+    def date(self) -> int:
+        return self._date
+
+    @property
+    def html_text(self) -> str:
+        return self._html_text
+
+
 class NewbieDto:
-    _user: User
+    __slots__ = ('_user', '_timeout', '_question', '_greeting', '_timer')
+
+    _user: UserDto
     _timeout: int
-    _question: GreetingQuestionDto
-    _greeting: Message
+    _question: Optional[GreetingQuestionDto]
+    _greeting: Optional[MessageRefDto]
+    _timer: Any
 
-    def __init__(self, user: User, timeout: int, question: GreetingQuestionDto, greeting: Message = None):
+    def __init__(self, user: UserDto, timeout: int, question: Optional[GreetingQuestionDto],
+                 greeting: MessageRefDto = None, timer: Any = None):
         self._user = user
         self._timeout = timeout
         self._question = question
         self._greeting = greeting
+        self._timer = timer
 
     @property
-    def user(self) -> User:
+    def user(self) -> UserDto:
         return self._user
 
     @property
@@ -93,15 +197,24 @@ class NewbieDto:
         return self._timeout
 
     @property
-    def question(self) -> GreetingQuestionDto:
+    def question(self) -> Optional[GreetingQuestionDto]:
+        """
+        None for newbies restored from database, questions are not stored
+        """
         return self._question
 
     @property
-    def greeting(self) -> Message:
+    def greeting(self) -> Optional[MessageRefDto]:
         return self._greeting
 
+    @property
+    def timer(self) -> Any:
+        return self._timer
+
 
 class RestrictionDto:
+    __slots__ = ('_messages', '_media', '_other', '_web_preview')
+
     _messages: bool
     _media: bool
     _other: bool
@@ -131,13 +244,15 @@ class RestrictionDto:
 
 
 class RestrictedUserDto:
-    _user: User
+    __slots__ = ('_user', '_chat_id', '_until_date', '_restriction', '_restore_at')
+
+    _user: UserDto
     _chat_id: int
     _until_date: int
     _restriction: RestrictionDto
     _restore_at: int
 
-    def __init__(self, user: User, chat_id: int, until_date: int, restriction: RestrictionDto, restore_at: int):
+    def __init__(self, user: UserDto, chat_id: int, until_date: int, restriction: RestrictionDto, restore_at: int):
         self._user = user
         self._chat_id = chat_id
         self._until_date = until_date
@@ -145,7 +260,7 @@ class RestrictedUserDto:
         self._restore_at = restore_at
 
     @property
-    def user(self) -> User:
+    def user(self) -> UserDto:
         return self._user
 
     @property
@@ -163,3 +278,426 @@ class RestrictedUserDto:
     @property
     def restore_at(self) -> int:
         return self._restore_at
+
+
+class SchedulerStatsDto:
+    __slots__ = ('_queue_depth', '_executed', '_cancelled', '_max_lateness', '_avg_lateness')
+
+    _queue_depth: int
+    _executed: int
+    _cancelled: int
+    _max_lateness: float
+    _avg_lateness: float
+
+    def __init__(self, queue_depth: int, executed: int, cancelled: int, max_lateness: float, avg_lateness: float):
+        self._queue_depth = queue_depth
+        self._executed = executed
+        self._cancelled = cancelled
+        self._max_lateness = max_lateness
+        self._avg_lateness = avg_lateness
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    @property
+    def executed(self) -> int:
+        return self._executed
+
+    @property
+    def cancelled(self) -> int:
+        return self._cancelled
+
+    @property
+    def max_lateness(self) -> float:
+        return self._max_lateness
+
+    @property
+    def avg_lateness(self) -> float:
+        return self._avg_lateness
+
+
+class AuditEntryDto:
+    __slots__ = ('_timestamp', '_chat_id', '_command', '_target', '_actor', '_duration')
+
+    _timestamp: int
+    _chat_id: int
+    _command: str
+    _target: UserDto
+    _actor: Optional[UserDto]
+    _duration: Optional[DurationDto]
+
+    def __init__(
+            self,
+            timestamp: int,
+            chat_id: int,
+            command: str,
+            target: UserDto,
+            actor: Optional[UserDto] = None,
+            duration: Optional[DurationDto] = None,
+    ):
+        self._timestamp = timestamp
+        self._chat_id = chat_id
+        self._command = command
+        self._target = target
+        self._actor = actor
+        self._duration = duration
+
+    @property
+    def timestamp(self) -> int:
+        return self._timestamp
+
+    @property
+    def chat_id(self) -> int:
+        return self._chat_id
+
+    @property
+    def command(self) -> str:
+        return self._command
+
+    @property
+    def target(self) -> UserDto:
+        return self._target
+
+    @property
+    def target_id(self) -> int:
+        return self._target.id
+
+    @property
+    def actor(self) -> Optional[UserDto]:
+        """
+        User who ran the command, None for actions taken by the bot itself
+        """
+        return self._actor
+
+    @property
+    def duration(self) -> Optional[DurationDto]:
+        return self._duration
+
+    def to_dict(self) -> dict:
+        return dict(
+            timestamp=self._timestamp,
+            chat_id=self._chat_id,
+            command=self._command,
+            target_id=self._target.id,
+            target_first_name=self._target.first_name,
+            target_username=self._target.username,
+            actor_id=None if self._actor is None else self._actor.id,
+            actor_first_name=None if self._actor is None else self._actor.first_name,
+            actor_username=None if self._actor is None else self._actor.username,
+            duration_seconds=None if self._duration is None else self._duration.seconds,
+            duration_text=None if self._duration is None else self._duration.text,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'AuditEntryDto':
+        actor = None
+        if data['actor_id'] is not None:
+            actor = UserDto(id=data['actor_id'], first_name=data['actor_first_name'], username=data['actor_username'])
+        duration = None
+        if data['duration_seconds'] is not None:
+            duration = DurationDto(seconds=data['duration_seconds'], text=data['duration_text'])
+
+        return cls(
+            timestamp=data['timestamp'],
+            chat_id=data['chat_id'],
+            command=data['command'],
+            target=UserDto(id=data['target_id'], first_name=data['target_first_name'], username=data['target_username']),
+            actor=actor,
+            duration=duration,
+        )
+
+
+class CallbackDataDto:
+    """
+    Decoded callback_data of an inline keyboard button
+    """
+    __slots__ = ('_namespace', '_user_id', '_payload')
+
+    _namespace: str
+    _user_id: int
+    _payload: str
+
+    def __init__(self, namespace: str, user_id: int, payload: str):
+        self._namespace = namespace
+        self._user_id = user_id
+        self._payload = payload
+
+    @property
+    def namespace(self) -> str:
+        return self._namespace
+
+    @property
+    def user_id(self) -> int:
+        """
+        User the keyboard was sent to, 0 if anyone may click it
+        """
+        return self._user_id
+
+    @property
+    def payload(self) -> str:
+        return self._payload
+
+
+class ChatMemberUpdateDto:
+    """
+    chat_member or my_chat_member update, telebot does not parse them
+    """
+    __slots__ = ('_chat_id', '_actor', '_date', '_old_member', '_new_member')
+
+    _chat_id: int
+    _actor: User
+    _date: int
+    _old_member: ChatMember
+    _new_member: ChatMember
+
+    def __init__(self, chat_id: int, actor: User, date: int, old_member: ChatMember, new_member: ChatMember):
+        self._chat_id = chat_id
+        self._actor = actor
+        self._date = date
+        self._old_member = old_member
+        self._new_member = new_member
+
+    @property
+    def chat_id(self) -> int:
+        return self._chat_id
+
+    @property
+    def actor(self) -> User:
+        """
+        User who changed the member status
+        """
+        return self._actor
+
+    @property
+    def date(self) -> int:
+        return self._date
+
+    @property
+    def old_member(self) -> ChatMember:
+        return self._old_member
+
+    @property
+    def new_member(self) -> ChatMember:
+        return self._new_member
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ChatMemberUpdateDto':
+        return cls(
+            chat_id=data['chat']['id'],
+            actor=User.de_json(data['from']),
+            date=data['date'],
+            old_member=ChatMember.de_json(data['old_chat_member']),
+            new_member=ChatMember.de_json(data['new_chat_member']),
+        )
+
+
+class ChatJoinRequestDto:
+    """
+    chat_join_request update, telebot does not parse it
+    """
+    __slots__ = ('_chat_id', '_user', '_user_chat_id', '_date')
+
+    _chat_id: int
+    _user: User
+    _user_chat_id: int
+    _date: int
+
+    def __init__(self, chat_id: int, user: User, user_chat_id: int, date: int):
+        self._chat_id = chat_id
+        self._user = user
+        self._user_chat_id = user_chat_id
+        self._date = date
+
+    @property
+    def chat_id(self) -> int:
+        return self._chat_id
+
+    @property
+    def user(self) -> User:
+        return self._user
+
+    @property
+    def user_chat_id(self) -> int:
+        """
+        Private chat with the user, open for the bot while the request is pending
+        """
+        return self._user_chat_id
+
+    @property
+    def date(self) -> int:
+        return self._date
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ChatJoinRequestDto':
+        return cls(
+            chat_id=data['chat']['id'],
+            user=User.de_json(data['from']),
+            # older Bot API versions have no user_chat_id, the private chat id is the user id anyway
+            user_chat_id=data.get('user_chat_id', data['from']['id']),
+            date=data['date'],
+        )
+
+
+class ChatSettingsDto:
+    """
+    Settings of one served chat, every class is NotificationTemplateList or a BaseDuration subclass from const
+    """
+    __slots__ = ('_templates', '_restrict_duration', '_ban_duration')
+
+    _templates: type
+    _restrict_duration: type
+    _ban_duration: type
+
+    def __init__(self, templates: type, restrict_duration: type, ban_duration: type):
+        self._templates = templates
+        self._restrict_duration = restrict_duration
+        self._ban_duration = ban_duration
+
+    @property
+    def templates(self) -> type:
+        return self._templates
+
+    @property
+    def restrict_duration(self) -> type:
+        return self._restrict_duration
+
+    @property
+    def ban_duration(self) -> type:
+        return self._ban_duration
+
+
+class AppConfigDto:
+    __slots__ = (
+        '_token', '_chat_ids', '_database_path', '_audit_log_dir', '_blocklist_path', '_update_mode',
+        '_webhook_url', '_webhook_listen', '_webhook_port', '_webhook_secret_token', '_metrics_listen', '_metrics_port',
+        '_admission_mode', '_questions_path', '_chat_settings',
+    )
+
+    _token: str
+    _chat_ids: List[int]
+    _database_path: Optional[str]
+    _audit_log_dir: Optional[str]
+    _blocklist_path: Optional[str]
+    _update_mode: str
+    _webhook_url: str
+    _webhook_listen: str
+    _webhook_port: int
+    _webhook_secret_token: str
+    _metrics_listen: str
+    _metrics_port: Optional[int]
+    _admission_mode: str
+    _questions_path: Optional[str]
+    _chat_settings: Dict[int, ChatSettingsDto]
+
+    def __init__(
+            self,
+            token: str,
+            chat_ids: List[int],
+            database_path: Optional[str] = None,
+            audit_log_dir: Optional[str] = None,
+            blocklist_path: Optional[str] = None,
+            update_mode: str = 'polling',
+            webhook_url: str = '',
+            webhook_listen: str = '',
+            webhook_port: int = 0,
+            webhook_secret_token: str = '',
+            metrics_listen: str = '',
+            metrics_port: Optional[int] = None,
+            admission_mode: str = 'greeting',
+            questions_path: Optional[str] = None,
+            chat_settings: Dict[int, ChatSettingsDto] = None,
+    ):
+        self._token = token
+        self._chat_ids = chat_ids
+        self._database_path = database_path
+        self._audit_log_dir = audit_log_dir
+        self._blocklist_path = blocklist_path
+        self._update_mode = update_mode
+        self._webhook_url = webhook_url
+        self._webhook_listen = webhook_listen
+        self._webhook_port = webhook_port
+        self._webhook_secret_token = webhook_secret_token
+        self._metrics_listen = metrics_listen
+        self._metrics_port = metrics_port
+        self._admission_mode = admission_mode
+        self._questions_path = questions_path
+        self._chat_settings = chat_settings or dict()
+
+    @property
+    def token(self) -> str:
+        return self._token
+
+    @property
+    def chat_ids(self) -> List[int]:
+        return self._chat_ids
+
+    @property
+    def database_path(self) -> Optional[str]:
+        """
+        State database file, None keeps the state in memory only
+        """
+        return self._database_path
+
+    @property
+    def audit_log_dir(self) -> Optional[str]:
+        """
+        Audit log directory, None disables the audit log
+        """
+        return self._audit_log_dir
+
+    @property
+    def blocklist_path(self) -> Optional[str]:
+        """
+        Blocklist file, None disables blocklist checks
+        """
+        return self._blocklist_path
+
+    @property
+    def update_mode(self) -> str:
+        return self._update_mode
+
+    @property
+    def webhook_url(self) -> str:
+        return self._webhook_url
+
+    @property
+    def webhook_listen(self) -> str:
+        return self._webhook_listen
+
+    @property
+    def webhook_port(self) -> int:
+        return self._webhook_port
+
+    @property
+    def webhook_secret_token(self) -> str:
+        return self._webhook_secret_token
+
+    @property
+    def metrics_listen(self) -> str:
+        return self._metrics_listen
+
+    @property
+    def metrics_port(self) -> Optional[int]:
+        """
+        Metrics server port, None disables the metrics server
+        """
+        return self._metrics_port
+
+    @property
+    def admission_mode(self) -> str:
+        return self._admission_mode
+
+    @property
+    def questions_path(self) -> Optional[str]:
+        """
+        Captcha question bank file, None asks the default question
+        """
+        return self._questions_path
+
+    @property
+    def chat_settings(self) -> Dict[int, ChatSettingsDto]:
+        """
+        Settings of served chats, a chat missing here keeps the defaults
+        """
+        return self._chat_settings
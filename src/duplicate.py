@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple, Dict
+
+from const import DuplicateSettings
+from dto import UserDto
+
+_NOT_WORD_CHARACTERS = re.compile(r'[\W_]+')
+
+Sender = Tuple[float, UserDto, int]
+
+
+class Payload:
+    """
+    Recent senders of one message content
+    """
+    __slots__ = ('senders', 'wave_until')
+
+    senders: Deque[Sender]
+    wave_until: float
+
+    def __init__(self):
+        self.senders = deque(maxlen=DuplicateSettings.MAX_SENDERS)
+        self.wave_until = 0.0
+
+
+class DuplicateDetector:
+    """
+    Rolling index of recent message contents for spotting spam waves.
+
+    A content is fingerprinted by the hash of its lowercased letters and digits, so case, spacing and punctuation
+    tricks do not help. Plain text without links or media is only tracked from PLAIN_TEXT_MIN_LENGTH, so the same
+    short greeting of several newcomers is not a wave. When MIN_USERS distinct users post the same content within
+    WINDOW_SECONDS, the content is marked as a wave for the next WINDOW_SECONDS: its senders are reported, and every
+    later copy is reported too. The index holds at most MAX_FINGERPRINTS contents with MAX_SENDERS senders each,
+    the least recently posted content is evicted first.
+
+    Punished senders are remembered for OFFENDER_TTL_SECONDS, up to MAX_OFFENDERS of them, to tell a repeated
+    offence from the first one.
+    """
+    _payloads: 'OrderedDict[int, Payload]'
+    _offenders: Dict[int, float]
+
+    def __init__(self):
+        self._payloads = OrderedDict()
+        self._offenders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        return _NOT_WORD_CHARACTERS.sub('', text.lower()) if text else ''
+
+    @classmethod
+    def fingerprint(cls, text: Optional[str]) -> Optional[int]:
+        normalized = cls.normalize(text)
+        return hash(normalized) if normalized else None
+
+    def register_message(self, user: UserDto, message_id: int, text: Optional[str], plain: bool, now: float) -> bool:
+        """
+        Track a message, returns True when its content is a spam wave
+
+        plain: the message is text without links or media
+        """
+        normalized = self.normalize(text)
+        min_length = DuplicateSettings.PLAIN_TEXT_MIN_LENGTH if plain else DuplicateSettings.MIN_LENGTH
+        if len(normalized) < min_length:
+            return False
+
+        fingerprint = hash(normalized)
+
+        window_start = now - DuplicateSettings.WINDOW_SECONDS
+        with self._lock:
+            payload = self._payloads.get(fingerprint)
+            if payload is None:
+                payload = Payload()
+                self._payloads[fingerprint] = payload
+                if len(self._payloads) > DuplicateSettings.MAX_FINGERPRINTS:
+                    self._payloads.popitem(last=False)
+            else:
+                self._payloads.move_to_end(fingerprint)
+
+            senders = payload.senders
+            while senders and senders[0][0] < window_start:
+                senders.popleft()
+            senders.append((now, user, message_id))
+
+            distinct_users = len({sender.id for _, sender, _ in senders})
+            if payload.wave_until < now and distinct_users < DuplicateSettings.MIN_USERS:
+                return False
+
+            payload.wave_until = now + DuplicateSettings.WINDOW_SECONDS
+            return True
+
+    def take_senders(self, text: Optional[str]) -> List[Tuple[UserDto, int]]:
+        """
+        Get and forget reported senders and message ids of a content
+        """
+        fingerprint = self.fingerprint(text)
+        with self._lock:
+            payload = self._payloads.get(fingerprint)
+            if payload is None:
+                return list()
+
+            senders = [(user, message_id) for _, user, message_id in payload.senders]
+            payload.senders.clear()
+
+            return senders
+
+    def register_offence(self, user_id: int, now: float) -> bool:
+        """
+        Remember a punished sender, returns True if the sender was punished within OFFENDER_TTL_SECONDS before
+        """
+        expired = now - DuplicateSettings.OFFENDER_TTL_SECONDS
+        with self._lock:
+            punished_at = self._offenders.pop(user_id, None)
+            self._offenders[user_id] = now
+            while self._offenders:
+                oldest_user_id, oldest_at = next(iter(self._offenders.items()))
+                if oldest_at >= expired and len(self._offenders) <= DuplicateSettings.MAX_OFFENDERS:
+                    break
+                del self._offenders[oldest_user_id]
+
+        return punished_at is not None and punished_at >= expired
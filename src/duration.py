@@ -0,0 +1,79 @@
+import functools
+from typing import List, Tuple, Type
+
+from const import BaseDuration, DurationSettings
+from dto import DurationDto, PluralFormsDto
+from error import ParseBanDurationError
+
+
+def get_plural(amount: int, plural_forms: PluralFormsDto) -> str:
+    if amount % 10 == 1 and amount % 100 != 11:
+        return plural_forms.form_1
+
+    if 2 <= amount % 10 <= 4 and (amount % 100 < 10 or amount % 100 >= 20):
+        return plural_forms.form_2
+
+    return plural_forms.form_3
+
+
+@functools.lru_cache(maxsize=DurationSettings.CACHE_SIZE)
+def parse_duration(text: str, duration_class: Type[BaseDuration]) -> DurationDto:
+    """
+    Parse a duration like `30m`, `1h30m` or `2d 12h`, clamped to the limits of the duration class
+
+    A bare number is taken in DEFAULT_UNIT, empty text means the default duration. Every unit may be used once.
+    A negative duration is accepted for compatibility and clamped to MIN_DURATION like any too short one.
+    Results are cached by text and duration class, DurationDto is immutable, so they are shared.
+    """
+    if text == '':
+        negative = duration_class.DEFAULT_DURATION < 0
+        tokens = [(abs(duration_class.DEFAULT_DURATION), duration_class.DEFAULT_UNIT)]
+    else:
+        negative, tokens = _tokenize(text.strip(), duration_class)
+
+    seconds = sum(amount * duration_class.UNITS[unit]['rate'] for amount, unit in tokens)
+    if negative:
+        seconds = -seconds
+    if seconds < duration_class.MIN_DURATION.seconds:
+        return duration_class.MIN_DURATION
+
+    if seconds > duration_class.MAX_DURATION.seconds:
+        return duration_class.MAX_DURATION
+
+    return DurationDto(
+        seconds=seconds,
+        text=' '.join(
+            f'{amount} {get_plural(amount, duration_class.UNITS[unit]["plural_forms"])}' for amount, unit in tokens
+        ),
+    )
+
+
+def _tokenize(text: str, duration_class: Type[BaseDuration]) -> Tuple[bool, List[Tuple[int, str]]]:
+    """
+    Split text into amounts and units in one pass, raises ParseBanDurationError on anything else
+    """
+    negative = text.startswith('-')
+    tokens = list()
+    amount = None
+    spaced = False
+    for char in text[1:] if negative else text:
+        if '0' <= char <= '9' and not spaced:
+            amount = (amount or 0) * 10 + ord(char) - 48
+        elif amount is not None and char in duration_class.UNITS and all(char != unit for _, unit in tokens):
+            tokens.append((amount, char))
+            amount = None
+            spaced = False
+        elif char == ' ' and (amount is not None or tokens):
+            # spaces separate tokens and may separate a number from its unit, but never split a number
+            spaced = amount is not None
+        else:
+            raise ParseBanDurationError()
+
+    if amount is not None:
+        if tokens:
+            raise ParseBanDurationError()
+        tokens.append((amount, duration_class.DEFAULT_UNIT))
+    if not tokens:
+        raise ParseBanDurationError()
+
+    return negative, tokens
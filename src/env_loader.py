@@ -34,6 +34,12 @@ class EnvLoader:
 
         return val
 
+    def get_path(self, env_name: str, default: str = '') -> str:
+        """
+        Get a file path, relative paths are resolved against the project root
+        """
+        return abspath(join(dirname(__file__), '..', self._get_env(env_name, default)))
+
     def _get_env(self, env_name: str, default: str = '', sensitive: bool = False) -> str:
         res = os.getenv(env_name, default).strip()
 
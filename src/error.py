@@ -30,10 +30,14 @@ class UserStorageUpdateError(Exception):
     pass
 
 
+class AuditLogUnavailableError(Exception):
+    pass
+
+
 class UnauthorizedCommandError(InvalidConditionError):
     def __init__(self, message: Message, service, bot: telebot, logger: logging.Logger):
         text = service.set_punishment(user=message.from_user, message=message)
-        logger.warning(f'Non-factor {message.from_user.username} trying to use unauthorized command.')
+        logger.warning('Non-factor %s trying to use unauthorized command.', message.from_user.username)
         bot.send_message(
             chat_id=message.chat.id,
             text=f'*{text}*',
@@ -0,0 +1,67 @@
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Dict, Deque, Callable, Hashable, Tuple
+
+
+class KeyedExecutor:
+    """
+    Bounded worker pool which keeps order within a key.
+
+    Tasks of the same key are run one by one in submission order, tasks of different keys run in parallel.
+    A key with pending tasks sits in the ready queue at most once; a worker runs one task of the key and puts
+    the key back to the end of the queue if more tasks are waiting, so a busy key can not starve the others.
+    """
+    _pending: Dict[Hashable, Deque[Tuple[Callable, tuple]]]
+    _ready: queue.SimpleQueue
+    _logger: logging.Logger
+
+    def __init__(self, workers: int, logger: logging.Logger):
+        self._pending = dict()
+        self._ready = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._logger = logger
+
+        for number in range(workers):
+            threading.Thread(target=self._run, name=f'keyed-worker-{number}', daemon=True).start()
+
+    def submit(self, key: Hashable, function: Callable, *args):
+        with self._lock:
+            tasks = self._pending.get(key)
+            if tasks is not None:
+                tasks.append((function, args))
+                return
+
+            self._pending[key] = deque(((function, args),))
+        self._ready.put(key)
+
+    def queue_depth(self, key: Hashable) -> int:
+        """
+        Number of tasks of the key which are waiting or running
+        """
+        with self._lock:
+            return len(self._pending.get(key, ()))
+
+    def queue_depths(self) -> Dict[Hashable, int]:
+        with self._lock:
+            return {key: len(tasks) for key, tasks in self._pending.items()}
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                function, args = self._pending[key][0]
+
+            try:
+                function(*args)
+            except Exception:
+                self._logger.exception('Task %s of %s failed', function.__name__, key)
+
+            with self._lock:
+                tasks = self._pending[key]
+                tasks.popleft()
+                if not tasks:
+                    del self._pending[key]
+                    continue
+            self._ready.put(key)
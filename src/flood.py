@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from const import FloodSettings
+
+
+class FloodTrack:
+    """
+    Ring buffers of the last MAX_MESSAGES message times and text hashes of one user
+    """
+    __slots__ = ('times', 'hashes', 'position')
+
+    times: List[float]
+    hashes: List[Optional[int]]
+    position: int
+
+    def __init__(self):
+        self.times = [float('-inf')] * FloodSettings.MAX_MESSAGES
+        self.hashes = [None] * FloodSettings.MAX_MESSAGES
+        self.position = 0
+
+
+class FloodDetector:
+    """
+    Per-user sliding window message rate detector.
+
+    A user floods when more than MAX_MESSAGES messages fit into WINDOW_SECONDS, i.e. the time slot about to be
+    overwritten in the ring is still inside the window, or when MAX_DUPLICATES identical texts fit into it. At most
+    MAX_TRACKED_USERS users are tracked, the least recently active one is evicted first.
+    """
+    _tracks: 'OrderedDict[int, FloodTrack]'
+
+    def __init__(self):
+        self._tracks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def register_message(self, user_id: int, text: Optional[str], now: float) -> bool:
+        """
+        Track a message, returns True when the user exceeded a threshold
+
+        The user starts over with an empty track afterwards, so one burst is reported once.
+        """
+        text_hash = None if text is None else hash(text)
+        window_start = now - FloodSettings.WINDOW_SECONDS
+        with self._lock:
+            track = self._tracks.get(user_id)
+            if track is None:
+                track = FloodTrack()
+                self._tracks[user_id] = track
+                if len(self._tracks) > FloodSettings.MAX_TRACKED_USERS:
+                    self._tracks.popitem(last=False)
+            else:
+                self._tracks.move_to_end(user_id)
+
+            position = track.position
+            flood = track.times[position] >= window_start
+            if not flood and text_hash is not None:
+                duplicates = 1
+                for sent_at, hash_value in zip(track.times, track.hashes):
+                    if hash_value == text_hash and sent_at >= window_start:
+                        duplicates += 1
+                flood = duplicates >= FloodSettings.MAX_DUPLICATES
+
+            if flood:
+                del self._tracks[user_id]
+                return True
+
+            track.times[position] = now
+            track.hashes[position] = text_hash
+            track.position = (position + 1) % FloodSettings.MAX_MESSAGES
+
+            return False
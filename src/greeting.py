@@ -1,76 +1,330 @@
+import json
 import logging
-from typing import Dict, Any
+import math
+import random
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, List, Set, Tuple
 
-from telebot.types import InlineKeyboardButton, User, InlineKeyboardMarkup, Message
+from telebot.types import InlineKeyboardButton, User, InlineKeyboardMarkup
 
-from dto import GreetingQuestionDto, NewbieDto
+from const import NewbieSettings, CallbackNamespace, QuestionSettings
+from database import StateDatabase
+from dto import GreetingQuestionDto, NewbieDto, UserDto, MessageRefDto, GreetingAnswerDto
 from error import UserAlreadyInStorageError, UserNotFoundInStorageError, UserStorageUpdateError
+from router import CallbackRouter
+from scheduler import ScheduledTask
 
 
 class NewbieStorage:
-    _storage: Dict[Any, NewbieDto]
+    """
+    Pending newbies keyed by user id, with an index by greeting chat and message id. Captchas of join requests are
+    sent to private chats, whose message ids may repeat the ids of the group.
 
-    def __init__(self, logger: logging.Logger):
-        self._storage = dict()
+    Storage is bounded by NewbieSettings.MAX_SIZE, the longest waiting newbie is evicted when it is full.
+    Users who passed the captcha are remembered for PASSED_TTL_SECONDS, up to PASSED_MAX_SIZE of them.
+    """
+    _storage: Dict[int, NewbieDto]
+    _greeting_index: Dict[Tuple[int, int], Set[int]]
+    _passed: Dict[int, float]
+    _database: Optional[StateDatabase]
+
+    def __init__(
+            self,
+            chat_id: int,
+            logger: logging.Logger,
+            database: StateDatabase = None,
+            max_size: int = NewbieSettings.MAX_SIZE,
+    ):
+        self._chat_id = chat_id
+        self._storage = OrderedDict()
+        self._greeting_index = dict()
+        self._passed = OrderedDict()
+        self._max_size = max_size
+        self._evicted = 0
+        self._database = database
+        self._lock = threading.RLock()
         self._logger = logger
 
+        if database is not None:
+            self._restore()
+
+    def _restore(self):
+        for user, timeout, greeting in self._database.load_newbies(self._chat_id):
+            self._put(NewbieDto(
+                user=user,
+                timeout=timeout,
+                question=None,
+                greeting=greeting,
+            ))
+        self._logger.info('%s newbies of chat %s restored from database', len(self._storage), self._chat_id)
+
     def __iter__(self):
-        for key, value in self._storage.items():
-            yield value
+        with self._lock:
+            return iter(list(self._storage.values()))
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._storage
+
+    def __len__(self) -> int:
+        return len(self._storage)
+
+    @property
+    def evicted(self) -> int:
+        return self._evicted
 
     def add(self, user: User, timeout: int, question: GreetingQuestionDto):
-        newbie = NewbieDto(user=user, timeout=timeout, question=question)
-        self._logger.debug(f'Trying to add user @{user.username} into newbie list')
-        if user.id in self._storage:
-            self._logger.warning(f'Can not add! User @{user.username} already in newbie list.')
-            raise UserAlreadyInStorageError()
+        newbie = NewbieDto(user=UserDto.from_user(user), timeout=timeout, question=question)
+        self._logger.debug('Trying to add user @%s into newbie list', user.username)
+        with self._lock:
+            if user.id in self._storage:
+                self._logger.warning('Can not add! User @%s already in newbie list.', user.username)
+                raise UserAlreadyInStorageError()
 
-        self._storage.update({user.id: newbie})
+            if len(self._storage) >= self._max_size:
+                self._evict_oldest()
+
+            self._put(newbie)
+        if self._database is not None:
+            self._database.save_newbie(self._chat_id, newbie)
 
     def remove(self, user: User):
-        try:
-            self._logger.debug(f'Trying to remove newbie {user} from list')
-            del self._storage[user.id]
-        except KeyError:
-            self._logger.warning(f'Can not remove! User @{user.username} not found in newbie list!')
+        self._logger.debug('Trying to remove newbie %s (@%s) from list', user.id, user.username)
+        with self._lock:
+            newbie = self._pop(user.id)
+        if newbie is None:
+            self._logger.warning('Can not remove! User @%s not found in newbie list!', user.username)
+            return
 
-    def update(self, user: User, greeting: Message):
-        self._logger.debug(f'Trying to update greeting {greeting} for newbie @{user.username}')
-        try:
-            current_newbie = self.get(user)
-        except UserNotFoundInStorageError:
-            raise UserStorageUpdateError()
-        self._storage[user.id] = NewbieDto(
-            user=current_newbie.user,
-            timeout=current_newbie.timeout,
-            question=current_newbie.question,
-            greeting=greeting,
-        )
+        if self._database is not None:
+            self._database.delete_newbie(self._chat_id, user.id)
+
+        if newbie.timer is not None:
+            newbie.timer.cancel()
+
+    def update(self, user: User, greeting: MessageRefDto):
+        self._logger.debug('Trying to update greeting %s for newbie @%s', greeting.message_id, user.username)
+        with self._lock:
+            try:
+                current_newbie = self.get(user)
+            except UserNotFoundInStorageError:
+                raise UserStorageUpdateError()
+            newbie = NewbieDto(
+                user=current_newbie.user,
+                timeout=current_newbie.timeout,
+                question=current_newbie.question,
+                greeting=greeting,
+                timer=current_newbie.timer,
+            )
+            self._put(newbie)
+        if self._database is not None:
+            self._database.save_newbie(self._chat_id, newbie)
+
+    def set_timer(self, user: User, timer: ScheduledTask):
+        with self._lock:
+            try:
+                current_newbie = self.get(user)
+            except UserNotFoundInStorageError:
+                raise UserStorageUpdateError()
+            self._put(NewbieDto(
+                user=current_newbie.user,
+                timeout=current_newbie.timeout,
+                question=current_newbie.question,
+                greeting=current_newbie.greeting,
+                timer=timer,
+            ))
 
     def get(self, user: User) -> NewbieDto:
         try:
             return self._storage[user.id]
         except KeyError:
-            self._logger.error(f'Can not get! User @{user.username} not found in newbie list.')
+            self._logger.error('Can not get! User @%s not found in newbie list.', user.username)
             raise UserNotFoundInStorageError()
 
-    def get_user_list(self) -> list:
-        return list(self._storage.keys())
+    def get_by_greeting(self, chat_id: int, message_id: int) -> List[NewbieDto]:
+        with self._lock:
+            return [self._storage[user_id] for user_id in self._greeting_index.get((chat_id, message_id), ())]
+
+    def mark_passed(self, user: User, now: float):
+        with self._lock:
+            self._passed.pop(user.id, None)
+            self._passed[user.id] = now
+            expired = now - NewbieSettings.PASSED_TTL_SECONDS
+            while self._passed:
+                user_id, passed_at = next(iter(self._passed.items()))
+                if passed_at >= expired and len(self._passed) <= NewbieSettings.PASSED_MAX_SIZE:
+                    break
+                del self._passed[user_id]
+
+    def passed_recently(self, user_id: int, now: float) -> bool:
+        passed_at = self._passed.get(user_id)
+        return passed_at is not None and passed_at >= now - NewbieSettings.PASSED_TTL_SECONDS
+
+    def _put(self, newbie: NewbieDto):
+        previous = self._storage.get(newbie.user.id)
+        if previous is not None:
+            self._unindex(previous)
+
+        self._storage[newbie.user.id] = newbie
+        if newbie.greeting is not None:
+            key = (newbie.greeting.chat_id, newbie.greeting.message_id)
+            self._greeting_index.setdefault(key, set()).add(newbie.user.id)
+
+    def _pop(self, user_id: int) -> Optional[NewbieDto]:
+        newbie = self._storage.pop(user_id, None)
+        if newbie is not None:
+            self._unindex(newbie)
+
+        return newbie
+
+    def _unindex(self, newbie: NewbieDto):
+        if newbie.greeting is None:
+            return
+
+        key = (newbie.greeting.chat_id, newbie.greeting.message_id)
+        user_ids = self._greeting_index.get(key)
+        if user_ids is None:
+            return
+
+        user_ids.discard(newbie.user.id)
+        if not user_ids:
+            del self._greeting_index[key]
+
+    def _evict_oldest(self):
+        user_id = next(iter(self._storage))
+        newbie = self._pop(user_id)
+        self._evicted += 1
+        self._logger.warning('Newbie list is full, @%s evicted without kick', newbie.user.username)
+
+        if self._database is not None:
+            self._database.delete_newbie(self._chat_id, user_id)
+        if newbie.timer is not None:
+            newbie.timer.cancel()
 
 
 class QuestionProvider:
+    """
+    Captcha question bank, loaded once at startup.
+
+    Every question is prepared in up to MAX_VARIANTS answer orders and the keyboard of every order is serialized
+    once, so a greeting takes two random choices and a join of the user id into the keyboard. Buttons carry
+    `<question>.<answer>` as payload, an answer is found by its payload with one dict lookup. Payloads of keyboards
+    sent before the bank (QuestionSettings.LEGACY_REPLIES) are accepted as correct answers, so newbies restored
+    from the database with such a keyboard can still pass.
+    """
+    _questions: List[List[GreetingQuestionDto]]
+    _answers: Dict[str, GreetingAnswerDto]
+
+    def __init__(self, questions: List[List[GreetingQuestionDto]], answers: Dict[str, GreetingAnswerDto]):
+        self._questions = questions
+        self._answers = answers
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def get_question(self) -> GreetingQuestionDto:
+        return random.choice(random.choice(self._questions))
+
+    def get_answer(self, payload: str) -> Optional[GreetingAnswerDto]:
+        return self._answers.get(payload)
+
+    @classmethod
+    def load(cls, path: Optional[str], logger: logging.Logger) -> 'QuestionProvider':
+        """
+        Load the bank from a JSON file, QuestionSettings.DEFAULT_QUESTIONS are asked without a usable one
+        """
+        questions = QuestionSettings.DEFAULT_QUESTIONS
+        if path is not None:
+            try:
+                with open(path, encoding='utf-8') as file:
+                    questions = json.load(file)
+            except FileNotFoundError:
+                logger.info('Question file %s not found, default question is asked', path)
+            except (OSError, ValueError) as e:
+                logger.error('Can not load question file %s, default question is asked: %s', path, e)
+
+        provider = cls.parse(questions, logger)
+        if not provider:
+            logger.error('No valid question in %s, default question is asked', path)
+            provider = cls.parse(QuestionSettings.DEFAULT_QUESTIONS, logger)
+        logger.info('%s captcha questions loaded', len(provider))
+
+        return provider
+
+    @classmethod
+    def parse(cls, questions: list, logger: logging.Logger) -> 'QuestionProvider':
+        """
+        Build the bank from a list of `{"text", "timeout", "shuffle", "row_width", "answers": [{"text", "correct",
+        "reply"}]}`
+
+        text is formatted with the newbie mention, timeout is in seconds, answers are shuffled unless shuffle is
+        false and laid out row_width buttons per row, all in one row by default. Answers marked correct pass
+        the captcha, every answer does if none is marked. reply is formatted with the first name of the newbie.
+        Invalid questions are logged and skipped.
+        """
+        variants = list()
+        answers = {
+            payload: GreetingAnswerDto(text=payload, correct=True, reply=reply)
+            for payload, reply in QuestionSettings.LEGACY_REPLIES.items()
+        }
+        for number, question in enumerate(questions if isinstance(questions, list) else ()):
+            try:
+                question_variants, question_answers = cls._prepare(len(variants), question)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                logger.warning('Invalid question %s skipped: %s', number + 1, e)
+                continue
+
+            variants.append(question_variants)
+            answers.update(question_answers)
+
+        return cls(variants, answers)
+
     @staticmethod
-    def get_question() -> GreetingQuestionDto:
-        return GreetingQuestionDto(
-            text='{mention}, прочитал(а) правила чата?',
-            keyboard=InlineKeyboardMarkup().row(
-                InlineKeyboardButton(text='Да, принял(а) к сведению.', callback_data='да'),
-                InlineKeyboardButton(text='Нет, но сейчас прочитаю.', callback_data='нет'),
-            ),
-            timeout=120,
-            reply={
-                'да': '*{first_name} считает, что да.*',
-                'нет': '*{first_name} считает, что нет. ¯\\_(ツ)_/¯*',
-            }
-
-        )
+    def _prepare(number: int, question: dict) -> Tuple[List[GreetingQuestionDto], Dict[str, GreetingAnswerDto]]:
+        text = str(question['text'])
+        timeout = int(question.get('timeout', QuestionSettings.DEFAULT_TIMEOUT))
+        entries = question['answers']
+        row_width = int(question.get('row_width', len(entries)))
+        if len(entries) < 2 or timeout <= 0 or row_width <= 0:
+            raise ValueError('at least two answers, positive timeout and row width are required')
+
+        marked = any(entry.get('correct') for entry in entries)
+        answers = dict()
+        for answer_number, entry in enumerate(entries):
+            correct = bool(entry.get('correct', not marked))
+            default_reply = QuestionSettings.CORRECT_REPLY if correct else QuestionSettings.WRONG_REPLY
+            answers[f'{number}.{answer_number}'] = GreetingAnswerDto(
+                text=str(entry['text']),
+                correct=correct,
+                reply=str(entry.get('reply', default_reply)),
+            )
+        payloads = list(answers)
+
+        count = len(payloads)
+        orders = {tuple(range(count))}
+        if question.get('shuffle', True):
+            orders = set()
+            while len(orders) < min(QuestionSettings.MAX_VARIANTS, math.factorial(count)):
+                orders.add(tuple(random.sample(range(count), count)))
+
+        variants = list()
+        for order in sorted(orders):
+            keyboard = InlineKeyboardMarkup(row_width=row_width)
+            keyboard.add(*(
+                InlineKeyboardButton(
+                    text=answers[payloads[index]].text,
+                    callback_data=CallbackRouter.encode(
+                        CallbackNamespace.GREETING,
+                        QuestionSettings.USER_ID_PLACEHOLDER,
+                        payloads[index],
+                    ),
+                )
+                for index in order
+            ))
+            keyboard_parts = tuple(keyboard.to_json().split(QuestionSettings.USER_ID_PLACEHOLDER))
+            if len(keyboard_parts) != count + 1:
+                raise ValueError(f'answers must not contain {QuestionSettings.USER_ID_PLACEHOLDER}')
+
+            variants.append(GreetingQuestionDto(text=text, keyboard_parts=keyboard_parts, timeout=timeout))
+
+        return variants, answers
@@ -0,0 +1,632 @@
+import logging
+import time
+from typing import Optional
+
+from telebot.apihelper import ApiException
+from telebot.types import Message, CallbackQuery
+
+from audit import AuditLog
+from blocklist import BlocklistWatcher
+from const import TelegramParseMode, LoggingSettings, ChatCommand, MessageSettings, TelegramMemberStatus, \
+    FloodSettings, BlocklistSettings, BlocklistAction, DuplicateSettings, AuditCommand, AdmissionMode, CallbackNamespace
+from dto import MessageRefDto, UserDto, ChatMemberUpdateDto, ChatJoinRequestDto
+from error import ParseBanDurationError, UserAlreadyInStorageError, UserStorageUpdateError, \
+    InvalidCommandError, InvalidConditionError, UserNotFoundInStorageError, UnauthorizedCommandError, \
+    AuditLogUnavailableError
+from greeting import QuestionProvider
+from metrics import Metrics
+from outbound import ThrottledTeleBot
+from partition import ChatPartition, ChatPartitionMap
+from router import CommandRouter, CallbackRouter
+from version import __version__
+
+
+def register_handlers(
+        bot: ThrottledTeleBot,
+        router: CommandRouter,
+        callback_router: CallbackRouter,
+        partitions: ChatPartitionMap,
+        metrics: Metrics,
+        audit_log: Optional[AuditLog],
+        blocklist_watcher: Optional[BlocklistWatcher],
+        questions: QuestionProvider,
+        admission_mode: str,
+        logger: logging.Logger,
+):
+    """
+    Bind update handlers to a bot, the order of registration is the order filters are tried in
+
+    Blocklist checks are skipped without a blocklist watcher, !history answers nothing without an audit log.
+    Join requests are left to admins unless admission_mode is AdmissionMode.JOIN_REQUEST.
+    """
+    def is_blocked(message: Message) -> bool:
+        """
+        Handler filter, scans messages of served chats for blocklisted content
+        """
+        if blocklist_watcher is None:
+            return False
+
+        chat = partitions.get(message.chat.id)
+        if chat is None or message.from_user is None or blocklist_watcher.blocklist.match_message(message) is None:
+            return False
+
+        # filters run on the receiving thread of all chats, admin rights are confirmed in the lane
+        return not chat.methods.is_cached_admin(message.from_user)
+
+    # registered first, so blocked content is deleted before any other handler sees it
+    @bot.message_handler(func=is_blocked, content_types=BlocklistSettings.CONTENT_TYPES)
+    @partitions.lane
+    @metrics.timed
+    def blocklist_handler(chat: ChatPartition, message: Message):
+        target_user = message.from_user
+        try:
+            if chat.methods.is_admin(target_user, confirm_negative=True):
+                return
+        except ApiException:
+            logger.error('Can not check admin rights of %s (@%s), blocked content is kept', target_user.id,
+                         target_user.username)
+            return
+
+        action = blocklist_watcher.blocklist.match_message(message)
+        logger.warning('Blocked content from %s (@%s) in chat %s: %s', target_user.id, target_user.username,
+                       chat.chat_id, action)
+        chat.methods.delete_chat_message(message)
+        try:
+            if action == BlocklistAction.READ_ONLY:
+                duration = chat.methods.get_duration(
+                    text=BlocklistSettings.READ_ONLY_DURATION,
+                    duration_class=chat.settings.restrict_duration(),
+                )
+                text = chat.methods.set_read_only(
+                    user=target_user,
+                    message=message,
+                    duration=duration,
+                    command=AuditCommand.BLOCKLIST,
+                )
+            elif action == BlocklistAction.BAN:
+                duration = chat.methods.get_duration(text='', duration_class=chat.settings.ban_duration())
+                text = chat.methods.ban_kick(
+                    user=target_user,
+                    message=message,
+                    duration=duration,
+                    command=AuditCommand.BLOCKLIST,
+                )
+            else:
+                return
+
+            # the offending message is deleted already, so there is nothing to reply to
+            bot.send_message(chat_id=message.chat.id, text=f'*{text}*', parse_mode=TelegramParseMode.MARKDOWN)
+        except ApiException as e:
+            logger.error('Can not punish chat member %s (@%s) for blocked content', target_user.id,
+                         target_user.username)
+            chat.methods.observe_api_error(e)
+
+    def is_spam_wave(message: Message) -> bool:
+        """
+        Handler filter, registers messages of users who recently passed the captcha in the duplicate detector
+        """
+        # telebot tries the filter before content types, service messages must not count
+        if message.content_type not in DuplicateSettings.CONTENT_TYPES:
+            return False
+
+        chat = partitions.get(message.chat.id)
+        if chat is None or message.from_user is None:
+            return False
+
+        now = time.time()
+        if not chat.newbie_storage.passed_recently(message.from_user.id, now):
+            return False
+
+        entities = message.entities or message.caption_entities or ()
+        has_link = any(entity.type in DuplicateSettings.LINK_ENTITY_TYPES for entity in entities)
+
+        return chat.duplicate_detector.register_message(
+            UserDto.from_user(message.from_user),
+            message.message_id,
+            message.text or message.caption,
+            message.content_type == 'text' and not has_link,
+            now,
+        )
+
+    @bot.message_handler(func=is_spam_wave, content_types=DuplicateSettings.CONTENT_TYPES)
+    @partitions.lane
+    @metrics.timed
+    def spam_wave_handler(chat: ChatPartition, message: Message):
+        senders = chat.duplicate_detector.take_senders(message.text or message.caption)
+        if not senders:
+            return
+
+        now = time.time()
+        users = {user.id: user for user, _ in senders}
+        repeat_offenders = {user_id for user_id in users if chat.duplicate_detector.register_offence(user_id, now)}
+        logger.warning('Spam wave in chat %s: %s messages from %s users, %s of them caught before', chat.chat_id,
+                       len(senders), len(users), len(repeat_offenders))
+        purge_text = chat.methods.purge_spam_wave(senders=senders, message=message, repeat_offenders=repeat_offenders)
+        if purge_text:
+            try:
+                bot.send_message(chat_id=message.chat.id, text=f'*{purge_text}*', parse_mode=TelegramParseMode.MARKDOWN)
+            except ApiException:
+                logger.error('Can not send spam wave notification to chat %s', chat.chat_id)
+
+    def is_flood(message: Message) -> bool:
+        """
+        Handler filter, registers every message of a served chat in its flood detector
+        """
+        # telebot tries the filter before content types, service messages must not count
+        if message.content_type not in FloodSettings.CONTENT_TYPES:
+            return False
+
+        chat = partitions.get(message.chat.id)
+        if chat is None or message.from_user is None:
+            return False
+
+        text = message.text or message.caption
+        if not chat.flood_detector.register_message(message.from_user.id, text, time.monotonic()):
+            return False
+
+        # filters run on the receiving thread of all chats, admin rights are confirmed in the lane
+        return not chat.methods.is_cached_admin(message.from_user)
+
+    # registered before the command router, so the filter sees every message left by the blocklist
+    @bot.message_handler(func=is_flood, content_types=FloodSettings.CONTENT_TYPES)
+    @partitions.lane
+    @metrics.timed
+    def flood_handler(chat: ChatPartition, message: Message):
+        target_user = message.from_user
+        try:
+            if chat.methods.is_admin(target_user, confirm_negative=True):
+                return
+
+            logger.warning('Flood from %s (@%s) in chat %s', target_user.id, target_user.username, chat.chat_id)
+            duration = chat.methods.get_duration(
+                text=FloodSettings.READ_ONLY_DURATION,
+                duration_class=chat.settings.restrict_duration(),
+            )
+            restriction_text = chat.methods.set_flood_read_only(user=target_user, message=message, duration=duration)
+            bot.send_message(
+                chat_id=message.chat.id,
+                text=f'*{restriction_text}*',
+                reply_to_message_id=message.message_id,
+                parse_mode=TelegramParseMode.MARKDOWN,
+            )
+        except ApiException as e:
+            logger.error('Can not restrict flooding chat member %s (@%s)', target_user.id, target_user.username)
+            chat.methods.observe_api_error(e)
+
+    bot.message_handler(content_types=['text'])(router.route)
+
+    @router.command('/ping', '/id', '/ver')
+    @partitions.lane
+    @metrics.timed
+    def test_handler(chat: ChatPartition, message: Message):
+        response_list = {
+            '/ping': 'pong',
+            '/id': message.chat.id,
+            '/ver': __version__,
+        }
+
+        try:
+            if not chat.methods.is_admin(message.from_user):
+                raise InvalidConditionError()
+
+            command = message.text.split(None, 1)[0].split('@', 1)[0]
+            response_message = bot.send_message(message.chat.id, response_list[command])
+            for current_message in message, response_message:
+                chat.methods.create_scheduled_threat(
+                    pause=MessageSettings.SELF_DESTRUCT_TIMEOUT,
+                    action=chat.methods.delete_chat_message,
+                    args=(current_message,)
+                )
+        except (ApiException, InvalidConditionError):
+            chat.methods.delete_chat_message(message)
+
+    @router.command('/me')
+    @partitions.lane
+    @metrics.timed
+    def me_handler(chat: ChatPartition, message: Message):
+        try:
+            query = chat.methods.prepare_query(message.text)
+
+            if query:
+                bot.send_message(message.chat.id, '*{}* _{}_'.format(message.from_user.first_name, query),
+                                 parse_mode=TelegramParseMode.MARKDOWN)
+            chat.methods.delete_chat_message(message)
+        except (ApiException, IndexError):
+            bot.send_message(
+                message.chat.id, 'Братиш, наебнулось. Посмотри логи.')
+
+    @router.command(ChatCommand.RO, ChatCommand.TO)
+    @partitions.lane
+    @metrics.timed
+    def restrict_handler(chat: ChatPartition, message: Message):
+        try:
+            if message.forward_from:
+                raise InvalidConditionError()
+            if not chat.methods.is_admin(message.from_user, confirm_negative=True):
+                raise UnauthorizedCommandError(message=message, service=chat.methods, bot=bot, logger=logger)
+
+            command = message.text[:3]
+            task_list = {
+                f'{ChatCommand.RO}': chat.methods.set_read_only,
+                f'{ChatCommand.TO}': chat.methods.set_text_only,
+            }
+
+            try:
+                target_message = message.reply_to_message
+            except AttributeError:
+                raise InvalidConditionError()
+            if chat.methods.is_admin(target_message.from_user):
+                logger.warning('@%s trying to restrict another admin. Abort.', message.from_user.username)
+                raise InvalidConditionError()
+
+            try:
+                query = chat.methods.prepare_query(message.text)
+                restrict_duration = chat.methods.get_duration(
+                    text=query,
+                    duration_class=chat.settings.restrict_duration(),
+                )
+            except ParseBanDurationError:
+                raise InvalidCommandError
+
+            target_user = target_message.from_user
+            try:
+                logger.info('Try to restrict @%s with %s for %s.', target_user.username, command, query)
+                try:
+                    restrict_task = task_list.get(command)
+                    restriction_text = restrict_task(
+                        user=target_user,
+                        message=message,
+                        duration=restrict_duration,
+                        actor=message.from_user,
+                    )
+                except (KeyError, TypeError):
+                    raise InvalidCommandError()
+
+                bot.send_message(
+                    chat_id=message.chat.id,
+                    text=f'*{restriction_text}*',
+                    reply_to_message_id=message.message_id,
+                    parse_mode=TelegramParseMode.MARKDOWN,
+                )
+            except ApiException as e:
+                logger.error('Can not restrict chat member %s (@%s)', target_user.id, target_user.username)
+                chat.methods.observe_api_error(e)
+
+        except InvalidCommandError:
+            logger.warning('Can not execute command \'%s\' from @%s', message.text, message.from_user.username)
+            chat.methods.delete_chat_message(message)
+        except InvalidConditionError:
+            pass
+
+    @router.command(ChatCommand.RW, exact=True)
+    @partitions.lane
+    @metrics.timed
+    def permit_handler(chat: ChatPartition, message: Message):
+        try:
+            if message.forward_from:
+                raise InvalidConditionError()
+            if not chat.methods.is_admin(message.from_user, confirm_negative=True):
+                raise UnauthorizedCommandError(message=message, service=chat.methods, bot=bot, logger=logger)
+
+            try:
+                target_message = message.reply_to_message
+            except AttributeError:
+                raise InvalidCommandError()
+
+            target_user = target_message.from_user
+
+            try:
+                chat_member = chat.methods.get_chat_member(target_user.id)
+                if chat_member.status != TelegramMemberStatus.RESTRICTED:
+                    raise InvalidConditionError()
+
+                logger.info('Try to permit @%s.', target_user.username)
+                permission_text = chat.methods.set_read_write(
+                    user=target_user,
+                    message=message,
+                    actor=message.from_user,
+                )
+
+                bot.send_message(
+                    chat_id=message.chat.id,
+                    text=f'*{permission_text}*',
+                    reply_to_message_id=message.message_id,
+                    parse_mode=TelegramParseMode.MARKDOWN,
+                )
+            except ApiException as e:
+                logger.error('Can not permit chat member %s (@%s)', target_user.id, target_user.username)
+                chat.methods.observe_api_error(e)
+
+        except InvalidCommandError:
+            logger.warning('Can not execute command \'%s\' from @%s', message.text, message.from_user.username)
+            chat.methods.delete_chat_message(message)
+        except InvalidConditionError:
+            pass
+
+    @router.command(ChatCommand.BAN)
+    @partitions.lane
+    @metrics.timed
+    def ban_handler(chat: ChatPartition, message: Message):
+        try:
+            if message.forward_from:
+                raise InvalidConditionError()
+            if not chat.methods.is_admin(message.from_user, confirm_negative=True):
+                raise UnauthorizedCommandError(message=message, service=chat.methods, bot=bot, logger=logger)
+
+            try:
+                target_message = message.reply_to_message
+                if chat.methods.is_admin(target_message.from_user):
+                    logger.warning('@%s trying to ban another admin. Abort.', message.from_user.username)
+                    raise InvalidCommandError()
+            except AttributeError:
+                raise InvalidConditionError()
+
+            try:
+                query = chat.methods.prepare_query(message.text)
+                ban_duration = chat.methods.get_duration(text=query, duration_class=chat.settings.ban_duration())
+            except ParseBanDurationError:
+                raise InvalidCommandError
+
+            target_user = target_message.from_user
+            try:
+                logger.info('Try to ban @%s for %s.', target_user.username, query)
+                ban_text = chat.methods.ban_kick(
+                    user=target_user,
+                    message=message,
+                    duration=ban_duration,
+                    actor=message.from_user,
+                )
+                bot.send_message(
+                    chat_id=message.chat.id,
+                    text=f'*{ban_text}*',
+                    reply_to_message_id=message.message_id,
+                    parse_mode=TelegramParseMode.MARKDOWN,
+                )
+            except ApiException as e:
+                logger.error('Can not kick chat member @%s', target_user.username)
+                chat.methods.observe_api_error(e)
+
+        except InvalidCommandError:
+            logger.warning('Can not execute command \'%s\' from @%s', message.text, message.from_user.username)
+            chat.methods.delete_chat_message(message)
+        except InvalidConditionError:
+            pass
+
+    @router.command(ChatCommand.HISTORY)
+    @partitions.lane
+    @metrics.timed
+    def history_handler(chat: ChatPartition, message: Message):
+        try:
+            if message.forward_from:
+                raise InvalidConditionError()
+            if not chat.methods.is_admin(message.from_user, confirm_negative=True):
+                raise UnauthorizedCommandError(message=message, service=chat.methods, bot=bot, logger=logger)
+
+            if message.reply_to_message is not None:
+                user_id = message.reply_to_message.from_user.id
+            else:
+                try:
+                    user_id = int(chat.methods.prepare_query(message.text))
+                except ValueError:
+                    raise InvalidCommandError()
+
+            try:
+                entries = audit_log.history(chat.chat_id, user_id) if audit_log is not None else list()
+                lines = [f'История {user_id}:' if entries else f'История {user_id} пуста.']
+            except AuditLogUnavailableError:
+                logger.warning('History of %s in chat %s is unavailable, audit log is not indexed yet', user_id,
+                               chat.chat_id)
+                entries = list()
+                lines = [f'История {user_id} пока недоступна, попробуйте позже.']
+            for entry in entries:
+                actor = 'бот' if entry.actor is None else f'@{entry.actor.username or entry.actor.id}'
+                duration = '' if entry.duration is None else f' {entry.duration.text}'
+                created_at = time.strftime(LoggingSettings.DATE_FORMAT, time.localtime(entry.timestamp))
+                lines.append(f'{created_at} {entry.command}{duration} ({actor})')
+
+            bot.send_message(chat_id=message.chat.id, text='\n'.join(lines), reply_to_message_id=message.message_id)
+        except ApiException:
+            logger.error('Can not send history to chat %s', chat.chat_id)
+        except InvalidCommandError:
+            logger.warning('Can not execute command \'%s\' from @%s', message.text, message.from_user.username)
+            chat.methods.delete_chat_message(message)
+        except InvalidConditionError:
+            pass
+
+    @bot.message_handler(content_types=['new_chat_members'])
+    @partitions.lane
+    @metrics.timed
+    def greeting_handler(chat: ChatPartition, message: Message):
+        burst = chat.raid_detector.register_joins(len(message.new_chat_members), time.time())
+        for new_user in message.new_chat_members:
+            logger.info('New member joined the group: %s (@%s)', new_user.id, new_user.username)
+            if admission_mode == AdmissionMode.JOIN_REQUEST and chat.newbie_storage.passed_recently(
+                    new_user.id, time.time()):
+                # the captcha was answered before the join request was approved
+                continue
+
+            question = questions.get_question()
+
+            try:
+                chat.newbie_storage.add(user=new_user, timeout=message.date + question.timeout, question=question)
+            except UserAlreadyInStorageError:
+                return chat.methods.timeout_kick(chat.newbie_storage.get(new_user))
+
+            if burst:
+                chat.join_batcher.add(new_user, message)
+                continue
+
+            logger.info('Trying to temporary restrict all users content for @%s', new_user.username)
+            try:
+                bot.restrict_chat_member(
+                    chat_id=message.chat.id,
+                    user_id=new_user.id,
+                    until_date=message.date + question.timeout * 2,
+                )
+            except ApiException:
+                logger.error('Can not restrict chat member %s (@%s)', new_user.id, new_user.username)
+                return
+
+            greeting_message = bot.send_message(
+                chat_id=message.chat.id,
+                text=question.text.format(mention=chat.methods.mention(new_user)),
+                reply_markup=question.keyboard(new_user.id),
+                reply_to_message_id=message.message_id,
+                parse_mode=TelegramParseMode.MARKDOWN,
+            )
+            try:
+                chat.newbie_storage.update(
+                    user=new_user,
+                    greeting=MessageRefDto.from_message(greeting_message),
+                )
+                timer = chat.methods.create_scheduled_threat(
+                    pause=question.timeout,
+                    action=chat.methods.timeout_kick,
+                    args=(chat.newbie_storage.get(new_user),)
+                )
+                chat.newbie_storage.set_timer(user=new_user, timer=timer)
+            except (UserStorageUpdateError, UserNotFoundInStorageError):
+                chat.methods.delete_chat_message(greeting_message)
+
+    @router.command(ChatCommand.PASS, exact=True)
+    @partitions.lane
+    @metrics.timed
+    def pass_handler(chat: ChatPartition, message: Message):
+        try:
+            if message.forward_from:
+                raise InvalidConditionError()
+            if not chat.methods.is_admin(message.from_user, confirm_negative=True):
+                raise UnauthorizedCommandError(message=message, service=chat.methods, bot=bot, logger=logger)
+            try:
+                target_message = message.reply_to_message
+            except AttributeError:
+                raise InvalidConditionError()
+            if target_message is None:
+                raise InvalidConditionError()
+            newbie_list = chat.newbie_storage.get_by_greeting(target_message.chat.id, target_message.message_id)
+            if not newbie_list:
+                raise InvalidConditionError()
+
+            chat.methods.delete_chat_message(message)
+            chat.methods.delete_message(newbie_list[0].greeting.chat_id, newbie_list[0].greeting.message_id)
+            for newbie in newbie_list:
+                bot.restrict_chat_member(
+                    chat_id=target_message.chat.id,
+                    user_id=newbie.user.id,
+                    can_send_messages=True,
+                )
+                chat.newbie_storage.remove(newbie.user)
+                chat.newbie_storage.mark_passed(newbie.user, time.time())
+
+        except ApiException:
+            logger.error('Can not pass message')
+        except InvalidConditionError:
+            pass
+
+    @partitions.lane
+    @metrics.timed
+    def member_update_handler(chat: ChatPartition, update: ChatMemberUpdateDto):
+        old_status, new_status = update.old_member.status, update.new_member.status
+        logger.debug('Chat member %s of chat %s changed by %s: %s -> %s', update.new_member.user.id, chat.chat_id,
+                     update.actor.id, old_status, new_status)
+        chat.member_mirror.update(update.new_member)
+
+        admin_statuses = (TelegramMemberStatus.CREATOR, TelegramMemberStatus.ADMINISTRATOR)
+        if (old_status in admin_statuses) != (new_status in admin_statuses):
+            chat.admin_cache.invalidate(chat.chat_id)
+
+    # chat_member and my_chat_member updates are parsed by the bot itself, in the lane of their chat
+    bot.add_chat_member_handler(member_update_handler)
+
+    @partitions.lane
+    @metrics.timed
+    def join_request_handler(chat: ChatPartition, request: ChatJoinRequestDto):
+        new_user = request.user
+        logger.info('Join request to the group: %s (@%s)', new_user.id, new_user.username)
+        question = questions.get_question()
+        try:
+            chat.newbie_storage.add(user=new_user, timeout=request.date + question.timeout, question=question)
+        except UserAlreadyInStorageError:
+            return
+
+        try:
+            captcha_message = bot.send_message(
+                chat_id=request.user_chat_id,
+                text=question.text.format(mention=chat.methods.mention(new_user)),
+                reply_markup=question.keyboard(new_user.id),
+                parse_mode=TelegramParseMode.MARKDOWN,
+            )
+        except ApiException:
+            # the request stays pending for admins
+            logger.error('Can not send captcha to %s (@%s)', new_user.id, new_user.username)
+            chat.newbie_storage.remove(new_user)
+            return
+
+        try:
+            chat.newbie_storage.update(user=new_user, greeting=MessageRefDto.from_message(captcha_message))
+            timer = chat.methods.create_scheduled_threat(
+                pause=question.timeout,
+                action=chat.methods.timeout_decline,
+                args=(chat.newbie_storage.get(new_user),)
+            )
+            chat.newbie_storage.set_timer(user=new_user, timer=timer)
+        except (UserStorageUpdateError, UserNotFoundInStorageError):
+            pass
+
+    if admission_mode == AdmissionMode.JOIN_REQUEST:
+        # the captcha is answered in private chat, the user is approved or declined with a single call
+        bot.add_chat_join_request_handler(join_request_handler)
+
+    # callback queries are answered and checked for the user the keyboard was sent to before they reach the lane
+    bot.callback_query_handler(func=lambda call: True)(callback_router.route)
+
+    @callback_router.namespace(CallbackNamespace.GREETING)
+    @partitions.lane
+    @metrics.timed
+    def greeting_callback(chat: ChatPartition, call: CallbackQuery):
+        try:
+            if not call.message:
+                raise InvalidConditionError()
+            if call.from_user.id not in chat.newbie_storage:
+                raise InvalidConditionError()
+
+            newbie = chat.newbie_storage.get(call.from_user)
+            greeting_message = newbie.greeting
+            if (call.message.chat.id, call.message.message_id) != (greeting_message.chat_id, greeting_message.message_id):
+                raise InvalidConditionError()
+
+            answer = questions.get_answer(CallbackRouter.decode(call.data).payload)
+            if answer is None:
+                raise InvalidConditionError()
+
+            if chat.methods.is_join_request(newbie):
+                if not answer.correct:
+                    return chat.methods.decline_join_request(newbie, AuditCommand.CAPTCHA_FAILED)
+                return chat.methods.approve_join_request(newbie)
+
+            if len(chat.newbie_storage.get_by_greeting(greeting_message.chat_id, greeting_message.message_id)) == 1:
+                chat.methods.remove_inline_keyboard(greeting_message)
+            bot.send_message(
+                chat_id=call.message.chat.id,
+                text=answer.reply.format(first_name=call.from_user.first_name),
+                reply_to_message_id=call.message.message_id,
+                parse_mode=TelegramParseMode.MARKDOWN,
+            )
+            if not answer.correct:
+                return chat.methods.wrong_answer_kick(newbie)
+
+            chat.newbie_storage.remove(newbie.user)
+            chat.newbie_storage.mark_passed(newbie.user, time.time())
+            try:
+                bot.restrict_chat_member(
+                    chat_id=call.message.chat.id,
+                    user_id=call.from_user.id,
+                    can_send_messages=True,
+                    can_send_media_messages=True,
+                    can_send_other_messages=True,
+                    can_add_web_page_previews=True
+                )
+            except ApiException:
+                logger.error('Can not disable restriction for chat member @%s', call.from_user.username)
+        except InvalidConditionError:
+            pass
@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from telebot import TeleBot
+from telebot.types import ChatMember
+
+from const import MemberMirrorSettings
+
+
+class ChatMemberMirror:
+    """
+    Local copy of member statuses and permissions of one chat.
+
+    Members are mirrored from chat_member updates and from getChatMember answers. Telegram sends an update on every
+    status or permission change, so a mirrored member is trusted for TTL_SECONDS. A restriction ends without
+    an update, so a member whose until_date has passed is fetched again, and so is a member the bot has just
+    restricted or banned itself until its update arrives. At most MAX_SIZE members are kept, the least recently
+    updated one is evicted first.
+    """
+    _members: 'OrderedDict[int, Tuple[ChatMember, float]]'
+    _logger: logging.Logger
+
+    def __init__(self, chat_id: int, bot: TeleBot, logger: logging.Logger):
+        self._chat_id = chat_id
+        self._bot = bot
+        self._members = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger = logger
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def get(self, user_id: int) -> ChatMember:
+        """
+        Get a chat member from the mirror, a missing or stale one is fetched from the Bot API
+        """
+        now = time.time()
+        with self._lock:
+            mirrored = self._members.get(user_id)
+        if mirrored is not None:
+            member, updated_at = mirrored
+            if now - updated_at <= MemberMirrorSettings.TTL_SECONDS and not 0 < (member.until_date or 0) <= now:
+                return member
+
+        member = self._bot.get_chat_member(self._chat_id, user_id)
+        self.update(member)
+
+        return member
+
+    def update(self, member: ChatMember):
+        with self._lock:
+            self._members[member.user.id] = (member, time.time())
+            self._members.move_to_end(member.user.id)
+            if len(self._members) > MemberMirrorSettings.MAX_SIZE:
+                self._members.popitem(last=False)
+        self._logger.debug('Chat member %s of chat %s mirrored: %s', member.user.id, self._chat_id, member.status)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._members.pop(user_id, None)
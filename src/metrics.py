@@ -0,0 +1,225 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Tuple, Callable, Optional
+
+from const import MetricsSettings, MetricName
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    Process metrics rendered in Prometheus text format.
+
+    Every thread records into its own shard, so recording takes no lock: a counter is a dict item update and
+    a histogram observation is a bisect plus two list item updates. Shards are merged only when metrics are scraped.
+    """
+    _families: Dict[str, Tuple[str, str]]
+    _gauges: Dict[str, Callable[[], float]]
+    _labeled_gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]]
+    _shards: List[Tuple[dict, dict]]
+
+    def __init__(self):
+        self._families = dict()
+        self._gauges = dict()
+        self._labeled_gauges = dict()
+        self._shards = list()
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+        self._buckets = MetricsSettings.LATENCY_BUCKETS
+
+        self._describe(MetricName.HANDLER_DURATION, 'histogram', 'Update handler duration, seconds')
+        self._describe(MetricName.API_CALL_DURATION, 'histogram', 'Bot API call duration, seconds')
+        self._describe(MetricName.API_ERRORS, 'counter', 'Bot API calls failed with ApiException')
+
+    def gauge(self, name: str, description: str, callback: Callable[[], float]):
+        self._describe(name, 'gauge', description)
+        self._gauges[name] = callback
+
+    def labeled_gauge(self, name: str, description: str, label: str, callback: Callable[[], Dict[str, float]]):
+        """
+        Gauge with a series per label value, callback returns values keyed by label value
+        """
+        self._describe(name, 'gauge', description)
+        self._labeled_gauges[name] = (label, callback)
+
+    def timed(self, handler: Callable):
+        """
+        Handler decorator, records handler duration labeled with handler function name
+        """
+        labels = (('handler', handler.__name__),)
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self._observe(MetricName.HANDLER_DURATION, labels, time.perf_counter() - started)
+
+        return wrapper
+
+    def observe_api_call(self, method: str, seconds: float):
+        self._observe(MetricName.API_CALL_DURATION, (('method', method),), seconds)
+
+    def count_api_error(self, method: str, code):
+        self._inc(MetricName.API_ERRORS, (('method', method), ('code', str(code))))
+
+    def render(self) -> str:
+        counters = dict()
+        histograms = dict()
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard_counters, shard_histograms in shards:
+            for key, value in shard_counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, values in shard_histograms.copy().items():
+                merged = histograms.setdefault(key, [0] * len(values))
+                for index, value in enumerate(list(values)):
+                    merged[index] += value
+
+        lines = list()
+        for name, (metric_type, description) in self._families.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if metric_type == 'gauge' and name in self._labeled_gauges:
+                label, callback = self._labeled_gauges[name]
+                for label_value, value in sorted(callback().items()):
+                    lines.append(f'{name}{self._format_labels(((label, str(label_value)),))} {value}')
+            elif metric_type == 'gauge':
+                lines.append(f'{name} {self._gauges[name]()}')
+            elif metric_type == 'counter':
+                for (metric_name, labels), value in sorted(counters.items()):
+                    if metric_name == name:
+                        lines.append(f'{name}{self._format_labels(labels)} {value}')
+            else:
+                for (metric_name, labels), values in sorted(histograms.items()):
+                    if metric_name == name:
+                        lines.extend(self._format_histogram(name, labels, values))
+
+        return '\n'.join(lines) + '\n'
+
+    def _describe(self, name: str, metric_type: str, description: str):
+        self._families[name] = (metric_type, description)
+
+    def _shard(self) -> Tuple[dict, dict]:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = (dict(), dict())
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+
+        return shard
+
+    def _inc(self, name: str, labels: Labels, value: float = 1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: Labels, value: float):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            # bucket counts, +Inf bucket count, sum
+            values = [0] * (len(self._buckets) + 2)
+            histograms[key] = values
+
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def _format_histogram(self, name: str, labels: Labels, values: list) -> List[str]:
+        lines = list()
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float('inf'),), values):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{self._format_labels(labels + (("le", le),))} {cumulative}')
+        lines.append(f'{name}_sum{self._format_labels(labels)} {values[-1]}')
+        lines.append(f'{name}_count{self._format_labels(labels)} {cumulative}')
+
+        return lines
+
+    @staticmethod
+    def _format_labels(labels: Labels) -> str:
+        if not labels:
+            return ''
+
+        escaped = (
+            (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels
+        )
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class MetricsServer:
+    """
+    Embedded HTTP server exposing metrics for Prometheus scraping
+
+    READY_PATH answers 200 once the `ready` event is set and 503 before, for container health checks.
+    """
+    _metrics: Metrics
+    _ready: Optional[threading.Event]
+    _logger: logging.Logger
+
+    def __init__(
+            self,
+            metrics: Metrics,
+            listen: str,
+            port: int,
+            ready: Optional[threading.Event],
+            logger: logging.Logger,
+    ):
+        self._metrics = metrics
+        self._ready = ready
+        self._logger = logger
+        self._server = ThreadingHTTPServer((listen, port), self._create_request_handler())
+        self._server.daemon_threads = True
+
+    def start(self):
+        host, port = self._server.server_address[:2]
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        self._logger.info('Metrics server is listening on %s:%s', host, port)
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_request_handler(self):
+        server = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == MetricsSettings.READY_PATH and server._ready is not None:
+                    self.send_response(200 if server._ready.is_set() else 503)
+                    self.end_headers()
+                    return
+
+                if self.path != MetricsSettings.PATH:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                try:
+                    payload = server._metrics.render().encode('utf-8')
+                except Exception:
+                    server._logger.exception('Can not render metrics')
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', MetricsSettings.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                server._logger.debug('Metrics request: ' + format, *args)
+
+        return MetricsRequestHandler
@@ -8,8 +8,9 @@ from const import NotificationTemplateList
 class Notification:
     _notification: Dict[str, List[str]]
 
-    def __init__(self):
+    def __init__(self, templates=NotificationTemplateList):
         self._notification = dict()
+        self._templates = templates
 
     def _init_list(self, list_name: str, source_list: list):
         self._notification[list_name] = copy(source_list)
@@ -22,7 +23,7 @@ class Notification:
         return self._notification[list_name].pop()
 
     def read_only(self, first_name: str, duration_text: str) -> str:
-        template = self._get_notification('read_only', NotificationTemplateList.READ_ONLY)
+        template = self._get_notification('read_only', self._templates.READ_ONLY)
 
         return template.format(
             first_name=first_name,
@@ -30,7 +31,7 @@ class Notification:
         )
 
     def text_only(self, first_name: str, duration_text: str) -> str:
-        template = self._get_notification('text_only', NotificationTemplateList.TEXT_ONLY)
+        template = self._get_notification('text_only', self._templates.TEXT_ONLY)
 
         return template.format(
             first_name=first_name,
@@ -38,27 +39,48 @@ class Notification:
         )
 
     def read_write(self, first_name: str) -> str:
-        template = self._get_notification('read_write', NotificationTemplateList.READ_WRITE)
+        template = self._get_notification('read_write', self._templates.READ_WRITE)
 
         return template.format(first_name=first_name)
 
     def timeout_kick(self, first_name: str) -> str:
-        template = self._get_notification('timeout_kick', NotificationTemplateList.TIMEOUT_KICK)
+        template = self._get_notification('timeout_kick', self._templates.TIMEOUT_KICK)
 
         return template.format(
             first_name=first_name,
         )
 
     def ban_kick(self, first_name: str, duration_text: str) -> str:
-        template = self._get_notification('ban_kick', NotificationTemplateList.BAN_KICK)
+        template = self._get_notification('ban_kick', self._templates.BAN_KICK)
 
         return template.format(
             first_name=first_name,
             duration_text=duration_text,
         )
 
+    def flood(self, first_name: str, duration_text: str) -> str:
+        template = self._get_notification('flood', self._templates.FLOOD)
+
+        return template.format(
+            first_name=first_name,
+            duration_text=duration_text,
+        )
+
+    def spam_wave(self, names: str) -> str:
+        template = self._get_notification('spam_wave', self._templates.SPAM_WAVE)
+
+        return template.format(names=names)
+
+    def spam_wave_read_only(self, names: str, duration_text: str) -> str:
+        template = self._get_notification('spam_wave_read_only', self._templates.SPAM_WAVE_READ_ONLY)
+
+        return template.format(
+            names=names,
+            duration_text=duration_text,
+        )
+
     def unauthorized_punishment(self, first_name: str) -> str:
-        template = self._get_notification('unauthorized_punishment', NotificationTemplateList.UNAUTHORIZED_PUNISHMENT)
+        template = self._get_notification('unauthorized_punishment', self._templates.UNAUTHORIZED_PUNISHMENT)
 
         return template.format(
             first_name=first_name,
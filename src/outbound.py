@@ -0,0 +1,438 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, List, Union
+
+import requests
+from requests import RequestException
+from requests.adapters import HTTPAdapter
+from telebot import TeleBot, apihelper
+from telebot.apihelper import ApiException
+from telebot.types import Update
+
+from const import ApiCallPriority, OutboundSettings, TelegramUpdateType
+from dto import ChatMemberUpdateDto, ChatJoinRequestDto
+from metrics import Metrics
+from scheduler import TaskScheduler
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Take one token if available
+
+        Returns 0 on success, otherwise number of seconds until the next token.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+
+            return (1 - self._tokens) / self._rate
+
+    def is_full(self, now: float) -> bool:
+        """
+        The bucket has refilled, so a new bucket would behave the same
+        """
+        with self._lock:
+            return self._tokens + (now - self._updated_at) * self._rate >= self._capacity
+
+
+class ApiCall:
+    _priority: int
+    _chat_id: Optional[int]
+    _idempotent: bool
+    _chat_limited: bool
+    _function: Callable
+    _future: Future
+
+    def __init__(self, priority: int, chat_id: Optional[int], idempotent: bool, chat_limited: bool,
+                 function: Callable, args: tuple, kwargs: dict):
+        self._priority = priority
+        self._chat_id = chat_id
+        self._idempotent = idempotent
+        self._chat_limited = chat_limited
+        self._function = function
+        self._args = args
+        self._kwargs = kwargs
+        self._future = Future()
+        self.attempt = 0
+
+    @property
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def chat_id(self) -> Optional[int]:
+        return self._chat_id
+
+    @property
+    def idempotent(self) -> bool:
+        return self._idempotent
+
+    @property
+    def chat_limited(self) -> bool:
+        return self._chat_limited
+
+    @property
+    def name(self) -> str:
+        return self._function.__name__
+
+    @property
+    def future(self) -> Future:
+        return self._future
+
+    def execute(self):
+        return self._function(*self._args, **self._kwargs)
+
+
+class OutboundDispatcher:
+    """
+    Central queue for outbound Bot API calls.
+
+    Calls are executed by a pool of workers in priority order, callback query answers and moderation first. Every call
+    takes a token from the global bucket, message sending calls also take one from the per-chat bucket. A call which
+    has to wait for a token or for `retry_after` is parked in the scheduler, so workers stay free for other chats.
+
+    A 429 blocks the chat of the call until `retry_after`, a call without a chat, like a callback query answer, blocks
+    only calls of its method. Full chat buckets and lapsed blocks are swept every SWEEP_INTERVAL_SECONDS, so private
+    chats of join request applicants do not pile up.
+    """
+    _queue: queue.PriorityQueue
+    _chat_buckets: Dict[int, TokenBucket]
+    _blocked_until: Dict[Union[int, str], float]
+    _logger: logging.Logger
+
+    def __init__(self, scheduler: TaskScheduler, metrics: Metrics, logger: logging.Logger):
+        self._scheduler = scheduler
+        self._metrics = metrics
+        self._logger = logger
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._global_bucket = TokenBucket(OutboundSettings.GLOBAL_RATE, OutboundSettings.GLOBAL_BURST)
+        self._chat_buckets = dict()
+        self._blocked_until = dict()
+        self._swept_at = time.monotonic()
+        self._lock = threading.Lock()
+
+        for number in range(OutboundSettings.WORKER_THREADS):
+            threading.Thread(target=self._run, name=f'outbound-worker-{number}', daemon=True).start()
+
+    def submit(self, call: ApiCall) -> Future:
+        self._enqueue(call, next(self._sequence))
+        return call.future
+
+    def _enqueue(self, call: ApiCall, sequence: int):
+        self._queue.put((call.priority, sequence, call))
+
+    def _defer(self, call: ApiCall, sequence: int, pause: float):
+        self._scheduler.schedule(pause, self._enqueue, (call, sequence), inline=True)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(OutboundSettings.CHAT_RATE, OutboundSettings.CHAT_BURST)
+                self._chat_buckets[chat_id] = bucket
+
+            return bucket
+
+    @staticmethod
+    def _block_key(call: ApiCall) -> Union[int, str]:
+        return call.name if call.chat_id is None else call.chat_id
+
+    def _sweep(self, now: float):
+        with self._lock:
+            if now - self._swept_at < OutboundSettings.SWEEP_INTERVAL_SECONDS:
+                return
+
+            self._swept_at = now
+            for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_full(now)]:
+                del self._chat_buckets[chat_id]
+            for key in [key for key, blocked_until in self._blocked_until.items() if blocked_until <= now]:
+                del self._blocked_until[key]
+
+    def _wait_time(self, call: ApiCall) -> float:
+        now = time.monotonic()
+        if now - self._swept_at >= OutboundSettings.SWEEP_INTERVAL_SECONDS:
+            self._sweep(now)
+
+        blocked = self._blocked_until.get(self._block_key(call), 0) - now
+        if blocked > 0:
+            return blocked
+
+        wait = self._global_bucket.try_acquire()
+        if wait > 0 or not call.chat_limited or call.chat_id is None:
+            return wait
+
+        return self._chat_bucket(call.chat_id).try_acquire()
+
+    def _run(self):
+        while True:
+            _, sequence, call = self._queue.get()
+
+            wait = self._wait_time(call)
+            if wait > 0:
+                self._defer(call, sequence, wait)
+                continue
+
+            started = time.perf_counter()
+            try:
+                result = call.execute()
+            except ApiException as e:
+                self._metrics.observe_api_call(call.name, time.perf_counter() - started)
+                self._handle_api_exception(call, sequence, e)
+            except RequestException as e:
+                self._metrics.observe_api_call(call.name, time.perf_counter() - started)
+                self._retry_or_fail(call, sequence, e)
+            except Exception as e:
+                call.future.set_exception(e)
+            else:
+                self._metrics.observe_api_call(call.name, time.perf_counter() - started)
+                call.future.set_result(result)
+
+    def _handle_api_exception(self, call: ApiCall, sequence: int, exception: ApiException):
+        status_code = getattr(exception.result, 'status_code', None)
+        self._metrics.count_api_error(call.name, status_code)
+
+        if status_code == 429 and call.attempt < OutboundSettings.MAX_RETRIES:
+            retry_after = self._retry_after(exception)
+            self._logger.warning(
+                'Flood limit hit by %s in chat %s, retry after %ss', call.name, call.chat_id, retry_after
+            )
+            with self._lock:
+                self._blocked_until[self._block_key(call)] = time.monotonic() + retry_after
+            call.attempt += 1
+            self._defer(call, sequence, retry_after)
+            return
+
+        if status_code is not None and status_code >= 500:
+            self._retry_or_fail(call, sequence, exception)
+            return
+
+        call.future.set_exception(exception)
+
+    def _retry_or_fail(self, call: ApiCall, sequence: int, exception: Exception):
+        if not call.idempotent or call.attempt >= OutboundSettings.MAX_RETRIES:
+            call.future.set_exception(exception)
+            return
+
+        pause = OutboundSettings.BACKOFF_SECONDS * 2 ** call.attempt
+        self._logger.warning('%s failed, retry #%s in %ss', call.name, call.attempt + 1, pause)
+        call.attempt += 1
+        self._defer(call, sequence, pause)
+
+    @staticmethod
+    def _retry_after(exception: ApiException) -> float:
+        try:
+            return float(exception.result.json()['parameters']['retry_after'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return OutboundSettings.BACKOFF_SECONDS
+
+
+class ExtendedTeleBot(TeleBot):
+    """
+    TeleBot with the Bot API methods telebot 3.6.6 lacks
+    """
+
+    def approve_chat_join_request(self, chat_id: int, user_id: int) -> bool:
+        return apihelper._make_request(self.token, 'approveChatJoinRequest', method='post', params={
+            'chat_id': chat_id,
+            'user_id': user_id,
+        })
+
+    def decline_chat_join_request(self, chat_id: int, user_id: int) -> bool:
+        return apihelper._make_request(self.token, 'declineChatJoinRequest', method='post', params={
+            'chat_id': chat_id,
+            'user_id': user_id,
+        })
+
+
+class ChatUpdate(Update):
+    """
+    Update with chat member and join request parts, unknown to telebot
+    """
+    chat_member_update: Optional[ChatMemberUpdateDto]
+    chat_join_request: Optional[ChatJoinRequestDto]
+
+    @classmethod
+    def de_json(cls, json_type) -> 'ChatUpdate':
+        update = super().de_json(json_type)
+        obj = cls.check_json(json_type)
+        for update_type in TelegramUpdateType.CHAT_MEMBER, TelegramUpdateType.MY_CHAT_MEMBER:
+            if update_type in obj:
+                update.chat_member_update = ChatMemberUpdateDto.from_dict(obj[update_type])
+        if TelegramUpdateType.CHAT_JOIN_REQUEST in obj:
+            update.chat_join_request = ChatJoinRequestDto.from_dict(obj[TelegramUpdateType.CHAT_JOIN_REQUEST])
+
+        return update
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.chat_member_update = None
+        self.chat_join_request = None
+
+
+class ThrottledTeleBot(ExtendedTeleBot):
+    """
+    TeleBot whose chat API calls go through OutboundDispatcher.
+
+    Public methods keep the TeleBot interface and block until the call is done, `submit` returns a Future and is
+    used to pipeline batches of calls. Updates are asked for with TelegramUpdateType.ALLOWED and dispatched one by one
+    in the order they were received, chat member and join request updates unknown to telebot included.
+    """
+    _CALLS = {
+        # method name: priority, chat_id positional index, idempotent, limited by per-chat bucket
+        'answer_callback_query': (ApiCallPriority.ACKNOWLEDGE, None, True, False),
+        'kick_chat_member': (ApiCallPriority.MODERATION, 0, True, False),
+        'unban_chat_member': (ApiCallPriority.MODERATION, 0, True, False),
+        'restrict_chat_member': (ApiCallPriority.MODERATION, 0, True, False),
+        'approve_chat_join_request': (ApiCallPriority.MODERATION, 0, True, False),
+        'decline_chat_join_request': (ApiCallPriority.MODERATION, 0, True, False),
+        'get_chat_member': (ApiCallPriority.QUERY, 0, True, False),
+        'get_chat_administrators': (ApiCallPriority.QUERY, 0, True, False),
+        'delete_message': (ApiCallPriority.COSMETIC, 0, True, False),
+        'edit_message_text': (ApiCallPriority.COSMETIC, None, True, True),
+        'send_message': (ApiCallPriority.COSMETIC, 0, False, True),
+    }
+
+    _dispatcher: Optional[OutboundDispatcher]
+    _chat_member_handlers: List[Callable[[ChatMemberUpdateDto], None]]
+    _chat_join_request_handlers: List[Callable[[ChatJoinRequestDto], None]]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dispatcher = None
+        self._chat_member_handlers = list()
+        self._chat_join_request_handlers = list()
+
+    def set_dispatcher(self, dispatcher: OutboundDispatcher):
+        self._dispatcher = dispatcher
+
+    @staticmethod
+    def share_http_session(pool_size: int):
+        """
+        Replace per-thread telebot sessions with one session, so polling and outbound workers of all chats
+        reuse connections from a single pool
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        apihelper._get_req_session = lambda reset=False: session
+
+    def add_chat_member_handler(self, handler: Callable[[ChatMemberUpdateDto], None]):
+        """
+        Handle chat_member and my_chat_member updates, handlers are called on the dispatching thread
+        """
+        self._chat_member_handlers.append(handler)
+
+    def add_chat_join_request_handler(self, handler: Callable[[ChatJoinRequestDto], None]):
+        """
+        Handle chat_join_request updates, handlers are called on the dispatching thread
+        """
+        self._chat_join_request_handlers.append(handler)
+
+    def get_updates(self, offset=None, limit=None, timeout=20, allowed_updates=None) -> List[Update]:
+        json_updates = apihelper.get_updates(
+            self.token,
+            offset,
+            limit,
+            timeout,
+            list(allowed_updates or TelegramUpdateType.ALLOWED),
+        )
+
+        return self.parse_updates(json_updates)
+
+    def parse_updates(self, json_updates: List[dict]) -> List[Update]:
+        """
+        Parse raw updates for process_new_updates, nothing is dispatched here
+        """
+        return [ChatUpdate.de_json(json_update) for json_update in json_updates]
+
+    def process_new_updates(self, updates: List[Update]):
+        """
+        Dispatch updates one by one in the order they were received
+
+        TeleBot groups a batch by update type, so a callback query or a chat member update would be handled after every
+        message of the batch, even the ones sent after it.
+        """
+        for update in updates:
+            super().process_new_updates([update])
+            if not isinstance(update, ChatUpdate):
+                continue
+
+            if update.chat_member_update is not None:
+                for handler in self._chat_member_handlers:
+                    handler(update.chat_member_update)
+            if update.chat_join_request is not None:
+                for handler in self._chat_join_request_handlers:
+                    handler(update.chat_join_request)
+
+    def delete_webhook(self, drop_pending_updates: bool = False):
+        """
+        Switch the bot to getUpdates, updates received while the bot was down can be dropped in the same request
+        """
+        return apihelper._make_request(self.token, 'deleteWebhook', method='post', params={
+            'drop_pending_updates': drop_pending_updates,
+        })
+
+    def submit(self, method_name: str, *args, **kwargs) -> Future:
+        priority, chat_position, idempotent, chat_limited = self._CALLS[method_name]
+        chat_id = kwargs.get('chat_id')
+        if chat_id is None and chat_position is not None and len(args) > chat_position:
+            chat_id = args[chat_position]
+
+        function = getattr(super(), method_name)
+        call = ApiCall(priority, chat_id, idempotent, chat_limited, function, args, kwargs)
+        if self._dispatcher is None:
+            call.future.set_result(call.execute())
+            return call.future
+
+        return self._dispatcher.submit(call)
+
+    def answer_callback_query(self, *args, **kwargs):
+        return self.submit('answer_callback_query', *args, **kwargs).result()
+
+    def kick_chat_member(self, *args, **kwargs):
+        return self.submit('kick_chat_member', *args, **kwargs).result()
+
+    def unban_chat_member(self, *args, **kwargs):
+        return self.submit('unban_chat_member', *args, **kwargs).result()
+
+    def restrict_chat_member(self, *args, **kwargs):
+        return self.submit('restrict_chat_member', *args, **kwargs).result()
+
+    def approve_chat_join_request(self, *args, **kwargs):
+        return self.submit('approve_chat_join_request', *args, **kwargs).result()
+
+    def decline_chat_join_request(self, *args, **kwargs):
+        return self.submit('decline_chat_join_request', *args, **kwargs).result()
+
+    def get_chat_member(self, *args, **kwargs):
+        return self.submit('get_chat_member', *args, **kwargs).result()
+
+    def get_chat_administrators(self, *args, **kwargs):
+        return self.submit('get_chat_administrators', *args, **kwargs).result()
+
+    def delete_message(self, *args, **kwargs):
+        return self.submit('delete_message', *args, **kwargs).result()
+
+    def edit_message_text(self, *args, **kwargs):
+        return self.submit('edit_message_text', *args, **kwargs).result()
+
+    def send_message(self, *args, **kwargs):
+        return self.submit('send_message', *args, **kwargs).result()
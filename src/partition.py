@@ -0,0 +1,214 @@
+import functools
+import logging
+from typing import Dict, Callable, Optional, Iterator
+
+from telebot.types import Message, CallbackQuery
+
+from admin import AdminCache
+from audit import AuditLog
+from chat_settings import ChatSettingsLoader
+from const import TelegramChatType
+from database import StateDatabase
+from dto import ChatMemberUpdateDto, ChatJoinRequestDto, ChatSettingsDto
+from duplicate import DuplicateDetector
+from executor import KeyedExecutor
+from flood import FloodDetector
+from greeting import NewbieStorage
+from member import ChatMemberMirror
+from notification import Notification
+from outbound import ThrottledTeleBot
+from raid import RaidDetector, JoinBatcher
+from restriction import RestrictionStorage
+from scheduler import TaskScheduler
+from utils import BotUtils
+
+
+class ChatPartition:
+    """
+    State and worker lane of one served chat.
+
+    Handlers of a chat are run one by one in update order, keyed by chat id in the shared executor, so a busy chat
+    does not hold up the others and a command is never handled before the one sent ahead of it.
+    """
+    _chat_id: int
+    _settings: ChatSettingsDto
+    _newbie_storage: NewbieStorage
+    _restriction_storage: RestrictionStorage
+    _admin_cache: AdminCache
+    _member_mirror: ChatMemberMirror
+    _methods: BotUtils
+    _raid_detector: RaidDetector
+    _join_batcher: JoinBatcher
+    _flood_detector: FloodDetector
+    _duplicate_detector: DuplicateDetector
+    _executor: KeyedExecutor
+    _logger: logging.Logger
+
+    def __init__(
+            self,
+            chat_id: int,
+            bot: ThrottledTeleBot,
+            scheduler: TaskScheduler,
+            executor: KeyedExecutor,
+            database: Optional[StateDatabase],
+            audit_log: Optional[AuditLog],
+            settings: Optional[ChatSettingsDto],
+            logger: logging.Logger,
+    ):
+        self._chat_id = chat_id
+        self._settings = settings or ChatSettingsLoader.default()
+        self._newbie_storage = NewbieStorage(chat_id, logger, database)
+        self._restriction_storage = RestrictionStorage(chat_id, logger, database)
+        self._admin_cache = AdminCache(bot, scheduler, logger)
+        self._member_mirror = ChatMemberMirror(chat_id, bot, logger)
+        self._methods = BotUtils(
+            bot,
+            chat_id,
+            Notification(self._settings.templates),
+            self._settings,
+            self._newbie_storage,
+            self._restriction_storage,
+            scheduler,
+            self._admin_cache,
+            self._member_mirror,
+            audit_log,
+            logger,
+        )
+        self._raid_detector = RaidDetector(logger)
+        self._join_batcher = JoinBatcher(bot, self._methods, self._newbie_storage, scheduler, logger)
+        self._flood_detector = FloodDetector()
+        self._duplicate_detector = DuplicateDetector()
+        self._executor = executor
+        self._logger = logger
+
+    @property
+    def chat_id(self) -> int:
+        return self._chat_id
+
+    @property
+    def settings(self) -> ChatSettingsDto:
+        return self._settings
+
+    @property
+    def newbie_storage(self) -> NewbieStorage:
+        return self._newbie_storage
+
+    @property
+    def restriction_storage(self) -> RestrictionStorage:
+        return self._restriction_storage
+
+    @property
+    def admin_cache(self) -> AdminCache:
+        return self._admin_cache
+
+    @property
+    def member_mirror(self) -> ChatMemberMirror:
+        return self._member_mirror
+
+    @property
+    def methods(self) -> BotUtils:
+        return self._methods
+
+    @property
+    def raid_detector(self) -> RaidDetector:
+        return self._raid_detector
+
+    @property
+    def join_batcher(self) -> JoinBatcher:
+        return self._join_batcher
+
+    @property
+    def flood_detector(self) -> FloodDetector:
+        return self._flood_detector
+
+    @property
+    def duplicate_detector(self) -> DuplicateDetector:
+        return self._duplicate_detector
+
+    @property
+    def queue_depth(self) -> int:
+        return self._executor.queue_depth(self._chat_id)
+
+    def submit(self, handler: Callable, update):
+        self._executor.submit(self._chat_id, self._run, handler, update)
+
+    def _run(self, handler: Callable, update):
+        try:
+            handler(self, update)
+        except Exception:
+            self._logger.exception('Handler %s failed in chat %s', handler.__name__, self._chat_id)
+
+
+class ChatPartitionMap:
+    """
+    Served chats keyed by chat id
+    """
+    _partitions: Dict[int, ChatPartition]
+    _handled_listener: Optional[Callable[[], None]]
+
+    def __init__(self):
+        self._partitions = dict()
+        self._handled_listener = None
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._partitions
+
+    def __iter__(self) -> Iterator[ChatPartition]:
+        return iter(list(self._partitions.values()))
+
+    def __len__(self) -> int:
+        return len(self._partitions)
+
+    def add(self, partition: ChatPartition):
+        self._partitions[partition.chat_id] = partition
+
+    def get(self, chat_id: int) -> Optional[ChatPartition]:
+        return self._partitions.get(chat_id)
+
+    def set_handled_listener(self, listener: Optional[Callable[[], None]]):
+        """
+        Set a callback run in the lane after every handled update, None removes it
+        """
+        self._handled_listener = listener
+
+    def lane(self, handler: Callable):
+        """
+        Handler decorator, passes an update of a served chat to its partition lane
+
+        The decorated handler is called with the partition and the update.
+        """
+
+        @functools.wraps(handler)
+        def handled(partition: ChatPartition, update):
+            try:
+                handler(partition, update)
+            finally:
+                listener = self._handled_listener
+                if listener is not None:
+                    listener()
+
+        @functools.wraps(handler)
+        def wrapper(update):
+            partition = self._find(update)
+            if partition is not None:
+                partition.submit(handled, update)
+
+        return wrapper
+
+    def _find(self, update) -> Optional[ChatPartition]:
+        if isinstance(update, (ChatMemberUpdateDto, ChatJoinRequestDto)):
+            return self._partitions.get(update.chat_id)
+
+        message = update.message if isinstance(update, CallbackQuery) else update
+        if not isinstance(message, Message):
+            return None
+
+        if isinstance(update, CallbackQuery) and message.chat.type == TelegramChatType.PRIVATE:
+            # a captcha of a join request is answered in private chat, it belongs to the chat the user waits for
+            for partition in self._partitions.values():
+                if update.from_user.id in partition.newbie_storage:
+                    return partition
+
+            return None
+
+        return self._partitions.get(message.chat.id)
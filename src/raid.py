@@ -0,0 +1,183 @@
+import collections
+import logging
+import threading
+from typing import Deque, List, Tuple, Optional
+
+from telebot.apihelper import ApiException
+from telebot.types import User, Message
+
+from const import RaidSettings, TelegramParseMode, CallbackSettings
+from dto import MessageRefDto
+from error import UserNotFoundInStorageError, UserStorageUpdateError
+from greeting import NewbieStorage
+from outbound import ThrottledTeleBot
+from scheduler import TaskScheduler, ScheduledTask
+from utils import BotUtils
+
+
+class RaidDetector:
+    """
+    Sliding window join rate detector.
+
+    Burst mode is turned on when the number of joins within the window reaches ENTER_THRESHOLD and is turned off
+    once it drops below EXIT_THRESHOLD.
+    """
+    _joins: Deque[float]
+    _logger: logging.Logger
+
+    def __init__(self, logger: logging.Logger):
+        self._joins = collections.deque()
+        self._burst = False
+        self._lock = threading.Lock()
+        self._logger = logger
+
+    @property
+    def burst(self) -> bool:
+        return self._burst
+
+    def register_joins(self, count: int, now: float) -> bool:
+        with self._lock:
+            self._joins.extend([now] * count)
+            window_start = now - RaidSettings.WINDOW_SECONDS
+            while self._joins and self._joins[0] < window_start:
+                self._joins.popleft()
+
+            rate = len(self._joins)
+            if not self._burst and rate >= RaidSettings.ENTER_THRESHOLD:
+                self._burst = True
+                self._logger.warning(
+                    'Raid detected: %s joins in %ss, burst mode on', rate, RaidSettings.WINDOW_SECONDS
+                )
+            elif self._burst and rate < RaidSettings.EXIT_THRESHOLD:
+                self._burst = False
+                self._logger.warning(
+                    'Join rate dropped to %s in %ss, burst mode off', rate, RaidSettings.WINDOW_SECONDS
+                )
+
+            return self._burst
+
+
+class JoinBatcher:
+    """
+    Groups newbies joined in burst mode into batches.
+
+    A batch is flushed BATCH_WINDOW_SECONDS after its first join or once it is full: restrictions are pipelined
+    through the outbound dispatcher, all newbies get one common greeting and one common timeout kick timer.
+    """
+    _batch: List[Tuple[User, Message]]
+    _timer: Optional[ScheduledTask]
+    _logger: logging.Logger
+
+    def __init__(
+            self,
+            bot: ThrottledTeleBot,
+            methods: BotUtils,
+            newbie_storage: NewbieStorage,
+            scheduler: TaskScheduler,
+            logger: logging.Logger,
+    ):
+        self._bot = bot
+        self._methods = methods
+        self._newbie_storage = newbie_storage
+        self._scheduler = scheduler
+        self._batch = list()
+        self._timer = None
+        self._lock = threading.Lock()
+        self._logger = logger
+
+    def add(self, user: User, message: Message):
+        with self._lock:
+            self._batch.append((user, message))
+            full = len(self._batch) >= RaidSettings.MAX_BATCH_SIZE
+            if not full and self._timer is None:
+                self._timer = self._scheduler.schedule(RaidSettings.BATCH_WINDOW_SECONDS, self.flush)
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch = self._batch
+            self._batch = list()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if batch:
+            self._greet(batch)
+
+    def _greet(self, batch: List[Tuple[User, Message]]):
+        batch = [(user, message) for user, message in batch if user.id in self._newbie_storage]
+        if not batch:
+            return
+
+        chat_id = batch[0][1].chat.id
+        question = self._newbie_storage.get(batch[0][0]).question
+        self._logger.info('Greeting batch of %s newbies in chat %s', len(batch), chat_id)
+
+        pending = [
+            (user, message, self._bot.submit(
+                'restrict_chat_member',
+                chat_id=chat_id,
+                user_id=user.id,
+                until_date=message.date + question.timeout * 2,
+            ))
+            for user, message in batch
+        ]
+
+        restricted = list()
+        for user, message, future in pending:
+            try:
+                future.result()
+                restricted.append((user, message))
+            except ApiException:
+                self._logger.error('Can not restrict chat member @%s', user.username)
+                self._newbie_storage.remove(user)
+
+        if not restricted:
+            return
+
+        try:
+            greeting_message = self._bot.send_message(
+                chat_id=chat_id,
+                text=question.text.format(mention=', '.join(self._methods.mention(user) for user, _ in restricted)),
+                # one greeting is answered by every newbie of the batch
+                reply_markup=question.keyboard(CallbackSettings.ANY_USER),
+                reply_to_message_id=restricted[-1][1].message_id,
+                parse_mode=TelegramParseMode.MARKDOWN,
+            )
+        except ApiException:
+            self._logger.error('Can not send greeting for batch of %s newbies', len(restricted))
+            self._release(chat_id, [user for user, _ in restricted])
+            return
+
+        greeting_ref = MessageRefDto.from_message(greeting_message)
+        newbies = list()
+        for user, _ in restricted:
+            try:
+                self._newbie_storage.update(user=user, greeting=greeting_ref)
+                newbies.append(self._newbie_storage.get(user))
+            except (UserStorageUpdateError, UserNotFoundInStorageError):
+                pass
+
+        self._methods.create_scheduled_threat(question.timeout, self._methods.timeout_kick_batch, (newbies,))
+
+    def _release(self, chat_id: int, users: List[User]):
+        """
+        Lift restrictions of newbies whose greeting can not be sent, nobody could answer it
+        """
+        pending = list()
+        for user in users:
+            self._newbie_storage.remove(user)
+            pending.append((user, self._bot.submit(
+                'restrict_chat_member',
+                chat_id=chat_id,
+                user_id=user.id,
+                can_send_messages=True,
+            )))
+
+        for user, future in pending:
+            try:
+                future.result()
+            except ApiException:
+                self._logger.error('Can not lift restriction of chat member @%s', user.username)
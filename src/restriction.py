@@ -1,26 +1,112 @@
+import heapq
 import logging
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
 
 from telebot.types import User
 
+from const import RestrictionSettings
+from database import StateDatabase
 from dto import RestrictedUserDto
 from error import UserNotFoundInStorageError
 
 
 class RestrictionStorage:
+    """
+    Restrictions waiting to be restored, keyed by user id.
+
+    An entry is removed once its restriction is restored. Entries which were never restored (e.g. restriction was
+    shorter than the previous one) expire EXPIRY_GRACE_SECONDS after their restore time, or after they were loaded
+    from database if that is later, so restores missed while the bot was down still run. Expired entries are evicted
+    using min-heap by expiry time whenever the storage is read or added to.
+    """
     _storage: Dict[Any, RestrictedUserDto]
+    _expiry: List[Tuple[int, int, int]]
+    _database: Optional[StateDatabase]
 
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, chat_id: int, logger: logging.Logger, database: StateDatabase = None):
+        self._chat_id = chat_id
         self._storage = dict()
+        self._expiry = list()
+        self._evicted = 0
+        self._database = database
+        self._lock = threading.Lock()
         self._logger = logger
 
+        if database is not None:
+            self._restore()
+
+    def __iter__(self):
+        with self._lock:
+            self._evict_expired(time.time())
+            return iter(list(self._storage.values()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired(time.time())
+            return len(self._storage)
+
+    @property
+    def evicted(self) -> int:
+        return self._evicted
+
+    def _restore(self):
+        now = time.time()
+        for restricted in self._database.load_restrictions(self._chat_id):
+            self._put(restricted, now)
+        self._logger.info('%s restricted users of chat %s restored from database', len(self._storage), self._chat_id)
+
     def add(self, restricted: RestrictedUserDto):
-        self._logger.debug(f'Trying to add user @{restricted.user.username} into restricted users list')
-        self._storage.update({restricted.user.id: restricted})
+        self._logger.debug('Trying to add user @%s into restricted users list', restricted.user.username)
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            self._put(restricted, now)
+        if self._database is not None:
+            self._database.save_restriction(restricted)
+
+    def remove(self, restricted: RestrictedUserDto):
+        """
+        Remove restriction entry unless it was replaced with a newer one
+        """
+        with self._lock:
+            removed = self._remove(restricted.user.id, restricted.restore_at)
+        if removed and self._database is not None:
+            self._database.delete_restriction(self._chat_id, restricted.user.id)
 
     def get(self, user: User) -> RestrictedUserDto:
         try:
-            return self._storage[user.id]
+            with self._lock:
+                self._evict_expired(time.time())
+                return self._storage[user.id]
         except KeyError:
-            self._logger.error(f'Can not get! User @{user.username} not found in restricted users list.')
+            self._logger.error('Can not get! User @%s not found in restricted users list.', user.username)
             raise UserNotFoundInStorageError()
+
+    def _put(self, restricted: RestrictedUserDto, now: float):
+        self._storage[restricted.user.id] = restricted
+        heapq.heappush(self._expiry, (
+            max(restricted.restore_at, int(now)) + RestrictionSettings.EXPIRY_GRACE_SECONDS,
+            restricted.user.id,
+            restricted.restore_at,
+        ))
+
+    def _remove(self, user_id: int, restore_at: int) -> bool:
+        current = self._storage.get(user_id)
+        if current is None or current.restore_at != restore_at:
+            return False
+
+        del self._storage[user_id]
+        return True
+
+    def _evict_expired(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, user_id, restore_at = heapq.heappop(self._expiry)
+            if not self._remove(user_id, restore_at):
+                continue
+
+            self._evicted += 1
+            if self._database is not None:
+                self._database.delete_restriction(self._chat_id, user_id)
+            self._logger.debug('Expired restriction of user %s evicted, %s left', user_id, len(self._storage))
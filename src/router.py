@@ -0,0 +1,143 @@
+import logging
+from typing import Dict, Callable, Set, Container, Union, Optional
+
+from telebot import TeleBot
+from telebot.apihelper import ApiException
+from telebot.types import Message, CallbackQuery
+
+from const import TelegramChatType, CallbackSettings
+from dto import CallbackDataDto
+from outbound import ThrottledTeleBot
+
+
+class CommandRouter:
+    """
+    Single entry point for text messages.
+
+    Chat id and chat type are checked once, then the first word is looked up among registered commands.
+    Messages which do not start with a command prefix leave right after the first character check. A command
+    addressed as `/command@username` is routed only when the username is the bot's own, it is asked once on the
+    first addressed command. Commands registered as exact take no arguments and match only the whole text.
+    """
+    _handlers: Dict[str, Callable]
+    _exact: Set[str]
+    _prefixes: Set[str]
+    _username: Optional[str]
+    _logger: logging.Logger
+
+    def __init__(self, chat_ids: Container[int], bot: TeleBot, logger: logging.Logger):
+        self._chat_ids = chat_ids
+        self._bot = bot
+        self._handlers = dict()
+        self._exact = set()
+        self._prefixes = set()
+        self._username = None
+        self._logger = logger
+
+    def command(self, *commands: str, exact: bool = False):
+        def decorator(handler: Callable):
+            for command in commands:
+                self._handlers[command] = handler
+                self._prefixes.add(command[0])
+                if exact:
+                    self._exact.add(command)
+
+            return handler
+
+        return decorator
+
+    def route(self, message: Message):
+        text = message.text
+        if not text or text[0] not in self._prefixes:
+            return
+
+        chat = message.chat
+        if chat.id not in self._chat_ids or chat.type != TelegramChatType.SUPER_GROUP:
+            return
+
+        words = text.split(None, 1)
+        command = words[0]
+        if '@' in command:
+            command, username = command.split('@', 1)
+            if username.lower() != self._bot_username():
+                return
+        handler = self._handlers.get(command)
+        if handler is None or len(words) > 1 and command in self._exact:
+            return
+
+        return handler(message)
+
+    def _bot_username(self) -> Optional[str]:
+        # only the receiving thread routes, no lock is needed
+        if self._username is None:
+            try:
+                self._username = self._bot.get_me().username.lower()
+            except ApiException:
+                self._logger.error('Can not get bot username, addressed commands are ignored')
+
+        return self._username
+
+
+class CallbackRouter:
+    """
+    Single entry point for callback queries.
+
+    callback_data is `<namespace>:<user_id>:<payload>`, the handler is looked up by namespace. Data without a
+    separator comes from keyboards sent before namespaces and goes to DEFAULT_NAMESPACE. Every query is answered
+    right away, so the client stops its spinner before any slow work is done. A click on a keyboard sent to another
+    user is answered with a notice and dropped before any storage is touched.
+    """
+    _handlers: Dict[str, Callable]
+    _logger: logging.Logger
+
+    def __init__(self, bot: ThrottledTeleBot, logger: logging.Logger):
+        self._bot = bot
+        self._handlers = dict()
+        self._logger = logger
+
+    @staticmethod
+    def encode(namespace: str, user_id: Union[int, str], payload: str) -> str:
+        return f'{namespace}{CallbackSettings.SEPARATOR}{user_id}{CallbackSettings.SEPARATOR}{payload}'
+
+    @staticmethod
+    def decode(data: str) -> CallbackDataDto:
+        """
+        Decode callback_data, raises ValueError if it is malformed
+        """
+        parts = data.split(CallbackSettings.SEPARATOR, 2)
+        if len(parts) == 1:
+            return CallbackDataDto(CallbackSettings.DEFAULT_NAMESPACE, CallbackSettings.ANY_USER, data)
+
+        namespace, user_id, payload = parts
+        return CallbackDataDto(namespace, int(user_id), payload)
+
+    def namespace(self, namespace: str):
+        def decorator(handler: Callable):
+            self._handlers[namespace] = handler
+
+            return handler
+
+        return decorator
+
+    def route(self, call: CallbackQuery):
+        try:
+            data = self.decode(call.data) if call.data else None
+        except ValueError:
+            data = None
+        handler = None if data is None else self._handlers.get(data.namespace)
+        if handler is None:
+            self._logger.debug('Unknown callback data from %s: %s', call.from_user.id, call.data)
+            self._answer(call)
+            return
+
+        if data.user_id != CallbackSettings.ANY_USER and data.user_id != call.from_user.id:
+            self._answer(call, CallbackSettings.FOREIGN_CLICK_TEXT)
+            return
+
+        self._answer(call)
+
+        return handler(call)
+
+    def _answer(self, call: CallbackQuery, text: str = None):
+        # not waited for, the answer is sent by outbound workers ahead of other calls
+        self._bot.submit('answer_callback_query', call.id, text=text)
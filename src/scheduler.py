@@ -0,0 +1,166 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Callable
+
+from const import SchedulerSettings
+from dto import SchedulerStatsDto
+
+
+class ScheduledTask:
+    PENDING = 'pending'
+    CANCELLED = 'cancelled'
+    STARTED = 'started'
+
+    _due: float
+    _action: Callable
+    _args: tuple
+    _inline: bool
+    _state: str
+
+    def __init__(self, scheduler: 'TaskScheduler', due: float, action: Callable, args: tuple, inline: bool):
+        self._scheduler = scheduler
+        self._due = due
+        self._action = action
+        self._args = args
+        self._inline = inline
+        self._state = self.PENDING
+
+    @property
+    def due(self) -> float:
+        return self._due
+
+    @property
+    def action(self) -> Callable:
+        return self._action
+
+    @property
+    def args(self) -> tuple:
+        return self._args
+
+    @property
+    def inline(self) -> bool:
+        return self._inline
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, state: str):
+        self._state = state
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+
+class TaskScheduler:
+    """
+    Single-threaded timer queue backed by a min-heap.
+
+    The scheduler thread only sleeps until the nearest deadline; due actions are handed over to a small worker pool,
+    so a slow Bot API call can not delay the other timers. Cancelled tasks stay in the heap and are dropped when
+    popped, the heap is compacted once they make up a noticeable part of it.
+
+    Inline tasks are run by the scheduler thread itself. Use them only for short non-blocking actions, e.g. putting
+    something back into a queue, which must not wait for a free worker.
+    """
+    _heap: List[Tuple[float, int, ScheduledTask]]
+    _logger: logging.Logger
+
+    def __init__(self, logger: logging.Logger):
+        self._heap = list()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=SchedulerSettings.WORKER_THREADS,
+            thread_name_prefix='scheduler-worker',
+        )
+        self._logger = logger
+
+        self._cancelled_in_queue = 0
+        self._executed = 0
+        self._cancelled = 0
+        self._total_lateness = 0.0
+        self._max_lateness = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def schedule(self, pause: float, action: Callable, args: tuple = (), inline: bool = False) -> ScheduledTask:
+        task = ScheduledTask(
+            scheduler=self,
+            due=time.time() + max(pause, 0),
+            action=action,
+            args=args,
+            inline=inline,
+        )
+        with self._condition:
+            heapq.heappush(self._heap, (task.due, next(self._sequence), task))
+            if self._heap[0][2] is task:
+                self._condition.notify()
+
+        return task
+
+    def cancel(self, task: ScheduledTask):
+        with self._condition:
+            if task.state != ScheduledTask.PENDING:
+                return
+
+            task.state = ScheduledTask.CANCELLED
+            self._cancelled += 1
+            self._cancelled_in_queue += 1
+            if self._cancelled_in_queue > len(self._heap) * SchedulerSettings.COMPACT_RATIO:
+                self._compact()
+
+    def stats(self) -> SchedulerStatsDto:
+        with self._condition:
+            return SchedulerStatsDto(
+                queue_depth=len(self._heap) - self._cancelled_in_queue,
+                executed=self._executed,
+                cancelled=self._cancelled,
+                max_lateness=self._max_lateness,
+                avg_lateness=self._total_lateness / self._executed if self._executed else 0.0,
+            )
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[2].state == ScheduledTask.PENDING]
+        heapq.heapify(self._heap)
+        self._cancelled_in_queue = 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+
+                due, _, task = self._heap[0]
+                now = time.time()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                if task.state == ScheduledTask.CANCELLED:
+                    self._cancelled_in_queue -= 1
+                    continue
+
+                task.state = ScheduledTask.STARTED
+                lateness = now - due
+                self._executed += 1
+                self._total_lateness += lateness
+                self._max_lateness = max(self._max_lateness, lateness)
+
+            if task.inline:
+                self._execute(task)
+            else:
+                self._executor.submit(self._execute, task)
+
+    def _execute(self, task: ScheduledTask):
+        try:
+            task.action(*task.args)
+        except Exception:
+            self._logger.exception('Scheduled task %s failed', task.action.__name__)
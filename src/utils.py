@@ -1,26 +1,37 @@
 import logging
-import threading
 import time
+from typing import List, Tuple, Optional, Set
 
 from telebot import TeleBot
 from telebot.apihelper import ApiException
-from telebot.types import User, Message
-
-from const import RestrictDuration, TelegramParseMode, ChatCommand, BanDuration, TelegramChatType, PunishmentDuration, \
-    BaseDuration
-from dto import DurationDto, PluralFormsDto, RestrictedUserDto, NewbieDto, RestrictionDto
-from error import ParseBanDurationError, InvalidConditionError, UserNotFoundInStorageError
+from telebot.types import User, Message, ChatMember
+
+from admin import AdminCache
+from audit import AuditLog
+from const import RestrictDuration, TelegramParseMode, ChatCommand, BanDuration, PunishmentDuration, \
+    BaseDuration, TelegramApiError, AuditCommand, DuplicateSettings
+from dto import DurationDto, PluralFormsDto, RestrictedUserDto, NewbieDto, RestrictionDto, UserDto, MessageRefDto, \
+    AuditEntryDto, ChatSettingsDto
+from duration import parse_duration, get_plural
+from error import InvalidConditionError, UserNotFoundInStorageError
 from greeting import NewbieStorage
+from member import ChatMemberMirror
 from notification import Notification
 from restriction import RestrictionStorage
+from scheduler import TaskScheduler, ScheduledTask
 
 
 class BotUtils:
     _bot: TeleBot
     _chat_id: int
     _notification: Notification
+    _settings: ChatSettingsDto
     _newbie_storage: NewbieStorage
     _restriction_storage: RestrictionStorage
+    _scheduler: TaskScheduler
+    _admin_cache: AdminCache
+    _member_mirror: ChatMemberMirror
+    _audit_log: Optional[AuditLog]
     _logger: logging.Logger
 
     def __init__(
@@ -28,21 +39,35 @@ class BotUtils:
             bot: TeleBot,
             chat_id: str,
             notification: Notification,
+            settings: ChatSettingsDto,
             newbie_storage: NewbieStorage,
             restriction_storage: RestrictionStorage,
+            scheduler: TaskScheduler,
+            admin_cache: AdminCache,
+            member_mirror: ChatMemberMirror,
+            audit_log: Optional[AuditLog],
             logger: logging.Logger,
     ):
         self._bot = bot
         self._chat_id = int(chat_id)
         self._notification = notification
+        self._settings = settings
         self._newbie_storage = newbie_storage
         self._restriction_storage = restriction_storage
+        self._scheduler = scheduler
+        self._admin_cache = admin_cache
+        self._member_mirror = member_mirror
+        self._audit_log = audit_log
         self._logger = logger
 
     @property
     def chat_id(self) -> int:
         return self._chat_id
 
+    @property
+    def settings(self) -> ChatSettingsDto:
+        return self._settings
+
     @staticmethod
     def prepare_query(text: str) -> str:
         """
@@ -52,71 +77,44 @@ class BotUtils:
         """
         return ' '.join(text.split()[1:])
 
-    def get_duration(self, text: str, duration_class: BaseDuration) -> DurationDto:
-        if text == '':
-            return self.get_duration(f'{duration_class.DEFAULT_DURATION}{duration_class.DEFAULT_UNIT}', duration_class)
-
-        try:
-            amount = int(text)
-            return self.get_duration(f'{amount}{duration_class.DEFAULT_UNIT}', duration_class)
-        except ValueError:
-            pass
-
-        try:
-            amount = int(text[:-1])
-            unit = duration_class.UNITS[text[-1]]
-
-            duration_seconds = int(amount * unit['rate'])
-
-            if duration_seconds < duration_class.MIN_DURATION.seconds:
-                return duration_class.MIN_DURATION
-
-            if duration_seconds > duration_class.MAX_DURATION.seconds:
-                return duration_class.MAX_DURATION
-
-            duration_unit = self.get_plural(amount, unit['plural_forms'])
-
-            return DurationDto(
-                seconds=duration_seconds,
-                text=f'{amount} {duration_unit}',
-            )
-        except (ValueError, KeyError, IndexError):
-            raise ParseBanDurationError
+    @staticmethod
+    def get_duration(text: str, duration_class: BaseDuration) -> DurationDto:
+        return parse_duration(text, type(duration_class))
 
     @staticmethod
     def get_plural(amount: int, plural_forms: PluralFormsDto) -> str:
-        if amount % 10 == 1 and amount % 100 != 11:
-            return plural_forms.form_1
-
-        if 2 <= amount % 10 <= 4 and (amount % 100 < 10 or amount % 100 >= 20):
-            return plural_forms.form_2
-
-        return plural_forms.form_3
+        return get_plural(amount, plural_forms)
 
     @staticmethod
     def mention(user: User):
         return f'[{user.first_name}](tg://user?id={user.id})'
 
     def delete_chat_message(self, message: Message):
+        self.delete_message(message.chat.id, message.message_id)
+
+    def delete_message(self, chat_id: int, message_id: int):
         try:
-            self._bot.delete_message(message.chat.id, message.message_id)
+            self._bot.delete_message(chat_id, message_id)
         except ApiException:
-            self._logger.error(f'Can not delete chat message {message}')
+            self._logger.error('Can not delete chat message %s in chat %s', message_id, chat_id)
 
-    def remove_inline_keyboard(self, message: Message):
+    def remove_inline_keyboard(self, message: MessageRefDto):
         try:
-            self._logger.debug(f'Trying to edit {message}')
+            self._logger.debug('Trying to edit message %s in chat %s', message.message_id, message.chat_id)
             self._bot.edit_message_text(
                 message.html_text,
-                chat_id=message.chat.id,
+                chat_id=message.chat_id,
                 message_id=message.message_id,
                 parse_mode=TelegramParseMode.HTML,
             )
         except ApiException:
-            self._logger.error(f'Can not edit chat message {message}')
+            self._logger.error('Can not edit chat message %s in chat %s', message.message_id, message.chat_id)
+
+    def get_chat_member(self, user_id: int) -> ChatMember:
+        return self._member_mirror.get(user_id)
 
     def check_current_restrictions(self, user: User, message: Message, duration: DurationDto, command: str):
-        chat_member = self._bot.get_chat_member(message.chat.id, user.id)
+        chat_member = self._member_mirror.get(user.id)
 
         restriction_list = {
             ChatCommand.RO: RestrictionDto(
@@ -134,7 +132,7 @@ class BotUtils:
         }
 
         restricted_user = RestrictedUserDto(
-            user=user,
+            user=UserDto.from_user(user),
             chat_id=message.chat.id,
             until_date=0 if chat_member.until_date is None else chat_member.until_date,
             restriction=restriction_list.get(command, RestrictionDto(True, True, True, True)),
@@ -142,10 +140,50 @@ class BotUtils:
         )
 
         self._restriction_storage.add(restricted_user)
-        if not restricted_user.until_date or restricted_user.until_date > message.date + duration.seconds:
-            self.create_scheduled_threat(duration.seconds, self.restore_restriction, (restricted_user,))
+        self.schedule_restore_restriction(restricted_user, pause=duration.seconds)
+
+    def schedule_restore_restriction(self, restricted: RestrictedUserDto, pause: int):
+        if not restricted.until_date or restricted.until_date > restricted.restore_at:
+            self.create_scheduled_threat(pause, self.restore_restriction, (restricted,))
+
+    def restore_scheduled_tasks(self):
+        """
+        Rebuild timers for storages restored from database, overdue tasks are run right away
+        """
+        now = time.time()
+        batches = dict()
+        for newbie in list(self._newbie_storage):
+            if newbie.greeting is None:
+                self._newbie_storage.remove(newbie.user)
+                continue
 
-    def set_read_only(self, user: User, message: Message, duration: DurationDto) -> str:
+            batches.setdefault((newbie.greeting.chat_id, newbie.greeting.message_id), list()).append(newbie)
+
+        for newbies in batches.values():
+            if self.is_join_request(newbies[0]):
+                timer = self.create_scheduled_threat(newbies[0].timeout - now, self.timeout_decline, (newbies[0],))
+                self._newbie_storage.set_timer(newbies[0].user, timer)
+                continue
+
+            if len(newbies) > 1:
+                self.create_scheduled_threat(newbies[0].timeout - now, self.timeout_kick_batch, (newbies,))
+                continue
+
+            newbie = newbies[0]
+            timer = self.create_scheduled_threat(newbie.timeout - now, self.timeout_kick, (newbie,))
+            self._newbie_storage.set_timer(newbie.user, timer)
+
+        for restricted in self._restriction_storage:
+            self.schedule_restore_restriction(restricted, pause=restricted.restore_at - now)
+
+    def set_read_only(
+            self,
+            user: User,
+            message: Message,
+            duration: DurationDto,
+            actor: User = None,
+            command: str = ChatCommand.RO,
+    ) -> str:
         self.check_current_restrictions(
             user=user,
             message=message,
@@ -159,6 +197,8 @@ class BotUtils:
             until_date=message.date + duration.seconds,
             can_send_messages=False,
         )
+        self._member_mirror.invalidate(user.id)
+        self.audit(command=command, user=user, actor=actor, duration=duration)
         restriction_text = self._notification.read_only(
             first_name=user.first_name,
             duration_text=duration.text,
@@ -166,7 +206,7 @@ class BotUtils:
 
         return restriction_text
 
-    def set_text_only(self, user: User, message: Message, duration: DurationDto) -> str:
+    def set_text_only(self, user: User, message: Message, duration: DurationDto, actor: User = None) -> str:
         self.check_current_restrictions(
             user=user,
             message=message,
@@ -181,6 +221,8 @@ class BotUtils:
             can_send_messages=True,
             can_send_media_messages=False,
         )
+        self._member_mirror.invalidate(user.id)
+        self.audit(command=ChatCommand.TO, user=user, actor=actor, duration=duration)
         restriction_text = self._notification.text_only(
             first_name=user.first_name,
             duration_text=duration.text,
@@ -188,12 +230,72 @@ class BotUtils:
 
         return restriction_text
 
+    def set_flood_read_only(self, user: User, message: Message, duration: DurationDto) -> str:
+        self.set_read_only(
+            user=user,
+            message=message,
+            duration=duration,
+            command=AuditCommand.FLOOD,
+        )
+
+        restriction_text = self._notification.flood(
+            first_name=user.first_name,
+            duration_text=duration.text,
+        )
+
+        return restriction_text
+
+    def purge_spam_wave(self, senders: List[Tuple[UserDto, int]], message: Message, repeat_offenders: Set[int]) -> str:
+        """
+        Delete every message of a spam wave, put its senders into read-only and ban repeat offenders forever,
+        returns notification text
+        """
+        read_only_duration = self.get_duration(
+            text=DuplicateSettings.READ_ONLY_DURATION,
+            duration_class=self._settings.restrict_duration(),
+        )
+        ban_duration = self.get_duration(text='', duration_class=self._settings.ban_duration())
+        restricted = dict()
+        banned = dict()
+        for user, message_id in senders:
+            self.delete_message(message.chat.id, message_id)
+            if user.id in restricted or user.id in banned:
+                continue
+
+            try:
+                if user.id in repeat_offenders:
+                    self.ban_kick(user=user, message=message, duration=ban_duration, command=AuditCommand.SPAM_WAVE)
+                    banned[user.id] = user
+                else:
+                    self.set_read_only(
+                        user=user,
+                        message=message,
+                        duration=read_only_duration,
+                        command=AuditCommand.SPAM_WAVE,
+                    )
+                    restricted[user.id] = user
+            except ApiException as e:
+                self._logger.error('Can not punish spam wave sender %s (@%s)', user.id, user.username)
+                self.observe_api_error(e)
+
+        texts = list()
+        if restricted:
+            texts.append(self._notification.spam_wave_read_only(
+                names=', '.join(user.first_name for user in restricted.values()),
+                duration_text=read_only_duration.text,
+            ))
+        if banned:
+            texts.append(self._notification.spam_wave(names=', '.join(user.first_name for user in banned.values())))
+
+        return ' '.join(texts)
+
     def set_punishment(self, user: User, message: Message) -> str:
         duration = PunishmentDuration.DURATION
         self.set_read_only(
             user=user,
             message=message,
-            duration=duration
+            duration=duration,
+            command=AuditCommand.UNAUTHORIZED_COMMAND,
         )
 
         restriction_text = self._notification.unauthorized_punishment(
@@ -202,7 +304,7 @@ class BotUtils:
 
         return restriction_text
 
-    def set_read_write(self, user: User, message: Message) -> str:
+    def set_read_write(self, user: User, message: Message, actor: User = None) -> str:
         self._bot.restrict_chat_member(
             chat_id=message.chat.id,
             user_id=user.id,
@@ -211,11 +313,20 @@ class BotUtils:
             can_send_other_messages=True,
             can_add_web_page_previews=True,
         )
+        self._member_mirror.invalidate(user.id)
+        self.audit(command=ChatCommand.RW, user=user, actor=actor)
         restriction_text = self._notification.read_write(first_name=user.first_name)
 
         return restriction_text
 
-    def ban_kick(self, user: User, message: Message, duration: DurationDto) -> str:
+    def ban_kick(
+            self,
+            user: User,
+            message: Message,
+            duration: DurationDto,
+            actor: User = None,
+            command: str = ChatCommand.BAN,
+    ) -> str:
         self._newbie_storage.remove(user)
 
         self._bot.kick_chat_member(
@@ -223,7 +334,11 @@ class BotUtils:
             user_id=user.id,
             until_date=message.date + duration.seconds,
         )
-        self._logger.info(f'@{user.username} was banned by {message.from_user.username} for {duration.text}.')
+        self._member_mirror.invalidate(user.id)
+        self.audit(command=command, user=user, actor=actor, duration=duration)
+        self._logger.info(
+            '@%s was banned by %s for %s.', user.username, command if actor is None else actor.username, duration.text
+        )
 
         duration_text = duration.text
         if duration.seconds > 0:
@@ -233,18 +348,26 @@ class BotUtils:
 
         return kick_text
 
-    def create_scheduled_threat(self, pause: int, action, args: tuple):
-        threading.Thread(target=self._handle_scheduled_task, args=(pause, action, args,)).start()
+    def audit(self, command: str, user: User, actor: User = None, duration: DurationDto = None):
+        if self._audit_log is None:
+            return
 
-    @staticmethod
-    def _handle_scheduled_task(pause: int, action, args: tuple):
-        time.sleep(pause)
-        action(*args)
+        self._audit_log.record(AuditEntryDto(
+            timestamp=int(time.time()),
+            chat_id=self._chat_id,
+            command=command,
+            target=UserDto.from_user(user),
+            actor=None if actor is None else UserDto.from_user(actor),
+            duration=duration,
+        ))
+
+    def create_scheduled_threat(self, pause: int, action, args: tuple) -> ScheduledTask:
+        return self._scheduler.schedule(pause, action, args)
 
     def timeout_kick(self, newbie: NewbieDto):
         greeting_message = newbie.greeting
         user = newbie.user
-        if user.id not in self._newbie_storage.get_user_list():
+        if user.id not in self._newbie_storage:
             return
 
         self._newbie_storage.remove(user)
@@ -252,22 +375,102 @@ class BotUtils:
 
         kick_text = self._notification.timeout_kick(user.first_name)
         kick_message = self._bot.send_message(
-            chat_id=greeting_message.chat.id,
+            chat_id=greeting_message.chat_id,
             text=f'*{kick_text}*',
             reply_to_message_id=greeting_message.message_id,
             parse_mode=TelegramParseMode.MARKDOWN
         )
         try:
             self._bot.kick_chat_member(
-                chat_id=greeting_message.chat.id,
+                chat_id=greeting_message.chat_id,
                 user_id=user.id,
                 until_date=kick_message.date + BanDuration.AUTO_KICK_DURATION_SECONDS,
             )
-            self._logger.info(f'@{user.username} was kicked from chat due greeting timeout.')
+            self.audit(command=AuditCommand.CAPTCHA_TIMEOUT, user=user)
+            self._logger.info('@%s was kicked from chat due greeting timeout.', user.username)
         except ApiException:
-            self._logger.error(f'Can not kick chat member @{user.username}')
+            self._logger.error('Can not kick chat member @%s', user.username)
             self.delete_chat_message(kick_message)
 
+    def is_join_request(self, newbie: NewbieDto) -> bool:
+        """
+        Check whether a newbie answers the captcha of a join request, it is sent to private chat
+        """
+        return newbie.greeting is not None and newbie.greeting.chat_id != self.chat_id
+
+    def approve_join_request(self, newbie: NewbieDto):
+        self._newbie_storage.remove(newbie.user)
+        self._newbie_storage.mark_passed(newbie.user, time.time())
+        try:
+            self._bot.approve_chat_join_request(chat_id=self.chat_id, user_id=newbie.user.id)
+            self._logger.info('Join request of @%s to chat %s approved', newbie.user.username, self.chat_id)
+        except ApiException:
+            self._logger.error('Can not approve join request of @%s', newbie.user.username)
+
+    def timeout_decline(self, newbie: NewbieDto):
+        if newbie.user.id not in self._newbie_storage:
+            return
+
+        self.decline_join_request(newbie, AuditCommand.CAPTCHA_TIMEOUT)
+
+    def decline_join_request(self, newbie: NewbieDto, command: str):
+        user = newbie.user
+        self._newbie_storage.remove(user)
+        try:
+            self._bot.decline_chat_join_request(chat_id=self.chat_id, user_id=user.id)
+            self.audit(command=command, user=user)
+            self._logger.info('Join request of @%s was declined: %s', user.username, command)
+        except ApiException:
+            self._logger.error('Can not decline join request of @%s', user.username)
+
+    def wrong_answer_kick(self, newbie: NewbieDto):
+        user = newbie.user
+        self._newbie_storage.remove(user)
+        try:
+            self._bot.kick_chat_member(
+                chat_id=self.chat_id,
+                user_id=user.id,
+                until_date=int(time.time()) + BanDuration.AUTO_KICK_DURATION_SECONDS,
+            )
+            self.audit(command=AuditCommand.CAPTCHA_FAILED, user=user)
+            self._logger.info('@%s was kicked from chat due wrong answer.', user.username)
+        except ApiException:
+            self._logger.error('Can not kick chat member @%s', user.username)
+
+    def timeout_kick_batch(self, newbies: List[NewbieDto]):
+        newbies = [newbie for newbie in newbies if newbie.user.id in self._newbie_storage]
+        if not newbies:
+            return
+
+        greeting_message = newbies[0].greeting
+        for newbie in newbies:
+            self._newbie_storage.remove(newbie.user)
+        self.remove_inline_keyboard(greeting_message)
+
+        kick_text = self._notification.timeout_kick(', '.join(newbie.user.first_name for newbie in newbies))
+        kick_message = self._bot.send_message(
+            chat_id=greeting_message.chat_id,
+            text=f'*{kick_text}*',
+            reply_to_message_id=greeting_message.message_id,
+            parse_mode=TelegramParseMode.MARKDOWN
+        )
+        pending = [
+            (newbie.user, self._bot.submit(
+                'kick_chat_member',
+                chat_id=greeting_message.chat_id,
+                user_id=newbie.user.id,
+                until_date=kick_message.date + BanDuration.AUTO_KICK_DURATION_SECONDS,
+            ))
+            for newbie in newbies
+        ]
+        for user, future in pending:
+            try:
+                future.result()
+                self.audit(command=AuditCommand.CAPTCHA_TIMEOUT, user=user)
+            except ApiException:
+                self._logger.error('Can not kick chat member @%s', user.username)
+        self._logger.info('%s newbies were kicked from chat due greeting timeout.', len(newbies))
+
     def restore_restriction(self, restricted: RestrictedUserDto):
         try:
             try:
@@ -290,31 +493,32 @@ class BotUtils:
                 can_send_other_messages=restricted.restriction.other,
                 can_add_web_page_previews=restricted.restriction.web_preview,
             )
+            self._member_mirror.invalidate(restricted.user.id)
             self._logger.info(
-                f'Custom restriction was restored for @{restricted.user.username}. {restricted.restriction.__dict__}'
+                'Custom restriction was restored for @%s. messages=%s, media=%s, other=%s, web_preview=%s',
+                restricted.user.username,
+                restricted.restriction.messages,
+                restricted.restriction.media,
+                restricted.restriction.other,
+                restricted.restriction.web_preview,
             )
+            self._restriction_storage.remove(restricted)
         except ApiException:
-            self._logger.error(f'Can not set custom restriction for chat member @{restricted.user.username}')
+            self._logger.error('Can not set custom restriction for chat member @%s', restricted.user.username)
+            self._restriction_storage.remove(restricted)
         except InvalidConditionError:
             pass
 
-    def rude_qa_only(self, handler):
-        def wrapper(message: Message):
-            if message.chat.id == self.chat_id:
-                return handler(message)
-
-        return wrapper
+    def is_admin(self, user: User, confirm_negative: bool = False) -> bool:
+        return self._admin_cache.is_admin(self.chat_id, user.id, confirm_negative)
 
-    @staticmethod
-    def supergroup_only(handler):
-        def wrapper(message: Message):
-            try:
-                if message.chat.type == TelegramChatType.SUPER_GROUP:
-                    return handler(message)
-            except TypeError:
-                pass
-
-        return wrapper
+    def is_cached_admin(self, user: User) -> bool:
+        """
+        Check admin rights without calling the Bot API, for handler filters; see AdminCache.peek()
+        """
+        return self._admin_cache.peek(self.chat_id, user.id)
 
-    def is_admin(self, user: User):
-        return user.id in [_.user.id for _ in self._bot.get_chat_administrators(self.chat_id)]
+    def observe_api_error(self, exception: ApiException):
+        description = str(exception)
+        if TelegramApiError.USER_IS_ADMINISTRATOR in description or TelegramApiError.CHAT_OWNER in description:
+            self._admin_cache.invalidate(self.chat_id)
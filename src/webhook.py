@@ -0,0 +1,124 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from telebot import apihelper
+
+from const import WebhookSettings, TelegramUpdateType
+from outbound import ThrottledTeleBot
+
+
+class WebhookServer:
+    """
+    Embedded HTTP server for webhook mode.
+
+    Every update posted by Telegram is passed to the bot handlers right away, there is no polling cycle to wait for.
+    The webhook is registered with a single connection, so Telegram posts updates one by one in update_id order.
+    Their updates are queued and dispatched by a single thread in the order they were received, so updates of a chat
+    reach its lane in order just like a polled batch.
+    """
+    _bot: ThrottledTeleBot
+    _secret_token: str
+    _updates: queue.SimpleQueue
+    _logger: logging.Logger
+
+    def __init__(self, bot: ThrottledTeleBot, listen: str, port: int, secret_token: str, logger: logging.Logger):
+        self._bot = bot
+        self._secret_token = secret_token
+        self._logger = logger
+        self._server = ThreadingHTTPServer((listen, port), self._create_request_handler())
+        self._server.daemon_threads = True
+        self._updates = queue.SimpleQueue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name='webhook-dispatcher', daemon=True)
+
+    def register(self, url: str):
+        apihelper._make_request(self._bot.token, 'setWebhook', method='post', params={
+            'url': url,
+            'secret_token': self._secret_token,
+            'drop_pending_updates': True,
+            'max_connections': WebhookSettings.MAX_CONNECTIONS,
+            'allowed_updates': json.dumps(TelegramUpdateType.ALLOWED),
+        })
+        self._logger.info('Webhook registered: %s', url)
+
+    def serve_forever(self):
+        host, port = self._server.server_address[:2]
+        self._logger.info('Webhook server is listening on %s:%s', host, port)
+        self._dispatcher.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            # updates accepted already are still dispatched
+            self._updates.put(None)
+            self._dispatcher.join()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def is_authorized(self, token: str) -> bool:
+        return hmac.compare_digest(token.encode(), self._secret_token.encode())
+
+    def process_update(self, body: bytes):
+        """
+        Queue a posted update for dispatch, raises ValueError if it is not a JSON object
+        """
+        update = json.loads(body.decode('utf-8'))
+        if not isinstance(update, dict):
+            raise ValueError('update must be a JSON object')
+
+        self._updates.put(update)
+
+    def _dispatch(self):
+        while True:
+            update = self._updates.get()
+            if update is None:
+                break
+
+            try:
+                self._bot.process_new_updates(self._bot.parse_updates([update]))
+            except Exception:
+                self._logger.exception('Can not dispatch webhook update %s', update.get('update_id'))
+
+    def _create_request_handler(self):
+        server = self
+
+        class WebhookRequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != WebhookSettings.PATH:
+                    return self._respond(404)
+
+                if not server.is_authorized(self.headers.get(WebhookSettings.SECRET_TOKEN_HEADER, '')):
+                    server._logger.warning(
+                        'Webhook request with invalid secret token from %s', self.client_address[0]
+                    )
+                    return self._respond(403)
+
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    server._logger.warning('Webhook request with invalid Content-Length from %s', self.client_address[0])
+                    return self._respond(400)
+                if not 0 < length <= WebhookSettings.MAX_BODY_SIZE:
+                    return self._respond(400)
+
+                try:
+                    server.process_update(self.rfile.read(length))
+                except (ValueError, KeyError, TypeError):
+                    server._logger.error('Can not parse webhook update')
+                    return self._respond(400)
+
+                return self._respond(200)
+
+            def _respond(self, code: int):
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                server._logger.debug('Webhook request: ' + format, *args)
+
+        return WebhookRequestHandler
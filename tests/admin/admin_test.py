@@ -0,0 +1,157 @@
+import logging
+import unittest
+from typing import List
+from unittest import mock
+
+from telebot.apihelper import ApiException
+
+from admin import AdminCache
+from const import AdminCacheSettings
+
+CHAT_ID = -100
+ADMIN_ID = 1
+USER_ID = 2
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class MemberStub:
+    def __init__(self, user_id: int):
+        self.user = mock.Mock(id=user_id)
+
+
+class BotStub:
+    def __init__(self):
+        self.admin_ids = [ADMIN_ID]
+        self.calls = 0
+        self.failing = False
+
+    def get_chat_administrators(self, chat_id: int) -> List[MemberStub]:
+        self.calls += 1
+        if self.failing:
+            raise ApiException('Bad Gateway', 'get_chat_administrators', None)
+
+        return [MemberStub(user_id) for user_id in self.admin_ids]
+
+
+class TaskStub:
+    def __init__(self, pause: float, action, args: tuple):
+        self.pause = pause
+        self.action = action
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SchedulerStub:
+    """
+    Keeps scheduled tasks until they are run by the test
+    """
+    def __init__(self):
+        self.tasks = list()
+
+    def schedule(self, pause: float, action, args: tuple = (), inline: bool = False) -> TaskStub:
+        task = TaskStub(pause, action, args)
+        self.tasks.append(task)
+        return task
+
+    def run_due(self):
+        due = [task for task in self.tasks if task.pause == 0 and not task.cancelled]
+        self.tasks = [task for task in self.tasks if task not in due]
+        for task in due:
+            task.action(*task.args)
+
+
+def at(seconds: float):
+    return mock.patch('admin.time.time', return_value=1000.0 + seconds)
+
+
+class AdminCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = BotStub()
+        self.scheduler = SchedulerStub()
+        self.cache = AdminCache(self.bot, self.scheduler, LOGGER)
+
+    def test_first_check_fetches_and_later_checks_are_cached(self):
+        with at(0):
+            self.assertTrue(self.cache.is_admin(CHAT_ID, ADMIN_ID))
+            self.assertFalse(self.cache.is_admin(CHAT_ID, USER_ID))
+
+        self.assertEqual(1, self.bot.calls)
+
+    def test_peek_never_calls_api(self):
+        with at(0):
+            self.assertFalse(self.cache.peek(CHAT_ID, ADMIN_ID))
+            self.assertFalse(self.cache.peek(CHAT_ID, ADMIN_ID))
+        self.assertEqual(0, self.bot.calls)
+
+        self.scheduler.run_due()
+        with at(1):
+            self.assertTrue(self.cache.peek(CHAT_ID, ADMIN_ID))
+        self.assertEqual(1, self.bot.calls)
+
+    def test_negative_answer_is_confirmed_unless_fetched_just_now(self):
+        with at(0):
+            self.cache.is_admin(CHAT_ID, ADMIN_ID)
+        self.bot.admin_ids = [ADMIN_ID, USER_ID]
+
+        with at(AdminCacheSettings.CONFIRM_INTERVAL_SECONDS - 1):
+            self.assertFalse(self.cache.is_admin(CHAT_ID, USER_ID, confirm_negative=True))
+        with at(AdminCacheSettings.CONFIRM_INTERVAL_SECONDS + 1):
+            self.assertFalse(self.cache.is_admin(CHAT_ID, USER_ID))
+            self.assertTrue(self.cache.is_admin(CHAT_ID, USER_ID, confirm_negative=True))
+        self.assertEqual(2, self.bot.calls)
+
+    def test_stale_set_is_answered_and_refreshed_in_background(self):
+        with at(0):
+            self.cache.is_admin(CHAT_ID, ADMIN_ID)
+        self.bot.admin_ids = [USER_ID]
+
+        with at(AdminCacheSettings.TTL_SECONDS + 1):
+            self.assertTrue(self.cache.is_admin(CHAT_ID, ADMIN_ID))
+            self.assertTrue(self.cache.peek(CHAT_ID, ADMIN_ID))
+            self.assertEqual(1, self.bot.calls)
+
+            self.scheduler.run_due()
+            self.assertFalse(self.cache.peek(CHAT_ID, ADMIN_ID))
+        self.assertEqual(2, self.bot.calls)
+
+    def test_fetch_schedules_refresh_after_ttl(self):
+        with at(0):
+            self.cache.is_admin(CHAT_ID, ADMIN_ID)
+            first_timer = self.scheduler.tasks[-1]
+            self.cache.invalidate(CHAT_ID)
+            self.scheduler.run_due()
+
+        self.assertEqual(AdminCacheSettings.TTL_SECONDS, first_timer.pause)
+        self.assertTrue(first_timer.cancelled)
+        self.assertEqual(AdminCacheSettings.TTL_SECONDS, self.scheduler.tasks[-1].pause)
+        self.assertFalse(self.scheduler.tasks[-1].cancelled)
+
+    def test_invalidated_set_is_confirmed_at_once(self):
+        with at(0):
+            self.cache.is_admin(CHAT_ID, ADMIN_ID)
+            self.cache.invalidate(CHAT_ID)
+            self.bot.admin_ids = [ADMIN_ID, USER_ID]
+
+            self.assertTrue(self.cache.is_admin(CHAT_ID, USER_ID, confirm_negative=True))
+        self.assertEqual(2, self.bot.calls)
+
+    def test_failed_refresh_is_retried_later(self):
+        self.bot.failing = True
+        with at(0), self.assertLogs(LOGGER, logging.ERROR):
+            self.cache.prefetch(CHAT_ID)
+            self.scheduler.run_due()
+
+        self.bot.failing = False
+        with at(1):
+            self.assertFalse(self.cache.peek(CHAT_ID, ADMIN_ID))
+            self.scheduler.run_due()
+            self.assertTrue(self.cache.peek(CHAT_ID, ADMIN_ID))
+        self.assertEqual(2, self.bot.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from audit import AuditLog
+from const import AuditSettings
+from dto import AuditEntryDto, UserDto
+from error import AuditLogUnavailableError
+
+CHAT_ID = -100
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def entry(user_id: int, command: str) -> AuditEntryDto:
+    return AuditEntryDto(
+        timestamp=1000,
+        chat_id=CHAT_ID,
+        command=command,
+        target=UserDto(id=user_id, first_name=f'user {user_id}', username=f'u{user_id}'),
+    )
+
+
+class AuditLogTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open(self) -> AuditLog:
+        audit_log = AuditLog(self.directory, LOGGER)
+        self.addCleanup(audit_log.close)
+        return audit_log
+
+    def commands(self, audit_log: AuditLog, user_id: int) -> list:
+        return [found.command for found in audit_log.history(CHAT_ID, user_id)]
+
+    def test_history_is_read_back_the_newest_first(self):
+        audit_log = self.open()
+        audit_log.history(CHAT_ID, 1)
+        audit_log._write([entry(1, '!ro'), entry(2, '!ro'), entry(1, '!ban')])
+
+        self.assertEqual(['!ban', '!ro'], self.commands(audit_log, 1))
+        self.assertEqual(['!ban'], [found.command for found in audit_log.history(CHAT_ID, 1, limit=1)])
+
+    def test_history_is_unavailable_until_indexed(self):
+        indexing = threading.Event()
+        build_index = AuditLog._build_index
+
+        def slow_build_index(audit_log: AuditLog):
+            indexing.wait()
+            build_index(audit_log)
+
+        with mock.patch.object(AuditLog, '_build_index', slow_build_index), \
+                mock.patch.object(AuditSettings, 'HISTORY_WAIT_SECONDS', 0.01):
+            audit_log = self.open()
+            with self.assertRaises(AuditLogUnavailableError):
+                audit_log.history(CHAT_ID, 1)
+
+            indexing.set()
+            self.assertEqual([], audit_log.history(CHAT_ID, 1))
+
+    def test_entries_after_failed_write_are_indexed_right(self):
+        audit_log = self.open()
+        audit_log.history(CHAT_ID, 1)
+
+        with mock.patch('audit.os.fsync', side_effect=OSError('disk failure')), \
+                self.assertLogs(LOGGER, logging.ERROR):
+            audit_log._write([entry(1, '!ro')])
+        audit_log._write([entry(1, '!ban')])
+
+        self.assertEqual(['!ban'], self.commands(audit_log, 1))
+        self.assertEqual(2, len(os.listdir(self.directory)))
+
+    def test_index_is_rebuilt_on_open(self):
+        audit_log = AuditLog(self.directory, LOGGER)
+        audit_log.record(entry(1, '!ro'))
+        audit_log.record(entry(1, '!ban'))
+        audit_log.close()
+
+        self.assertEqual(['!ban', '!ro'], self.commands(self.open(), 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
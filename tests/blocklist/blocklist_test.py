@@ -0,0 +1,131 @@
+import logging
+import os
+import re
+import tempfile
+import unittest
+
+from telebot.types import Message
+
+from blocklist import Blocklist, BlocklistWatcher, trie_pattern
+from const import BlocklistAction
+from scheduler import TaskScheduler
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def blocklist(*lines: str) -> Blocklist:
+    return Blocklist.parse(lines, LOGGER)
+
+
+class TriePatternTest(unittest.TestCase):
+    def test_pattern_matches_exactly_the_words(self):
+        words = ['a', 'ab', 'abc', 'b', 'c++', 'x.y', 'казино']
+        pattern = re.compile(f'(?:{trie_pattern(words)})$')
+
+        for word in words:
+            with self.subTest(word=word):
+                self.assertIsNotNone(pattern.match(word))
+        for text in ('', 'ac', 'abd', 'c+', 'c', 'xzy', 'казин'):
+            with self.subTest(text=text):
+                self.assertIsNone(pattern.match(text))
+
+
+class BlocklistTest(unittest.TestCase):
+    def test_word_is_matched_as_whole_word(self):
+        words = blocklist('word казино', 'word a', 'word ab', 'word c++', 'word free money')
+
+        for text in ('Казино рядом', 'a', 'ab!', 'учу C++ давно', 'get FREE MONEY now'):
+            with self.subTest(text=text):
+                self.assertEqual(BlocklistAction.DELETE, words.match(text))
+        for text in ('казиног', 'abc', 'ba', 'c', 'free moneys'):
+            with self.subTest(text=text):
+                self.assertIsNone(words.match(text))
+
+    def test_domain_is_matched_with_subdomains_only(self):
+        domains = blocklist('domain evil.com')
+
+        for text in ('evil.com', 'go to evil.com.', 'https://EVIL.com/path', 'sub.evil.com', 'evil.com:8080'):
+            with self.subTest(text=text):
+                self.assertEqual(BlocklistAction.DELETE, domains.match(text))
+        for text in ('notevil.com', 'evil.com.ua', 'evil.community', 'my-evil.com', 'evil-com'):
+            with self.subTest(text=text):
+                self.assertIsNone(domains.match(text))
+
+    def test_regex_is_matched_against_lowercased_text(self):
+        regexes = blocklist(r'regex t\.me/\+\w+')
+
+        self.assertEqual(BlocklistAction.DELETE, regexes.match('join T.me/+AbC'))
+        self.assertIsNone(regexes.match('t.me/channel'))
+
+    def test_most_severe_action_wins(self):
+        entries = blocklist('word спам', 'domain:ro scam.example', 'regex:ban free\\s+crypto')
+
+        self.assertEqual(BlocklistAction.DELETE, entries.match('спам'))
+        self.assertEqual(BlocklistAction.READ_ONLY, entries.match('спам scam.example'))
+        self.assertEqual(BlocklistAction.BAN, entries.match('free crypto спам scam.example'))
+
+    def test_invalid_lines_are_skipped(self):
+        entries = blocklist('', '# comment', 'word', 'phrase text', 'word:mute text', 'regex (', 'word:ban ok')
+
+        self.assertEqual(1, len(entries))
+        self.assertEqual(BlocklistAction.BAN, entries.match('ok'))
+
+    def test_hidden_link_urls_are_scanned(self):
+        entries = blocklist('domain evil.com')
+        message = Message.de_json({
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': -100, 'type': 'supergroup'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'user'},
+            'text': 'click here',
+            'entities': [{'type': 'text_link', 'offset': 0, 'length': 5, 'url': 'https://evil.com/'}],
+        })
+
+        self.assertEqual(BlocklistAction.DELETE, entries.match_message(message))
+
+    def test_empty_blocklist_matches_nothing(self):
+        self.assertIsNone(blocklist().match('anything'))
+
+
+class BlocklistWatcherTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'blocklist.txt')
+        self.watcher = BlocklistWatcher(self.path, TaskScheduler(LOGGER), LOGGER)
+
+    def write(self, text: str, mtime: float):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_blocklist_is_reloaded_when_file_changes(self):
+        self.watcher._reload_if_changed()
+        self.assertEqual(0, len(self.watcher.blocklist))
+
+        self.write('word казино\n', 1000)
+        self.watcher._reload_if_changed()
+        self.assertEqual(BlocklistAction.DELETE, self.watcher.blocklist.match('казино'))
+
+        self.write('word:ban казино\nword лото\n', 2000)
+        self.watcher._reload_if_changed()
+        self.assertEqual(BlocklistAction.BAN, self.watcher.blocklist.match('казино'))
+        self.assertEqual(2, len(self.watcher.blocklist))
+
+        os.remove(self.path)
+        self.watcher._reload_if_changed()
+        self.assertIsNone(self.watcher.blocklist.match('казино'))
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        self.write('word казино\n', 1000)
+        self.watcher._reload_if_changed()
+        loaded = self.watcher.blocklist
+
+        self.watcher._reload_if_changed()
+
+        self.assertIs(loaded, self.watcher.blocklist)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from chat_settings import ChatSettingsLoader
+from const import NotificationTemplateList, RestrictDuration, BanDuration
+from duration import parse_duration
+
+CHAT_ID = -100
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class ChatSettingsLoaderTest(unittest.TestCase):
+    def load(self, settings) -> dict:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'chats.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(settings, file)
+
+            return ChatSettingsLoader.load(path, [CHAT_ID, -200], LOGGER)
+
+    def test_missing_file_keeps_defaults(self):
+        self.assertEqual({}, ChatSettingsLoader.load('/nonexistent/chats.json', [CHAT_ID], LOGGER))
+
+    def test_chat_without_overrides_shares_default_classes(self):
+        settings = self.load({str(CHAT_ID): {}})[CHAT_ID]
+
+        self.assertIs(NotificationTemplateList, settings.templates)
+        self.assertIs(RestrictDuration, settings.restrict_duration)
+        self.assertIs(BanDuration, settings.ban_duration)
+
+    def test_templates_are_overridden_per_list(self):
+        settings = self.load({str(CHAT_ID): {'templates': {'read_only': ['{first_name} молчит {duration_text}.']}}})
+
+        templates = settings[CHAT_ID].templates
+        self.assertEqual(['{first_name} молчит {duration_text}.'], templates.READ_ONLY)
+        self.assertEqual(NotificationTemplateList.TEXT_ONLY, templates.TEXT_ONLY)
+        self.assertEqual('{first_name} помещен в read-only на {duration_text}.', NotificationTemplateList.READ_ONLY[0])
+
+    def test_duration_limits_are_applied(self):
+        settings = self.load({str(CHAT_ID): {
+            'restrict_duration': {'default': '10m', 'min': '1m', 'max': '3d'},
+            'ban_duration': {'max': '1y'},
+        }})
+        restrict_duration = settings[CHAT_ID].restrict_duration
+        ban_duration = settings[CHAT_ID].ban_duration
+
+        self.assertEqual(600, parse_duration('', restrict_duration).seconds)
+        self.assertEqual('10 минут', parse_duration('', restrict_duration).text)
+        self.assertEqual(60, parse_duration('30s', restrict_duration).seconds)
+        self.assertEqual(3 * 86400, parse_duration('10d', restrict_duration).seconds)
+        self.assertEqual(31536000, parse_duration('5y', ban_duration).seconds)
+        self.assertEqual(10 * 86400, parse_duration('10d', RestrictDuration).seconds)
+
+    def test_invalid_chat_keeps_defaults(self):
+        for invalid in (
+                {'unknown': {}},
+                {'templates': {'unknown': ['text']}},
+                {'templates': {'read_only': []}},
+                {'templates': {'read_only': ['{unknown}']}},
+                {'restrict_duration': {'min': '1d', 'max': '1h'}},
+                {'restrict_duration': {'default': '1h30m'}},
+                {'restrict_duration': {'max': 'soon'}},
+                {'ban_duration': {'until': '1d'}},
+        ):
+            with self.subTest(invalid=invalid):
+                self.assertEqual({}, self.load({str(CHAT_ID): invalid}))
+
+    def test_settings_of_other_chats_are_skipped(self):
+        settings = self.load({'-300': {}, 'chat': {}, '-200': {'ban_duration': {'max': '1d'}}})
+
+        self.assertEqual([-200], list(settings))
+
+
+if __name__ == '__main__':
+    unittest.main()
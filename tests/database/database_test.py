@@ -0,0 +1,168 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from const import DatabaseSettings
+from database import StateDatabase
+from dto import NewbieDto, UserDto, MessageRefDto
+
+CHAT_ID = -100
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+SCHEMA_V0 = (
+    '''
+    CREATE TABLE newbie (
+        user_id INTEGER PRIMARY KEY,
+        first_name TEXT NOT NULL,
+        username TEXT,
+        timeout INTEGER NOT NULL,
+        greeting_chat_id INTEGER,
+        greeting_message_id INTEGER,
+        greeting_date INTEGER,
+        greeting_html TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE restriction (
+        user_id INTEGER PRIMARY KEY,
+        first_name TEXT NOT NULL,
+        username TEXT,
+        chat_id INTEGER NOT NULL,
+        until_date INTEGER NOT NULL,
+        restore_at INTEGER NOT NULL,
+        can_send_messages INTEGER NOT NULL,
+        can_send_media INTEGER NOT NULL,
+        can_send_other INTEGER NOT NULL,
+        can_add_web_preview INTEGER NOT NULL
+    )
+    ''',
+    "INSERT INTO newbie VALUES (1, 'greeted', 'u1', 1120, -100, 10, 1000, 'greeting')",
+    "INSERT INTO newbie VALUES (2, 'waiting', NULL, 1120, NULL, NULL, NULL, NULL)",
+    "INSERT INTO restriction VALUES (3, 'restricted', 'u3', -100, 2000, 2000, 0, 0, 0, 0)",
+)
+
+SCHEMA_V1 = (
+    '''
+    CREATE TABLE newbie (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        first_name TEXT NOT NULL,
+        username TEXT,
+        timeout INTEGER NOT NULL,
+        greeting_message_id INTEGER,
+        greeting_date INTEGER,
+        greeting_html TEXT,
+        PRIMARY KEY (chat_id, user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE restriction (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        first_name TEXT NOT NULL,
+        username TEXT,
+        until_date INTEGER NOT NULL,
+        restore_at INTEGER NOT NULL,
+        can_send_messages INTEGER NOT NULL,
+        can_send_media INTEGER NOT NULL,
+        can_send_other INTEGER NOT NULL,
+        can_add_web_preview INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, user_id)
+    )
+    ''',
+    "INSERT INTO newbie VALUES (-100, 1, 'greeted', 'u1', 1120, 10, 1000, 'greeting')",
+    "INSERT INTO newbie VALUES (-200, 2, 'waiting', NULL, 1120, NULL, NULL, NULL)",
+    "INSERT INTO restriction VALUES (-100, 3, 'restricted', 'u3', 2000, 2000, 0, 1, 0, 0)",
+    'PRAGMA user_version = 1',
+)
+
+
+class StateDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'state.sqlite3')
+
+    def create(self, statements: tuple):
+        connection = sqlite3.connect(self.path)
+        for statement in statements:
+            connection.execute(statement)
+        connection.commit()
+        connection.close()
+
+    def open(self, legacy_chat_id=None) -> StateDatabase:
+        database = StateDatabase(self.path, legacy_chat_id, LOGGER)
+        self.addCleanup(database.close)
+        return database
+
+    def schema_version(self) -> int:
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            connection.close()
+
+    def newbies(self, database: StateDatabase, chat_id: int) -> list:
+        return [
+            (user.id, user.first_name, user.username, timeout, None if greeting is None else
+             (greeting.chat_id, greeting.message_id, greeting.date, greeting.html_text))
+            for user, timeout, greeting in database.load_newbies(chat_id)
+        ]
+
+    def test_v1_database_is_migrated_with_its_rows(self):
+        self.create(SCHEMA_V1)
+
+        database = self.open()
+
+        self.assertEqual(DatabaseSettings.SCHEMA_VERSION, self.schema_version())
+        self.assertEqual([(1, 'greeted', 'u1', 1120, (CHAT_ID, 10, 1000, 'greeting'))], self.newbies(database, CHAT_ID))
+        self.assertEqual([(2, 'waiting', None, 1120, None)], self.newbies(database, -200))
+        restrictions = database.load_restrictions(CHAT_ID)
+        self.assertEqual(
+            [(3, 'restricted', 'u3', 2000, 2000, False, True, False, False)],
+            [
+                (entry.user.id, entry.user.first_name, entry.user.username, entry.until_date, entry.restore_at,
+                 entry.restriction.messages, entry.restriction.media, entry.restriction.other,
+                 entry.restriction.web_preview)
+                for entry in restrictions
+            ],
+        )
+
+    def test_migrated_database_stores_private_greetings(self):
+        self.create(SCHEMA_V1)
+        database = self.open()
+
+        database.save_newbie(CHAT_ID, NewbieDto(
+            user=UserDto(id=4, first_name='applicant', username=None),
+            timeout=1200,
+            question=None,
+            greeting=MessageRefDto(chat_id=4, message_id=10, date=1100, html_text='captcha'),
+        ))
+        database.close()
+
+        reopened = self.open()
+        self.assertIn((4, 'applicant', None, 1200, (4, 10, 1100, 'captcha')), self.newbies(reopened, CHAT_ID))
+
+    def test_v0_newbies_without_greeting_go_to_the_only_chat(self):
+        self.create(SCHEMA_V0)
+
+        database = self.open(legacy_chat_id=CHAT_ID)
+
+        self.assertEqual([1, 2], sorted(newbie[0] for newbie in self.newbies(database, CHAT_ID)))
+        self.assertEqual([3], [entry.user.id for entry in database.load_restrictions(CHAT_ID)])
+
+    def test_v0_newbies_without_greeting_are_dropped_and_counted_with_several_chats(self):
+        self.create(SCHEMA_V0)
+
+        with self.assertLogs(LOGGER, logging.WARNING) as logs:
+            database = self.open()
+
+        self.assertEqual([1], [newbie[0] for newbie in self.newbies(database, CHAT_ID)])
+        self.assertIn('1 newbies without greeting dropped', '\n'.join(logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from const import DuplicateSettings
+from dto import UserDto
+from duplicate import DuplicateDetector
+
+LINK_TEXT = 'Заработок без вложений t.me/scam_channel'
+PLAIN_TEXT = 'Всем привет!'
+
+
+def user(user_id: int) -> UserDto:
+    return UserDto(id=user_id, first_name=f'user {user_id}', username=f'u{user_id}')
+
+
+class DuplicateDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = DuplicateDetector()
+
+    def post(self, text: str, plain: bool, users: range, now: float = 1000.0) -> list:
+        return [self.detector.register_message(user(user_id), user_id, text, plain, now) for user_id in users]
+
+    def test_same_short_greeting_is_not_a_wave(self):
+        waves = self.post(PLAIN_TEXT, True, range(1, DuplicateSettings.MIN_USERS * 2))
+
+        self.assertFalse(any(waves))
+        self.assertEqual(0, len(self.detector))
+
+    def test_wave_needs_min_distinct_users(self):
+        waves = self.post(LINK_TEXT, False, range(1, DuplicateSettings.MIN_USERS + 1))
+
+        self.assertEqual([False] * (DuplicateSettings.MIN_USERS - 1) + [True], waves)
+        self.assertFalse(self.detector.register_message(user(1), 100, 'Другой текст t.me/other', False, 1000.0))
+
+    def test_one_user_repeating_is_not_a_wave(self):
+        waves = [self.detector.register_message(user(1), message_id, LINK_TEXT, False, 1000.0) for message_id in
+                 range(DuplicateSettings.MIN_USERS * 2)]
+
+        self.assertFalse(any(waves))
+
+    def test_long_plain_text_is_tracked(self):
+        text = 'Продам гараж недорого, звоните в любое время дня и ночи, отвечу всем желающим'
+        self.assertGreaterEqual(len(DuplicateDetector.normalize(text)), DuplicateSettings.PLAIN_TEXT_MIN_LENGTH)
+
+        self.assertTrue(self.post(text, True, range(1, DuplicateSettings.MIN_USERS + 1))[-1])
+
+    def test_senders_outside_window_are_forgotten(self):
+        self.post(LINK_TEXT, False, range(1, DuplicateSettings.MIN_USERS))
+
+        later = 1000.0 + DuplicateSettings.WINDOW_SECONDS + 1
+        self.assertFalse(self.detector.register_message(user(99), 99, LINK_TEXT, False, later))
+
+    def test_copies_differing_in_case_and_punctuation_are_the_same_content(self):
+        self.post(LINK_TEXT, False, range(1, DuplicateSettings.MIN_USERS))
+
+        self.assertTrue(self.detector.register_message(user(99), 99, LINK_TEXT.upper() + '!!!', False, 1000.0))
+        self.assertEqual(DuplicateSettings.MIN_USERS, len(self.detector.take_senders(LINK_TEXT)))
+        self.assertEqual([], self.detector.take_senders(LINK_TEXT))
+
+    def test_offence_is_repeated_only_within_ttl(self):
+        self.assertFalse(self.detector.register_offence(1, 1000.0))
+        self.assertTrue(self.detector.register_offence(1, 1001.0))
+        self.assertFalse(self.detector.register_offence(1, 1001.0 + DuplicateSettings.OFFENDER_TTL_SECONDS + 1))
+        self.assertFalse(self.detector.register_offence(2, 1001.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import random
+import unittest
+
+from const import BaseDuration, RestrictDuration, BanDuration
+from dto import DurationDto
+from duration import parse_duration, get_plural
+from error import ParseBanDurationError
+
+SEED = 1
+SAMPLES = 500
+
+
+class WideDuration(BaseDuration):
+    DEFAULT_DURATION = 1
+    DEFAULT_UNIT = 'h'
+    MIN_DURATION = DurationDto(0, 'ничего')
+    MAX_DURATION = DurationDto(10 ** 12, 'вечность')
+
+
+def single_token_duration(text: str, duration_class: BaseDuration) -> DurationDto:
+    """
+    The parser used before compound durations, kept to check that single tokens are parsed the same way
+    """
+    if text == '':
+        return single_token_duration(f'{duration_class.DEFAULT_DURATION}{duration_class.DEFAULT_UNIT}', duration_class)
+
+    try:
+        amount = int(text)
+        return single_token_duration(f'{amount}{duration_class.DEFAULT_UNIT}', duration_class)
+    except ValueError:
+        pass
+
+    try:
+        amount = int(text[:-1])
+        unit = duration_class.UNITS[text[-1]]
+        duration_seconds = int(amount * unit['rate'])
+        if duration_seconds < duration_class.MIN_DURATION.seconds:
+            return duration_class.MIN_DURATION
+        if duration_seconds > duration_class.MAX_DURATION.seconds:
+            return duration_class.MAX_DURATION
+
+        return DurationDto(seconds=duration_seconds, text=f'{amount} {get_plural(amount, unit["plural_forms"])}')
+    except (ValueError, KeyError, IndexError):
+        raise ParseBanDurationError
+
+
+class ParseDurationTest(unittest.TestCase):
+    def setUp(self):
+        parse_duration.cache_clear()
+
+    def assertDuration(self, expected: DurationDto, actual: DurationDto):
+        self.assertEqual((expected.seconds, expected.text), (actual.seconds, actual.text))
+
+    def test_default_duration(self):
+        self.assertDuration(DurationDto(300, '5 минут'), parse_duration('', RestrictDuration))
+        self.assertIs(BanDuration.MIN_DURATION, parse_duration('', BanDuration))
+
+    def test_duration_is_clamped_to_class_limits(self):
+        for text, duration_class, expected in (
+                ('1s', RestrictDuration, RestrictDuration.MIN_DURATION),
+                ('0m', RestrictDuration, RestrictDuration.MIN_DURATION),
+                ('-10m', RestrictDuration, RestrictDuration.MIN_DURATION),
+                ('11d', RestrictDuration, RestrictDuration.MAX_DURATION),
+                ('9d 24h 1s', RestrictDuration, RestrictDuration.MAX_DURATION),
+                ('-1', BanDuration, BanDuration.MIN_DURATION),
+                ('11y', BanDuration, BanDuration.MAX_DURATION),
+        ):
+            with self.subTest(text=text, duration_class=duration_class.__name__):
+                self.assertIs(expected, parse_duration(text, duration_class))
+
+        self.assertEqual(RestrictDuration.MAX_DURATION.seconds, parse_duration('10d', RestrictDuration).seconds)
+        self.assertEqual(RestrictDuration.MIN_DURATION.seconds, parse_duration('5s', RestrictDuration).seconds)
+
+    def test_compound_duration_round_trip(self):
+        generator = random.Random(SEED)
+        units = list(BaseDuration.UNITS)
+        for _ in range(SAMPLES):
+            tokens = [(generator.randint(1, 999), unit) for unit in generator.sample(units, generator.randint(1, 5))]
+            text = generator.choice(('', ' ')).join(
+                f'{amount}{generator.choice(("", " "))}{unit}' for amount, unit in tokens
+            )
+            with self.subTest(text=text):
+                self.assertDuration(
+                    DurationDto(
+                        seconds=sum(amount * BaseDuration.UNITS[unit]['rate'] for amount, unit in tokens),
+                        text=' '.join(
+                            f'{amount} {get_plural(amount, BaseDuration.UNITS[unit]["plural_forms"])}'
+                            for amount, unit in tokens
+                        ),
+                    ),
+                    parse_duration(text, WideDuration),
+                )
+
+    def test_single_token_is_parsed_as_before(self):
+        texts = [''] + [str(amount) for amount in range(-5, 400)]
+        texts += [f'{amount}{unit}' for amount in range(-5, 400) for unit in BaseDuration.UNITS]
+        for duration_class in (RestrictDuration, BanDuration, WideDuration):
+            for text in texts:
+                with self.subTest(text=text, duration_class=duration_class.__name__):
+                    self.assertDuration(
+                        single_token_duration(text, duration_class),
+                        parse_duration(text, duration_class),
+                    )
+
+    def test_garbage_is_rejected(self):
+        for text in (' ', 'm', 'abc', '1x', '5mm', '1h1h', '1h 30', '1 0m', 'h1', '--5', '1.5h', '1h,30m', '５m'):
+            with self.subTest(text=text):
+                with self.assertRaises(ParseBanDurationError):
+                    parse_duration(text, RestrictDuration)
+
+    def test_results_are_cached_by_text_and_class(self):
+        class ShortDuration(RestrictDuration):
+            MAX_DURATION = DurationDto(3600, '1 час')
+
+        restricted = parse_duration('2h', RestrictDuration)
+        short = parse_duration('2h', ShortDuration)
+
+        self.assertEqual(7200, restricted.seconds)
+        self.assertIs(ShortDuration.MAX_DURATION, short)
+        self.assertIs(restricted, parse_duration('2h', RestrictDuration))
+        self.assertIs(short, parse_duration('2h', ShortDuration))
+        info = parse_duration.cache_info()
+        self.assertEqual((2, 2), (info.hits, info.misses))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+import unittest
+
+from executor import KeyedExecutor
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class KeyedExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = KeyedExecutor(4, LOGGER)
+        self.executed = list()
+        self.lock = threading.Lock()
+
+    def record(self, key: str, number: int):
+        with self.lock:
+            self.executed.append((key, number))
+
+    def wait_for(self, key: str):
+        done = threading.Event()
+        self.executor.submit(key, done.set)
+        self.assertTrue(done.wait(2))
+
+    def wait_idle(self):
+        deadline = time.monotonic() + 2
+        while self.executor.queue_depths() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_tasks_of_a_key_run_in_submission_order(self):
+        for number in range(200):
+            for key in ('a', 'b', 'c'):
+                self.executor.submit(key, self.record, key, number)
+        for key in ('a', 'b', 'c'):
+            self.wait_for(key)
+
+        for key in ('a', 'b', 'c'):
+            with self.subTest(key=key):
+                self.assertEqual(list(range(200)), [number for done_key, number in self.executed if done_key == key])
+
+    def test_tasks_of_a_key_do_not_overlap(self):
+        running = list()
+        overlapped = list()
+
+        def task():
+            running.append(1)
+            overlapped.append(len(running) > 1)
+            running.pop()
+
+        for _ in range(100):
+            self.executor.submit('a', task)
+        self.wait_for('a')
+
+        self.assertEqual([False] * 100, overlapped)
+
+    def test_blocked_key_does_not_hold_up_other_keys(self):
+        release = threading.Event()
+        self.executor.submit('busy', release.wait, 2)
+        self.executor.submit('busy', self.record, 'busy', 1)
+
+        self.wait_for('free')
+        self.assertEqual([], self.executed)
+        self.assertEqual(2, self.executor.queue_depth('busy'))
+
+        release.set()
+        self.wait_for('busy')
+        self.assertEqual([('busy', 1)], self.executed)
+        self.wait_idle()
+        self.assertEqual(0, self.executor.queue_depth('busy'))
+
+    def test_failed_task_does_not_stop_its_key(self):
+        def fail():
+            raise RuntimeError('task failed')
+
+        with self.assertLogs(LOGGER, logging.ERROR):
+            self.executor.submit('a', fail)
+            self.executor.submit('a', self.record, 'a', 1)
+            self.wait_for('a')
+
+        self.assertEqual([('a', 1)], self.executed)
+
+    def test_queue_depths_of_idle_keys_are_dropped(self):
+        self.wait_for('a')
+        self.wait_idle()
+
+        self.assertEqual({}, self.executor.queue_depths())
+
+
+if __name__ == '__main__':
+    unittest.main()
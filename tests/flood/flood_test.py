@@ -0,0 +1,66 @@
+import unittest
+
+from const import FloodSettings
+from flood import FloodDetector
+
+USER_ID = 1
+
+
+class FloodDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = FloodDetector()
+
+    def post(self, texts: list, started_at: float = 1000.0, pause: float = 0.1) -> list:
+        return [
+            self.detector.register_message(USER_ID, text, started_at + number * pause)
+            for number, text in enumerate(texts)
+        ]
+
+    def test_messages_over_rate_limit_are_flood(self):
+        texts = [f'message {number}' for number in range(FloodSettings.MAX_MESSAGES + 1)]
+
+        self.assertEqual([False] * FloodSettings.MAX_MESSAGES + [True], self.post(texts))
+
+    def test_messages_spread_over_window_are_not_flood(self):
+        texts = [f'message {number}' for number in range(FloodSettings.MAX_MESSAGES * 3)]
+        pause = FloodSettings.WINDOW_SECONDS / FloodSettings.MAX_MESSAGES + 0.01
+
+        self.assertFalse(any(self.post(texts, pause=pause)))
+
+    def test_repeated_text_is_flood(self):
+        texts = ['same'] * FloodSettings.MAX_DUPLICATES
+
+        self.assertEqual([False] * (FloodSettings.MAX_DUPLICATES - 1) + [True], self.post(texts))
+
+    def test_repeated_text_outside_window_is_not_flood(self):
+        texts = ['same'] * FloodSettings.MAX_DUPLICATES
+
+        self.assertFalse(any(self.post(texts, pause=FloodSettings.WINDOW_SECONDS / 2 + 0.01)))
+
+    def test_stickers_count_only_toward_rate_limit(self):
+        stickers = [None] * FloodSettings.MAX_MESSAGES
+
+        self.assertFalse(any(self.post(stickers)))
+        self.assertTrue(self.detector.register_message(USER_ID, None, 1001.0))
+
+    def test_user_starts_over_after_flood(self):
+        self.post(['same'] * FloodSettings.MAX_DUPLICATES)
+
+        self.assertEqual(0, len(self.detector))
+        self.assertFalse(self.detector.register_message(USER_ID, 'same', 1001.0))
+
+    def test_users_are_tracked_separately(self):
+        for user_id in range(FloodSettings.MAX_MESSAGES + 1):
+            self.assertFalse(self.detector.register_message(user_id, 'same', 1000.0))
+
+    def test_least_recently_active_user_is_evicted(self):
+        for user_id in range(FloodSettings.MAX_TRACKED_USERS + 1):
+            self.detector.register_message(user_id, 'hello', 1000.0)
+
+        self.assertEqual(FloodSettings.MAX_TRACKED_USERS, len(self.detector))
+        self.assertFalse(self.detector.register_message(0, 'hello', 1000.0))
+        self.assertFalse(self.detector.register_message(0, 'hello', 1000.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
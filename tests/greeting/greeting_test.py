@@ -0,0 +1,180 @@
+import logging
+import unittest
+
+from telebot.types import User
+
+from dto import MessageRefDto
+from error import UserAlreadyInStorageError, UserNotFoundInStorageError, UserStorageUpdateError
+from const import QuestionSettings
+from greeting import NewbieStorage, QuestionProvider
+
+CHAT_ID = -100
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def user(user_id: int) -> User:
+    return User.de_json({'id': user_id, 'is_bot': False, 'first_name': f'user {user_id}', 'username': f'u{user_id}'})
+
+
+def greeting(message_id: int, chat_id: int = CHAT_ID) -> MessageRefDto:
+    return MessageRefDto(chat_id=chat_id, message_id=message_id, date=0, html_text='greeting')
+
+
+class TimerStub:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class NewbieStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = NewbieStorage(CHAT_ID, LOGGER, max_size=3)
+
+    def greeted_user_ids(self, message_id: int, chat_id: int = CHAT_ID) -> set:
+        return {newbie.user.id for newbie in self.storage.get_by_greeting(chat_id, message_id)}
+
+    def assertIndexConsistent(self):
+        indexed = {
+            (user_id, key)
+            for key, user_ids in self.storage._greeting_index.items()
+            for user_id in user_ids
+        }
+        greeted = {
+            (newbie.user.id, (newbie.greeting.chat_id, newbie.greeting.message_id))
+            for newbie in self.storage
+            if newbie.greeting is not None
+        }
+        self.assertEqual(greeted, indexed)
+        self.assertTrue(all(self.storage._greeting_index.values()))
+
+    def test_added_newbie_is_found(self):
+        self.storage.add(user(1), 120, None)
+
+        self.assertIn(1, self.storage)
+        self.assertEqual(1, len(self.storage))
+        self.assertEqual('u1', self.storage.get(user(1)).user.username)
+        self.assertEqual(120, self.storage.get(user(1)).timeout)
+
+    def test_newbie_can_not_be_added_twice(self):
+        self.storage.add(user(1), 120, None)
+
+        with self.assertRaises(UserAlreadyInStorageError):
+            self.storage.add(user(1), 120, None)
+
+    def test_missing_newbie_can_not_be_got_or_updated(self):
+        with self.assertRaises(UserNotFoundInStorageError):
+            self.storage.get(user(1))
+        with self.assertRaises(UserStorageUpdateError):
+            self.storage.update(user(1), greeting(10))
+        with self.assertRaises(UserStorageUpdateError):
+            self.storage.set_timer(user(1), TimerStub())
+
+    def test_batch_greeting_is_indexed_for_every_newbie(self):
+        for user_id in (1, 2, 3):
+            self.storage.add(user(user_id), 120, None)
+            self.storage.update(user(user_id), greeting(10))
+
+        self.assertEqual({1, 2, 3}, self.greeted_user_ids(10))
+        self.assertIndexConsistent()
+
+    def test_new_greeting_replaces_the_old_one_in_index(self):
+        self.storage.add(user(1), 120, None)
+        self.storage.add(user(2), 120, None)
+        self.storage.update(user(1), greeting(10))
+        self.storage.update(user(2), greeting(10))
+        self.storage.update(user(1), greeting(11))
+
+        self.assertEqual({2}, self.greeted_user_ids(10))
+        self.assertEqual({1}, self.greeted_user_ids(11))
+        self.assertIndexConsistent()
+
+    def test_private_captcha_does_not_share_group_greeting_id(self):
+        private_chat_id = 2
+        self.storage.add(user(1), 120, None)
+        self.storage.add(user(2), 120, None)
+        self.storage.update(user(1), greeting(10))
+        self.storage.update(user(2), greeting(10, chat_id=private_chat_id))
+
+        self.assertEqual({1}, self.greeted_user_ids(10))
+        self.assertEqual({2}, self.greeted_user_ids(10, chat_id=private_chat_id))
+
+        self.storage.remove(user(1))
+        self.assertEqual(set(), self.greeted_user_ids(10))
+        self.assertEqual({2}, self.greeted_user_ids(10, chat_id=private_chat_id))
+        self.assertIndexConsistent()
+
+    def test_timer_keeps_greeting_indexed(self):
+        self.storage.add(user(1), 120, None)
+        self.storage.update(user(1), greeting(10))
+        self.storage.set_timer(user(1), TimerStub())
+
+        self.assertEqual({1}, self.greeted_user_ids(10))
+        self.assertIndexConsistent()
+
+    def test_removed_newbie_leaves_index_and_its_timer_is_cancelled(self):
+        timer = TimerStub()
+        self.storage.add(user(1), 120, None)
+        self.storage.add(user(2), 120, None)
+        self.storage.update(user(1), greeting(10))
+        self.storage.update(user(2), greeting(10))
+        self.storage.set_timer(user(1), timer)
+
+        self.storage.remove(user(1))
+        self.assertNotIn(1, self.storage)
+        self.assertTrue(timer.cancelled)
+        self.assertEqual({2}, self.greeted_user_ids(10))
+
+        self.storage.remove(user(2))
+        self.assertEqual([], self.storage.get_by_greeting(CHAT_ID, 10))
+        self.assertNotIn((CHAT_ID, 10), self.storage._greeting_index)
+        self.assertIndexConsistent()
+
+    def test_oldest_newbie_is_evicted_from_full_storage(self):
+        timer = TimerStub()
+        for user_id in (1, 2, 3):
+            self.storage.add(user(user_id), 120, None)
+            self.storage.update(user(user_id), greeting(10 + user_id))
+        self.storage.set_timer(user(1), timer)
+
+        self.storage.add(user(4), 120, None)
+
+        self.assertEqual(3, len(self.storage))
+        self.assertNotIn(1, self.storage)
+        self.assertEqual(1, self.storage.evicted)
+        self.assertTrue(timer.cancelled)
+        self.assertEqual([], self.storage.get_by_greeting(CHAT_ID, 11))
+        self.assertIndexConsistent()
+
+    def test_passed_newbie_is_remembered_for_a_while(self):
+        self.storage.mark_passed(user(1), 1000.0)
+
+        self.assertTrue(self.storage.passed_recently(1, 1001.0))
+        self.assertFalse(self.storage.passed_recently(2, 1001.0))
+        self.assertFalse(self.storage.passed_recently(1, 10 ** 9))
+
+
+class QuestionProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.questions = QuestionProvider.parse([{
+            'text': '{mention}, 2 + 2?',
+            'answers': [{'text': '4', 'correct': True}, {'text': '5'}],
+        }], LOGGER)
+
+    def test_answers_are_found_by_payload(self):
+        self.assertTrue(self.questions.get_answer('0.0').correct)
+        self.assertFalse(self.questions.get_answer('0.1').correct)
+        self.assertIsNone(self.questions.get_answer('0.2'))
+
+    def test_payloads_of_keyboards_sent_before_the_bank_pass(self):
+        for payload, reply in QuestionSettings.LEGACY_REPLIES.items():
+            with self.subTest(payload=payload):
+                answer = self.questions.get_answer(payload)
+                self.assertTrue(answer.correct)
+                self.assertEqual(reply, answer.reply)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+import unittest
+
+from telebot.apihelper import ApiException
+
+from const import ApiCallPriority, OutboundSettings
+from metrics import Metrics
+from outbound import ThrottledTeleBot, ChatUpdate, OutboundDispatcher, ApiCall
+from scheduler import TaskScheduler
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+CHAT_ID = -100
+CHAT = {'id': CHAT_ID, 'type': 'supergroup', 'title': 'chat'}
+
+
+def user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user {user_id}', 'username': f'u{user_id}'}
+
+
+def member(user_id: int, status: str) -> dict:
+    return {'user': user(user_id), 'status': status}
+
+
+def message_update(update_id: int, text: str) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': CHAT, 'from': user(1), 'text': text,
+    }}
+
+
+def callback_update(update_id: int, data: str) -> dict:
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user(1), 'chat_instance': '1', 'data': data,
+        'message': {'message_id': 1, 'date': 0, 'chat': CHAT, 'from': user(2), 'text': 'keyboard'},
+    }}
+
+
+def member_update(update_id: int, update_type: str) -> dict:
+    return {'update_id': update_id, update_type: {
+        'chat': CHAT, 'from': user(1), 'date': 0,
+        'old_chat_member': member(3, 'left'), 'new_chat_member': member(3, 'member'),
+    }}
+
+
+def join_request_update(update_id: int) -> dict:
+    return {'update_id': update_id, 'chat_join_request': {'chat': CHAT, 'from': user(4), 'date': 0}}
+
+
+class ThrottledTeleBotTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = ThrottledTeleBot('1:token', threaded=False)
+        self.handled = list()
+        self.bot.message_handler(func=lambda message: True)(
+            lambda message: self.handled.append(('message', message.text))
+        )
+        self.bot.callback_query_handler(func=lambda call: True)(
+            lambda call: self.handled.append(('callback', call.data))
+        )
+        self.bot.add_chat_member_handler(
+            lambda update: self.handled.append(('member', update.new_member.user.id))
+        )
+        self.bot.add_chat_join_request_handler(
+            lambda request: self.handled.append(('join_request', request.user.id))
+        )
+
+    def test_updates_are_parsed_without_dispatching(self):
+        updates = self.bot.parse_updates([
+            message_update(1, 'first'),
+            member_update(2, 'chat_member'),
+            member_update(3, 'my_chat_member'),
+            join_request_update(4),
+        ])
+
+        self.assertEqual([], self.handled)
+        self.assertTrue(all(isinstance(update, ChatUpdate) for update in updates))
+        self.assertEqual('first', updates[0].message.text)
+        self.assertIsNone(updates[0].chat_member_update)
+        self.assertEqual(3, updates[1].chat_member_update.new_member.user.id)
+        self.assertEqual(CHAT_ID, updates[2].chat_member_update.chat_id)
+        self.assertEqual(4, updates[3].chat_join_request.user_chat_id)
+
+    def test_batch_is_dispatched_in_order_received(self):
+        self.bot.process_new_updates(self.bot.parse_updates([
+            message_update(1, 'first'),
+            member_update(2, 'chat_member'),
+            callback_update(3, 'answer'),
+            join_request_update(4),
+            message_update(5, 'second'),
+        ]))
+
+        self.assertEqual([
+            ('message', 'first'),
+            ('member', 3),
+            ('callback', 'answer'),
+            ('join_request', 4),
+            ('message', 'second'),
+        ], self.handled)
+        self.assertEqual(5, self.bot.last_update_id)
+
+
+class TooManyRequestsStub:
+    status_code = 429
+
+    def __init__(self, retry_after: int):
+        self._retry_after = retry_after
+
+    def json(self) -> dict:
+        return {'ok': False, 'error_code': 429, 'parameters': {'retry_after': self._retry_after}}
+
+
+class OutboundDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = OutboundDispatcher(TaskScheduler(LOGGER), Metrics(), LOGGER)
+
+    def call(self, function, chat_id=None, chat_limited=False) -> ApiCall:
+        return ApiCall(ApiCallPriority.COSMETIC, chat_id, True, chat_limited, function, (), {})
+
+    def test_rate_limited_callback_answer_does_not_block_chats(self):
+        limited = threading.Event()
+
+        def answer_callback_query():
+            if not limited.is_set():
+                limited.set()
+                raise ApiException('Too Many Requests', 'answer_callback_query', TooManyRequestsStub(60))
+            return True
+
+        def send_message():
+            return 'sent'
+
+        answer = self.dispatcher.submit(self.call(answer_callback_query))
+        self.assertTrue(limited.wait(2))
+        sent = self.dispatcher.submit(self.call(send_message, chat_id=-100, chat_limited=True))
+
+        self.assertEqual('sent', sent.result(timeout=2))
+        self.assertFalse(answer.done())
+        self.assertNotIn(None, self.dispatcher._blocked_until)
+        self.assertIn('answer_callback_query', self.dispatcher._blocked_until)
+
+    def test_full_buckets_and_lapsed_blocks_are_swept(self):
+        def send_message():
+            return 'sent'
+
+        for chat_id in range(1, 11):
+            self.dispatcher.submit(self.call(send_message, chat_id=chat_id, chat_limited=True)).result(timeout=2)
+        now = time.monotonic()
+        self.dispatcher._blocked_until[-100] = now - 1
+        self.dispatcher._blocked_until[-200] = now + 3600
+        self.assertEqual(10, len(self.dispatcher._chat_buckets))
+
+        self.dispatcher._swept_at = now - OutboundSettings.SWEEP_INTERVAL_SECONDS
+        later = now + OutboundSettings.CHAT_BURST / OutboundSettings.CHAT_RATE
+        self.dispatcher._sweep(later)
+
+        self.assertEqual({}, self.dispatcher._chat_buckets)
+        self.assertEqual([-200], list(self.dispatcher._blocked_until))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import logging
+import time
+import unittest
+from typing import List
+from unittest import mock
+
+from const import RestrictionSettings
+from dto import RestrictedUserDto, RestrictionDto, UserDto
+from error import UserNotFoundInStorageError
+from restriction import RestrictionStorage
+
+CHAT_ID = -100
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def restricted(user_id: int, restore_at: float) -> RestrictedUserDto:
+    return RestrictedUserDto(
+        user=UserDto(id=user_id, first_name=f'user {user_id}', username=f'u{user_id}'),
+        chat_id=CHAT_ID,
+        until_date=int(restore_at),
+        restriction=RestrictionDto(messages=True, media=False, other=False, web_preview=False),
+        restore_at=int(restore_at),
+    )
+
+
+def after_grace(restore_at: float):
+    return mock.patch('restriction.time.time', return_value=restore_at + RestrictionSettings.EXPIRY_GRACE_SECONDS + 1)
+
+
+class DatabaseStub:
+    def __init__(self, restrictions: List[RestrictedUserDto]):
+        self.restrictions = restrictions
+        self.saved = list()
+        self.deleted = list()
+
+    def load_restrictions(self, chat_id: int) -> List[RestrictedUserDto]:
+        return [restriction for restriction in self.restrictions if restriction.chat_id == chat_id]
+
+    def save_restriction(self, restriction: RestrictedUserDto):
+        self.saved.append(restriction.user.id)
+
+    def delete_restriction(self, chat_id: int, user_id: int):
+        self.deleted.append((chat_id, user_id))
+
+
+class RestrictionStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = RestrictionStorage(CHAT_ID, LOGGER)
+
+    def test_restored_entry_is_removed(self):
+        entry = restricted(1, time.time() + 60)
+        self.storage.add(entry)
+        self.assertIs(entry, self.storage.get(entry.user))
+
+        self.storage.remove(entry)
+
+        self.assertEqual(0, len(self.storage))
+        with self.assertRaises(UserNotFoundInStorageError):
+            self.storage.get(entry.user)
+
+    def test_replaced_entry_is_not_removed(self):
+        previous = restricted(1, time.time() + 60)
+        current = restricted(1, time.time() + 120)
+        self.storage.add(previous)
+        self.storage.add(current)
+
+        self.storage.remove(previous)
+
+        self.assertIs(current, self.storage.get(current.user))
+
+    def test_lapsed_entry_is_evicted_on_add(self):
+        restore_at = time.time() + 60
+        self.storage.add(restricted(1, restore_at))
+        with after_grace(restore_at):
+            self.storage.add(restricted(2, restore_at + 7200))
+
+            self.assertEqual([2], [entry.user.id for entry in self.storage])
+        self.assertEqual(1, self.storage.evicted)
+
+    def test_lapsed_entry_is_evicted_without_new_restrictions(self):
+        restore_at = time.time() + 60
+        entries = [restricted(1, restore_at), restricted(2, restore_at)]
+        for entry in entries:
+            self.storage.add(entry)
+
+        with after_grace(restore_at):
+            with self.assertRaises(UserNotFoundInStorageError):
+                self.storage.get(entries[0].user)
+            self.assertEqual(0, len(self.storage))
+            self.assertEqual([], list(self.storage))
+        self.assertEqual(2, self.storage.evicted)
+
+    def test_pending_entry_is_kept_during_grace(self):
+        restore_at = time.time() + 60
+        self.storage.add(restricted(1, restore_at))
+
+        during_grace = restore_at + RestrictionSettings.EXPIRY_GRACE_SECONDS - 1
+        with mock.patch('restriction.time.time', return_value=during_grace):
+            self.assertEqual(1, len(self.storage))
+        self.assertEqual(0, self.storage.evicted)
+
+    def test_entry_missed_while_down_is_kept_until_restored(self):
+        missed = restricted(1, time.time() - RestrictionSettings.EXPIRY_GRACE_SECONDS - 60)
+        database = DatabaseStub([missed, restricted(2, time.time() + 60)])
+        storage = RestrictionStorage(CHAT_ID, LOGGER, database)
+
+        self.assertEqual([1, 2], sorted(entry.user.id for entry in storage))
+        self.assertIs(missed, storage.get(missed.user))
+        self.assertEqual(0, storage.evicted)
+
+    def test_evicted_entry_is_deleted_from_database(self):
+        database = DatabaseStub([])
+        storage = RestrictionStorage(CHAT_ID, LOGGER, database)
+        restore_at = time.time() + 60
+        storage.add(restricted(1, restore_at))
+
+        with after_grace(restore_at):
+            self.assertEqual(0, len(storage))
+        self.assertEqual([1], database.saved)
+        self.assertEqual([(CHAT_ID, 1)], database.deleted)
+
+
+if __name__ == '__main__':
+    unittest.main()
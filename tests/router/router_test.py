@@ -0,0 +1,210 @@
+import logging
+import unittest
+from typing import Optional
+
+from telebot.apihelper import ApiException
+from telebot.types import Message, CallbackQuery, User
+
+from const import TelegramChatType, CallbackSettings, CallbackNamespace
+from router import CommandRouter, CallbackRouter
+
+CHAT_ID = -100
+
+
+def message(text: Optional[str], chat_id: int = CHAT_ID, chat_type: str = TelegramChatType.SUPER_GROUP) -> Message:
+    data = {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': chat_id, 'type': chat_type},
+        'from': {'id': 10, 'is_bot': False, 'first_name': 'user'},
+    }
+    if text is not None:
+        data['text'] = text
+
+    return Message.de_json(data)
+
+
+def callback(data: Optional[str], user_id: int = 10) -> CallbackQuery:
+    query = {'id': '1', 'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'}, 'chat_instance': '1'}
+    if data is not None:
+        query['data'] = data
+
+    return CallbackQuery.de_json(query)
+
+
+class BotStub:
+    def __init__(self, username: Optional[str] = 'rude_bot'):
+        self.answers = list()
+        self.username = username
+        self.me_requests = 0
+
+    def get_me(self) -> User:
+        self.me_requests += 1
+        if self.username is None:
+            raise ApiException('getMe failed', 'getMe', None)
+
+        return User(id=1, is_bot=True, first_name='RudeBoy', username=self.username)
+
+    def submit(self, method_name: str, *args, **kwargs):
+        self.answers.append((method_name, args, kwargs.get('text')))
+
+
+class CommandRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = BotStub()
+        self.router = CommandRouter({CHAT_ID}, self.bot, logging.getLogger())
+        self.routed = list()
+
+        @self.router.command('!ro', '!ban')
+        def restrict(routed: Message):
+            self.routed.append(('restrict', routed.text))
+
+            return 'handled'
+
+        @self.router.command('/start')
+        def start(routed: Message):
+            self.routed.append(('start', routed.text))
+
+        @self.router.command('!pass', exact=True)
+        def pass_(routed: Message):
+            self.routed.append(('pass', routed.text))
+
+    def test_command_is_routed_to_its_handler(self):
+        self.assertEqual('handled', self.router.route(message('!ro 10m')))
+        self.router.route(message('!ban'))
+        self.router.route(message('/start'))
+
+        self.assertEqual([('restrict', '!ro 10m'), ('restrict', '!ban'), ('start', '/start')], self.routed)
+
+    def test_command_is_the_first_word_only(self):
+        self.router.route(message('!ro\n10m'))
+        self.router.route(message('!rofl'))
+        self.router.route(message('say !ro'))
+
+        self.assertEqual([('restrict', '!ro\n10m')], self.routed)
+
+    def test_bot_username_suffix_is_stripped(self):
+        self.router.route(message('/start@rude_bot'))
+        self.router.route(message('!ro@rude_bot 1h'))
+
+        self.assertEqual([('start', '/start@rude_bot'), ('restrict', '!ro@rude_bot 1h')], self.routed)
+
+    def test_command_to_another_bot_is_ignored(self):
+        self.router.route(message('/start@other_bot'))
+        self.router.route(message('/start@Rude_Bot'))
+        self.router.route(message('/start@'))
+
+        self.assertEqual([('start', '/start@Rude_Bot')], self.routed)
+
+    def test_bot_username_is_asked_once(self):
+        self.router.route(message('/start'))
+        self.router.route(message('/start@rude_bot'))
+        self.router.route(message('/start@other_bot'))
+
+        self.assertEqual(1, self.bot.me_requests)
+
+    def test_addressed_commands_are_ignored_without_bot_username(self):
+        self.bot.username = None
+
+        with self.assertLogs(level=logging.ERROR):
+            self.router.route(message('/start@rude_bot'))
+        self.router.route(message('/start'))
+
+        self.assertEqual([('start', '/start')], self.routed)
+
+    def test_exact_command_takes_no_arguments(self):
+        self.router.route(message('!pass foo'))
+        self.router.route(message('!pass\nfoo'))
+        self.router.route(message('!pass'))
+        self.router.route(message('!pass@rude_bot'))
+        self.router.route(message('!pass '))
+
+        self.assertEqual([('pass', '!pass'), ('pass', '!pass@rude_bot'), ('pass', '!pass ')], self.routed)
+
+    def test_unknown_command_is_ignored(self):
+        self.assertIsNone(self.router.route(message('!unknown')))
+        self.assertIsNone(self.router.route(message('/help@rude_bot')))
+        self.assertIsNone(self.router.route(message('!')))
+
+        self.assertEqual([], self.routed)
+
+    def test_text_without_prefix_is_ignored(self):
+        self.router.route(message('hello'))
+        self.router.route(message(''))
+        self.router.route(message(None))
+
+        self.assertEqual([], self.routed)
+
+    def test_other_chats_are_ignored(self):
+        self.router.route(message('!ro', chat_id=-200))
+        self.router.route(message('!ro', chat_id=10, chat_type=TelegramChatType.PRIVATE))
+        self.router.route(message('!ro', chat_type='group'))
+
+        self.assertEqual([], self.routed)
+
+
+class CallbackRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = BotStub()
+        self.router = CallbackRouter(self.bot, logging.getLogger())
+        self.routed = list()
+
+        @self.router.namespace(CallbackNamespace.GREETING)
+        def greeting(call: CallbackQuery):
+            self.routed.append(CallbackRouter.decode(call.data).payload)
+
+            return 'handled'
+
+    def test_encoded_data_is_decoded_back(self):
+        for user_id, payload in ((10, 'да'), (CallbackSettings.ANY_USER, '0.1'), (10, 'a:b:c'), (10, '')):
+            with self.subTest(user_id=user_id, payload=payload):
+                data = CallbackRouter.decode(CallbackRouter.encode(CallbackNamespace.GREETING, user_id, payload))
+
+                self.assertEqual(
+                    (CallbackNamespace.GREETING, user_id, payload),
+                    (data.namespace, data.user_id, data.payload),
+                )
+
+    def test_data_without_namespace_goes_to_default_namespace(self):
+        data = CallbackRouter.decode('да')
+
+        self.assertEqual(
+            (CallbackSettings.DEFAULT_NAMESPACE, CallbackSettings.ANY_USER, 'да'),
+            (data.namespace, data.user_id, data.payload),
+        )
+
+    def test_malformed_data_is_rejected(self):
+        for data in ('g:да', 'g:user:да', 'g::да', ':'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    CallbackRouter.decode(data)
+
+    def test_query_is_answered_and_routed_to_its_namespace(self):
+        data = CallbackRouter.encode(CallbackNamespace.GREETING, 10, '0.1')
+
+        self.assertEqual('handled', self.router.route(callback(data)))
+        self.assertEqual(['0.1'], self.routed)
+        self.assertEqual([('answer_callback_query', ('1',), None)], self.bot.answers)
+
+    def test_foreign_click_is_answered_with_notice_and_dropped(self):
+        self.router.route(callback(CallbackRouter.encode(CallbackNamespace.GREETING, 20, '0.1')))
+
+        self.assertEqual([], self.routed)
+        self.assertEqual([('answer_callback_query', ('1',), CallbackSettings.FOREIGN_CLICK_TEXT)], self.bot.answers)
+
+    def test_click_on_keyboard_for_anyone_is_routed(self):
+        self.router.route(callback(CallbackRouter.encode(CallbackNamespace.GREETING, CallbackSettings.ANY_USER, 'да')))
+
+        self.assertEqual(['да'], self.routed)
+
+    def test_unknown_and_malformed_queries_are_only_answered(self):
+        for data in ('x:10:payload', 'g:user:да', None):
+            with self.subTest(data=data):
+                self.router.route(callback(data))
+
+        self.assertEqual([], self.routed)
+        self.assertEqual(3, len(self.bot.answers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import logging
+import threading
+import unittest
+
+from const import SchedulerSettings
+from scheduler import TaskScheduler, ScheduledTask
+
+
+class TaskSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = TaskScheduler(logging.getLogger())
+        self.executed = list()
+        self.done = threading.Event()
+
+    def record(self, name: str):
+        self.executed.append(name)
+
+    def test_tasks_run_in_deadline_order(self):
+        for name, pause in (('third', 0.15), ('first', 0.05), ('second', 0.1)):
+            self.scheduler.schedule(pause, self.record, (name,), inline=True)
+        self.scheduler.schedule(0.2, self.done.set, inline=True)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(['first', 'second', 'third'], self.executed)
+
+    def test_tasks_with_same_deadline_run_in_schedule_order(self):
+        for name in ('first', 'second', 'third'):
+            self.scheduler.schedule(-1, self.record, (name,), inline=True)
+        self.scheduler.schedule(0, self.done.set, inline=True)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(['first', 'second', 'third'], self.executed)
+
+    def test_cancelled_task_is_not_run(self):
+        task = self.scheduler.schedule(0.05, self.record, ('cancelled',), inline=True)
+        task.cancel()
+        self.scheduler.schedule(0.1, self.done.set, inline=True)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual([], self.executed)
+        self.assertEqual(ScheduledTask.CANCELLED, task.state)
+        self.assertEqual(1, self.scheduler.stats().cancelled)
+
+    def test_started_task_can_not_be_cancelled(self):
+        task = self.scheduler.schedule(0, self.done.set, inline=True)
+        self.assertTrue(self.done.wait(2))
+        task.cancel()
+
+        self.assertEqual(ScheduledTask.STARTED, task.state)
+        self.assertEqual(0, self.scheduler.stats().cancelled)
+
+    def test_cancel_is_idempotent(self):
+        task = self.scheduler.schedule(60, self.record, ('cancelled',))
+        task.cancel()
+        task.cancel()
+
+        self.assertEqual(1, self.scheduler.stats().cancelled)
+        self.assertEqual(0, self.scheduler.stats().queue_depth)
+
+    def test_heap_is_compacted_when_cancelled_tasks_pile_up(self):
+        tasks = [self.scheduler.schedule(60, self.record, (number,)) for number in range(100)]
+        cancelled = int(len(tasks) * SchedulerSettings.COMPACT_RATIO) + 1
+        for task in tasks[:cancelled]:
+            task.cancel()
+
+        self.assertEqual(len(tasks) - cancelled, len(self.scheduler._heap))
+        self.assertEqual(len(tasks) - cancelled, self.scheduler.stats().queue_depth)
+        self.assertTrue(all(entry[2].state == ScheduledTask.PENDING for entry in self.scheduler._heap))
+
+    def test_failed_task_does_not_stop_scheduler(self):
+        def fail():
+            raise RuntimeError('failed')
+
+        with self.assertLogs(level=logging.ERROR):
+            self.scheduler.schedule(0, fail, inline=True)
+            self.scheduler.schedule(0.05, self.done.set)
+            self.assertTrue(self.done.wait(2))
+        self.assertEqual(2, self.scheduler.stats().executed)
+
+
+if __name__ == '__main__':
+    unittest.main()